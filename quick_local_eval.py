@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
-import os, json
-from src.client.io.gdfa_loader import load_gdfa
+import os, array
+from src.client.io.gdfa_loader import load_gdfa, json_loads, map_readonly
 from src.client.io.row_alph_loader import RowAlphabetMap
 from src.client.online.engine import ZIDSEngine, EngineConfig
 from src.client.online.ot_client import LocalTrivialOTChooser
@@ -10,6 +10,19 @@ from src.server.online.ot_response_builder import RowAlphMeta
 from src.server.online.ot_response_builder import RowAlphMeta
 from src.common.odfa.seed_rules import seed_from_gk, PRG_LABEL_CELL
 from src.common.crypto.prg import prg
+from src.common.urlnorm import canonicalize
+
+try:  # 可选：流式解析 tests.json（没有就整档 json 解析）
+    import ijson
+except ImportError:
+    ijson = None
+
+def _count_positive(values, num_rows: int) -> int:
+    """整列批量计数（AID 为无符号整数：非 0 即命中），避免逐行 Python 调用。"""
+    head = values[:num_rows]
+    if isinstance(head, (list, tuple, array.array, bytes, bytearray)):
+        return len(head) - head.count(0)   # count() 走 C 实现
+    return sum(1 for v in head if isinstance(v, int) and v > 0)
 
 def print_accept_stats(gdfa):
     num_rows = getattr(gdfa, "num_states", None) or getattr(gdfa, "num_rows", None)
@@ -18,10 +31,14 @@ def print_accept_stats(gdfa):
     total_accept = 0
     names_hit = []
 
-    # 方法
+    # 方法（有整表时直接走批量路径，不逐行调用）
     f = getattr(gdfa, "get_row_aid", None)
     if callable(f):
-        cnt = sum(1 for r in range(num_rows) if isinstance(f(r), int) and f(r) > 0)
+        bulk = getattr(gdfa, "row_aids", None)
+        if bulk is not None:
+            cnt = _count_positive(bulk, num_rows)
+        else:
+            cnt = sum(1 for r in range(num_rows) if isinstance(f(r), int) and f(r) > 0)
         print(f"[accept] get_row_aid(): {cnt}")
         total_accept = max(total_accept, cnt); names_hit.append("get_row_aid")
 
@@ -30,31 +47,36 @@ def print_accept_stats(gdfa):
         arr = getattr(gdfa, name, None)
         if arr is not None:
             try:
-                cnt = sum(1 for r in range(num_rows) if isinstance(arr[r], int) and arr[r] > 0)
+                cnt = _count_positive(arr, num_rows)
                 print(f"[accept] {name}: {cnt}")
                 total_accept = max(total_accept, cnt); names_hit.append(name)
             except Exception:
                 pass
 
-    # 字典
+    # 字典（只扫 values，不对每行做 get）
     for name in ("accepting_map", "accepting_ids", "row_to_aid"):
         mp = getattr(gdfa, name, None)
         if isinstance(mp, dict):
-            cnt = sum(1 for r in range(num_rows) if isinstance(mp.get(r, 0), int) and mp.get(r, 0) > 0)
+            cnt = sum(1 for r, v in mp.items()
+                      if isinstance(r, int) and 0 <= r < num_rows and isinstance(v, int) and v > 0)
             print(f"[accept] {name}: {cnt}")
             total_accept = max(total_accept, cnt); names_hit.append(name)
 
     # 布尔
     f2 = getattr(gdfa, "is_accepting", None)
     if callable(f2):
-        cnt = sum(1 for r in range(num_rows) if f2(r))
+        bulk = getattr(gdfa, "row_aids", None)
+        if bulk is not None:
+            cnt = _count_positive(bulk, num_rows)
+        else:
+            cnt = sum(1 for r in range(num_rows) if f2(r))
         print(f"[accept] is_accepting(): {cnt}")
         total_accept = max(total_accept, cnt); names_hit.append("is_accepting()")
-    for name in ("accepting_rows", "accept_rows"):
+    for name in ("accepting_rows_set", "accepting_rows", "accept_rows"):
         s = getattr(gdfa, name, None)
         if s is not None:
             try:
-                cnt = sum(1 for r in range(num_rows) if r in s)
+                cnt = len(set(s).intersection(range(num_rows)))
                 print(f"[accept] {name}: {cnt}")
                 total_accept = max(total_accept, cnt); names_hit.append(name)
             except Exception:
@@ -65,17 +87,31 @@ def print_accept_stats(gdfa):
     else:
         print(f"==> accepting present via: {', '.join(names_hit)}; max_count={total_accept}")
 
+def load_json(path: str):
+    with open(path, "rb") as f:
+        return json_loads(f.read())
+
+def iter_test_items(path: str):
+    """逐条产出 tests.json 顶层数组的元素；有 ijson 时常数内存。"""
+    if ijson is None:
+        yield from load_json(path)
+        return
+    with open(path, "rb") as f:
+        yield from ijson.items(f, "item")
+
 ART = "dist/zids_easy"
 TESTS = "dist/urltests/tests.json"
+# 对齐自检（diag_probe_once）只需跑一次；ZIDS_DIAG=0 时完全跳过（性能评测用）
+DIAG = os.environ.get("ZIDS_DIAG", "1") != "0"
 
 def diag_probe_once(engine, app, meta, gdfa, row_alph, session_id, sample_bytes):
     row0 = gdfa.start_row
     b0   = sample_bytes[0]
 
-    # get_cols() 一定返回 list[int]（<= cmax）
+    # get_cols() 一定返回 tuple[int, ...]（<= cmax）
     cols0 = row_alph.get_cols(row0, b0)
     m     = row_alph.num_cols(row0)
-    assert isinstance(cols0, list) and len(cols0) > 0, f"no candidate cols at row={row0} b0={b0}"
+    assert isinstance(cols0, tuple) and len(cols0) > 0, f"no candidate cols at row={row0} b0={b0}"
     assert all(isinstance(c, int) for c in cols0), f"non-int col in {cols0}"
     assert all(0 <= c < m for c in cols0), f"bad col mapping row={row0} b0={b0} cols={cols0} (m={m})"
 
@@ -100,7 +136,8 @@ def diag_probe_once(engine, app, meta, gdfa, row_alph, session_id, sample_bytes)
 def find_gdfa_path(art_dir: str) -> str:
     cont = os.path.join(art_dir, "gdfa.gdfa")
     if os.path.exists(cont): return cont
-    if os.path.exists(os.path.join(art_dir, "rows.bin")) and (
+    rows_bin = any(os.path.exists(os.path.join(art_dir, n)) for n in ("rows.bin", "rows_soa.bin"))
+    if rows_bin and (
         os.path.exists(os.path.join(art_dir, "header.json")) or
         os.path.exists(os.path.join(art_dir, "header.json.gz"))
     ):
@@ -109,7 +146,7 @@ def find_gdfa_path(art_dir: str) -> str:
 
 # 单一真源（SSOT）
 MANIFEST_PATH = os.path.join(ART, "manifest.json")
-manifest = json.load(open(MANIFEST_PATH, "rb"))
+manifest = load_json(MANIFEST_PATH)
 SEED_K_BYTES = int(manifest["crypto_params"]["k"]) // 8
 GK_BYTES     = int(manifest.get("gk_bytes", 32))
 
@@ -135,20 +172,22 @@ engine = ZIDSEngine(
 
 # 评测
 if os.path.exists(TESTS):
-    items = json.load(open(TESTS, "rb"))
     base = os.path.dirname(os.path.abspath(TESTS))
-    for it in items:
+    cases = []  # (kind, index, canonical)：载荷 mmap 后当场正规化，只留下短的 host/path 串
+    for it in iter_test_items(TESTS):
         for kind in ("positive_req", "negative_req"):
             rel = it[kind].replace("\\", "/")
             p = os.path.normpath(os.path.join(base, rel))
-            with open(p, "rb") as fp:
-                data = fp.read()
-            
-            # data 就是你准备送进 engine.run 的数据
-            diag_probe_once(engine, app, meta, gdfa, row_alph, sid, data if len(data)>0 else b'G')
-
-            hits = engine.run(data)
-            print(kind, it["index"], "HITS" if hits else "nohit", hits)
+            cases.append((kind, it["index"], canonicalize(map_readonly(p))))
+
+    # 结构不变量已在 GDFAImage / RowAlphabetMap 载入时校验；这里只用第一条样本做一次端到端对齐检查
+    if DIAG:
+        sample = next((c[2] for c in cases if c[2]), b"G")
+        diag_probe_once(engine, app, meta, gdfa, row_alph, sid, sample)
+
+    all_hits = engine.run_batch([c[2] for c in cases], canonical=True)
+    for (kind, index, _), hits in zip(cases, all_hits):
+        print(kind, index, "HITS" if hits else "nohit", hits)
 else:
     data = b"GET /admin HTTP/1.1\r\nHost: example.com\r\n\r\n"
     print(engine.run(data))
\ No newline at end of file
@@ -1,13 +1,66 @@
 # src/client/io/gdfa_loader.py
 from __future__ import annotations
 import json
+import mmap
 import os
 import struct
 import hashlib
+import sys
+from array import array
 from dataclasses import dataclass
-from typing import Optional, List
+from functools import cached_property, lru_cache
+from typing import Any, Iterable, Optional, List, Sequence, Tuple
 
-_MAGIC = b"ZIDSv1\0"
+from src.common.crypto.prg import PRG_BACKEND, PRG_BACKENDS
+
+try:
+    import orjson as _orjson  # optional: 3–5× faster header/permutation parse
+except ImportError:
+    _orjson = None
+
+_MAGIC = b"ZIDSv1\0"     # v1: JSON header（舊工件）
+_MAGIC_V2 = b"ZIDSv2\0"  # v2: 定長二進位 header + int32 permutation（零解析）
+
+# v2 header（緊接 magic）：alphabet_size, outmax, cmax, num_states, start_row,
+#                         cell_bytes, row_bytes, aid_bits, layout, perm_len
+# layout 欄：低 8 位 = 佈局（0=aos,1=soa），次 8 位 = PRG 後端代碼（PRG_BACKENDS 索引；舊檔案為 0 = hmac）
+_V2_HDR = struct.Struct("<10I")
+_V2_LAYOUTS = ("aos", "soa")
+
+# 設 ZIDS_GDFA_VERIFY=0 可在受信任環境跳過 rows sha256 校驗（冷啟動主要成本）
+_VERIFY_ENV = "ZIDS_GDFA_VERIFY"
+
+# array 的 uint32 型別碼（'I' 在主流平台為 4 bytes；否則退回 'L'）
+_U32 = "I" if array("I").itemsize == 4 else "L"
+# row_aids.bin 每行寬度（bytes）→ array typecode
+_ROW_AID_TYPECODES = {1: "B", 2: "H", 4: _U32}
+
+def json_loads(buf: bytes | memoryview) -> Any:
+    """Parse UTF-8 JSON bytes (or a view); uses orjson when installed, stdlib json otherwise."""
+    if _orjson is not None:
+        return _orjson.loads(buf)
+    return json.loads(bytes(buf))
+
+def artifact_stamp(*paths: str) -> Tuple[Tuple[str, int], ...]:
+    """(realpath, mtime_ns) per existing file; cache key that changes whenever an artifact is rewritten."""
+    out = []
+    for p in paths:
+        try:
+            out.append((os.path.realpath(p), os.stat(p).st_mtime_ns))
+        except FileNotFoundError:
+            continue
+    return tuple(out)
+
+def map_readonly(path: str) -> memoryview:
+    """
+    Read-only mmap of a whole file, exposed as a memoryview (no copy into a bytes object;
+    pages are shared through the OS page cache). Empty files map to an empty view.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return memoryview(b"")
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mm)
 
 @dataclass(frozen=True)
 class GDFAHeader:
@@ -16,23 +69,53 @@ class GDFAHeader:
     cmax: int
     num_states: int
     start_row: int
-    permutation: list[int]
+    permutation: Sequence[int]  # list (v1/jsonbin) 或 array('i')（v2 container）
     cell_bytes: int
     row_bytes: int
     aid_bits: int
+    layout: str = "aos"  # "aos": row-major rows.bin；"soa": column-major rows_soa.bin
+    prg_backend: str = "hmac"  # 建置時的 PRG 後端；沒記錄的舊工件一律是 hmac
+
+def _scaled(var: str, k: int) -> str:
+    """var*k 的原始碼；k 為 2 的冪時改成位移。"""
+    if k > 0 and k & (k - 1) == 0:
+        return f"({var} << {k.bit_length() - 1})"
+    return f"{var} * {k}"
+
+def _specialize_cell_cipher(rows: memoryview, num_states: int, cols: int,
+                            row_stride: int, col_stride: int, cell_bytes: int):
+    """
+    依本次載入的形狀生成 get_cell_cipher(row, col)：步長/邊界全部以常數寫進 bytecode，
+    省去每次呼叫的 self.h.* / self._row_base 屬性查找與查表。語義與 GDFAImage.get_cell_cipher 相同。
+    """
+    src = (
+        "def get_cell_cipher(row, col):\n"
+        f"    if not (0 <= row < {num_states}):\n"
+        "        raise IndexError('row out of range')\n"
+        f"    if not (0 <= col < {cols}):\n"
+        "        raise IndexError('col out of range in row stride')\n"
+        f"    s = {_scaled('row', row_stride)} + {_scaled('col', col_stride)}\n"
+        f"    return _rows[s:s + {cell_bytes}]\n"
+    )
+    ns = {"_rows": rows}
+    exec(compile(src, f"<gdfa cell {num_states}x{cols}x{cell_bytes}>", "exec"), ns)
+    fn = ns["get_cell_cipher"]
+    fn.__doc__ = GDFAImage.get_cell_cipher.__doc__
+    return fn
 
 class GDFAImage:
     """
     Read-only view over GDFA rows (ciphertext cells).
     Supports both:
       - container (.gdfa): header + rows + sha256
-      - jsonbin (dir):    header.json(+.gz) + rows.bin
+      - jsonbin (dir):    header.json(+.gz) + rows.bin (or rows_soa.bin when layout == "soa")
+    Cell (row, col) lives at _row_base[row] + col * _col_stride for either layout.
     Optionally loads auxiliary tables from the artifact directory:
       - row_aids.bin : num_states × uint32_le  (line-level AID table)
     """
-    def __init__(self, header: GDFAHeader, rows_blob: bytes, art_dir: Optional[str] = None):
+    def __init__(self, header: GDFAHeader, rows_blob: bytes | memoryview, art_dir: Optional[str] = None):
         self.h = header
-        self._rows = rows_blob
+        self._rows = memoryview(rows_blob).cast("B")  # bytes 或 mmap 視圖；切片不複製
         self._art_dir = art_dir  # base dir for aux tables (may be None for raw buffers)
 
         # ---- quick sanity ----
@@ -44,26 +127,47 @@ class GDFAImage:
             raise ValueError("this client assumes alphabet_size=256")
         if header.cmax != 1:
             raise ValueError("this client assumes cmax=1 (partition per row)")
+        if header.layout not in ("aos", "soa"):
+            raise ValueError(f"unsupported rows layout: {header.layout}")
+
+        # ---- precomputed addressing (fixed per image) ----
+        self._cols_per_row = header.row_bytes // header.cell_bytes
+        # _row_base[row]：行起點表，存取時不再做乘法
+        #   aos: row * row_bytes，列步長 cell_bytes
+        #   soa: row * cell_bytes，列步長 num_states * cell_bytes
+        row_stride = header.row_bytes if header.layout == "aos" else header.cell_bytes
+        self._row_base = array("Q", range(0, header.num_states * row_stride, row_stride))
+        self._col_stride = header.cell_bytes if header.layout == "aos" else header.num_states * header.cell_bytes
+        # 形狀在載入後固定：生成常數內聯的 get_cell_cipher 蓋掉通用方法（見 _specialize_cell_cipher）
+        self.get_cell_cipher = _specialize_cell_cipher(
+            self._rows, header.num_states, self._cols_per_row, row_stride, self._col_stride, header.cell_bytes
+        )
 
         # ---- permutation / inverse permutation (optional) ----
-        self._perm: List[int] = list(header.permutation or [])
-        if self._perm and len(self._perm) != header.num_states:
+        # int32 緊湊陣列；範圍校驗走 C 層 min/max，逆置換延後到第一次 inv_permute 才建
+        perm = header.permutation
+        self._perm = perm if isinstance(perm, array) and perm.typecode == "i" else array("i", perm or ())
+        n = len(self._perm)
+        if n and n != header.num_states:
             raise ValueError("permutation length mismatch")
-        if self._perm:
-            inv = [0] * len(self._perm)
-            for i, p in enumerate(self._perm):
-                if not (0 <= p < len(self._perm)):
-                    raise ValueError("permutation value out of range")
-                inv[p] = i
-            self._inv_perm: Optional[List[int]] = inv
-        else:
-            self._inv_perm = None  # identity
+        if n and (min(self._perm) < 0 or max(self._perm) >= n):
+            raise ValueError("permutation value out of range")
 
         # ---- optional aux tables ----
-        self.row_aids: Optional[List[int]] = None
+        self.row_aids: Optional[array] = None
         if self._art_dir:
             self._maybe_load_row_aids(self._art_dir)
 
+        # ---- accepting rows：載入時一次算好 ----
+        # bitmap[row] ∈ {0,1}（bytes 索引，無函式轉呼叫）；set 給「走過的 row 有沒有 accepting」這類批次查詢
+        if self.row_aids is None:
+            self.accepting_bitmap = bytes(header.num_states)
+        else:
+            self.accepting_bitmap = bytes(map(bool, self.row_aids))
+        self.accepting_rows_set: frozenset = frozenset(
+            r for r, a in enumerate(self.accepting_bitmap) if a
+        )
+
     # ---------- properties ----------
     @property
     def start_row(self) -> int:
@@ -94,27 +198,66 @@ class GDFAImage:
     def aid_bits(self) -> int:
         return self.h.aid_bits
 
+    @property
+    def layout(self) -> str:
+        return self.h.layout
+
+    @property
+    def cols_per_row(self) -> int:
+        return self._cols_per_row
+
     # ---------- core access ----------
     def row_slice(self, row: int) -> memoryview:
         if not (0 <= row < self.h.num_states):
             raise IndexError("row out of range")
-        s = row * self.h.row_bytes
-        return memoryview(self._rows)[s:s + self.h.row_bytes]
+        return self.get_row_cells_view(row)
 
-    def get_cell_cipher(self, row: int, col: int) -> bytes:
+    # 行視圖（未檢查範圍；呼叫方保證 0 <= row < num_states）
+    # soa 佈局下一行不連續，這裡會拼出一份副本
+    def get_row_cells_view(self, row: int) -> memoryview:
+        s = self._row_base[row]
+        if self.h.layout == "aos":
+            return self._rows[s:s + self.h.row_bytes]
+        cb, st = self.h.cell_bytes, self._col_stride
+        return memoryview(b"".join(self._rows[s + c * st: s + c * st + cb] for c in range(self._cols_per_row)))
+
+    # 單列常見情況：直接取第 0 格，省去列位移計算
+    def get_cell0(self, row: int) -> memoryview:
+        s = self._row_base[row]
+        return self._rows[s:s + self.h.cell_bytes]
+
+    def get_cell_cipher(self, row: int, col: int) -> memoryview:
+        """Zero-copy view of the cell (onto the mmap'd rows when loaded from disk)."""
         if not (0 <= row < self.h.num_states):
             raise IndexError("row out of range")
-        cols_per_row = self.h.row_bytes // self.h.cell_bytes
-        if not (0 <= col < cols_per_row):
+        if not (0 <= col < self._cols_per_row):
             raise IndexError("col out of range in row stride")
-        base = row * self.h.row_bytes + col * self.h.cell_bytes
+        base = self._row_base[row] + col * self._col_stride
         return self._rows[base: base + self.h.cell_bytes]
 
     # 新引擎优先调用 get_cell_bytes；这里与 get_cell_cipher 等价
-    def get_cell_bytes(self, row: int, col: int) -> bytes:
+    def get_cell_bytes(self, row: int, col: int) -> memoryview:
         return self.get_cell_cipher(row, col)
 
+    # 需要独立 bytes（如作 dict key / 长期持有）的调用方才用这个
+    def get_cell_bytes_copy(self, row: int, col: int) -> bytes:
+        return self.get_cell_cipher(row, col).tobytes()
+
     # ---------- permutation helpers ----------
+    @cached_property
+    def _inv_perm(self) -> Optional[array]:
+        if not self._perm:
+            return None  # identity
+        inv = array("i", bytes(4 * len(self._perm)))
+        for i, p in enumerate(self._perm):
+            inv[p] = i
+        return inv
+
+    def inv_permute_many(self, rows: Iterable[int]) -> List[int]:
+        """Bulk inv_permute (e.g. over all accepting rows); rows must be in range."""
+        inv = self._inv_perm
+        return list(rows) if inv is None else list(map(inv.__getitem__, rows))
+
     def inv_permute(self, row: int) -> int:
         """Map physical row index back to logical via inverse permutation (if any)."""
         if self._inv_perm is None:
@@ -126,7 +269,8 @@ class GDFAImage:
     # ---------- acceptance / AID ----------
     def _maybe_load_row_aids(self, art_dir: str) -> None:
         """
-        Optional aux table: row_aids.bin = num_states × uint32_le
+        Optional aux table: row_aids.bin = num_states × uint{8,16,32}_le
+        （寬度由檔案大小決定：離線端用容得下最大 AID 的最窄寬度；舊工件恆為 uint32）
         """
         path = os.path.join(art_dir, "row_aids.bin")
         if not os.path.exists(path):
@@ -134,21 +278,35 @@ class GDFAImage:
             return
         with open(path, "rb") as f:
             buf = f.read()
-        exp = self.h.num_states * 4
-        if len(buf) != exp:
-            raise ValueError(f"row_aids.bin size mismatch: {len(buf)} != {exp}")
-        self.row_aids = [struct.unpack_from("<I", buf, 4 * i)[0] for i in range(self.h.num_states)]
+        n = self.h.num_states
+        typecode = _ROW_AID_TYPECODES.get(len(buf) // n if n and len(buf) % n == 0 else 0)
+        if typecode is None:
+            raise ValueError(f"row_aids.bin size mismatch: {len(buf)} not in {[n * w for w in _ROW_AID_TYPECODES]}")
+        aids = array(typecode)
+        aids.frombytes(buf)  # one C-level copy; 1/2/4 B/entry instead of a list of PyLongs
+        if sys.byteorder != "little":
+            aids.byteswap()
+        self.row_aids = aids
 
     def get_row_aid(self, row: int) -> int:
         """Return >0 if row is accepting with that attack-id; 0 otherwise."""
-        if self.row_aids is None:
-            return 0
-        if 0 <= row < len(self.row_aids):
-            return int(self.row_aids[row])
+        aids = self.row_aids
+        if aids is not None and 0 <= row < len(aids):
+            return aids[row]
         return 0
 
+    @property
+    def accepting_mask(self) -> bytes:
+        """Bulk predicate: mask[row] == 1 iff row is accepting (all zeros without row_aids.bin)."""
+        return self.accepting_bitmap
+
     def is_accepting(self, row: int) -> bool:
-        return self.get_row_aid(row) > 0
+        bm = self.accepting_bitmap
+        return 0 <= row < len(bm) and bm[row] == 1
+
+    def any_accepting(self, rows: Iterable[int]) -> bool:
+        """Batch query over a visited-row trace."""
+        return not self.accepting_rows_set.isdisjoint(rows)
 
 
 # ---------- loaders ----------
@@ -169,30 +327,110 @@ def _parse_header_obj(obj: dict) -> GDFAHeader:
         cell_bytes=int(obj["cell_bytes"]),
         row_bytes=int(obj["row_bytes"]),
         aid_bits=int(obj["aid_bits"]),
+        layout=str(obj.get("layout", "aos")),
+        prg_backend=str(obj.get("prg_backend", "hmac")),
     )
 
-def load_from_container(path: str) -> GDFAImage:
-    with open(path, "rb") as f:
-        blob = f.read()
-    if not blob.startswith(_MAGIC):
-        raise ValueError("bad container magic")
+def _check_prg_backend(header: GDFAHeader, path: str) -> None:
+    """
+    工件的 PRG 後端必須與本行程的 PRG_BACKEND（ZIDS_PRG_BACKEND）一致：
+    否則每個 cell 都會用錯的 pad 解密，不是走到一半 next_row 越界，就是默默走出錯的命中。
+    """
+    if header.prg_backend != PRG_BACKEND:
+        raise ValueError(
+            f"{path}: artifact was built with PRG backend {header.prg_backend!r}, "
+            f"but this process uses {PRG_BACKEND!r} (set ZIDS_PRG_BACKEND={header.prg_backend} to load it)"
+        )
+
+def _verify_default(verify: Optional[bool]) -> bool:
+    if verify is not None:
+        return verify
+    return os.environ.get(_VERIFY_ENV, "1").strip().lower() not in ("0", "false", "no", "off")
+
+def _rows_sha256(path: str, rows_blob: memoryview) -> bytes:
+    """
+    sha256 of the rows region of `path`, memoized in the sidecar `<path>.sha256`
+    ("<size>:<mtime_ns> <hex>"). A later load whose stat() matches skips re-hashing.
+    hashlib hashes the mapped view in one call (OpenSSL; SHA-NI where available).
+    """
+    st = os.stat(path)
+    stamp = f"{st.st_size}:{st.st_mtime_ns}"
+    sidecar = path + ".sha256"
+    try:
+        with open(sidecar, "r", encoding="ascii") as f:
+            cached_stamp, hexdigest = f.read().split()
+        if cached_stamp == stamp:
+            return bytes.fromhex(hexdigest)
+    except (OSError, ValueError):
+        pass
+    digest = hashlib.sha256(rows_blob).digest()
+    try:
+        with open(sidecar, "w", encoding="ascii") as f:
+            f.write(f"{stamp} {digest.hex()}\n")
+    except OSError:
+        pass  # read-only artifact dir: just don't cache
+    return digest
+
+def _parse_header_v2(blob: memoryview, p: int) -> Tuple[GDFAHeader, int]:
+    """v2: struct.unpack_from 定長欄位 + 一次 frombytes 取 int32 permutation；回傳 (header, rows 起點)。"""
+    (alphabet_size, outmax, cmax, num_states, start_row,
+     cell_bytes, row_bytes, aid_bits, layout_word, perm_len) = _V2_HDR.unpack_from(blob, p)
+    p += _V2_HDR.size
+    layout, backend = layout_word & 0xff, layout_word >> 8
+    if layout >= len(_V2_LAYOUTS):
+        raise ValueError(f"bad container layout code: {layout}")
+    if backend >= len(PRG_BACKENDS):
+        raise ValueError(f"bad container PRG backend code: {backend}")
+    perm = array("i")
+    perm.frombytes(blob[p:p + 4 * perm_len])
+    if sys.byteorder != "little":
+        perm.byteswap()
+    p += 4 * perm_len
+    header = GDFAHeader(
+        alphabet_size=alphabet_size,
+        outmax=outmax,
+        cmax=cmax,
+        num_states=num_states,
+        start_row=start_row,
+        permutation=perm,
+        cell_bytes=cell_bytes,
+        row_bytes=row_bytes,
+        aid_bits=aid_bits,
+        layout=_V2_LAYOUTS[layout],
+        prg_backend=PRG_BACKENDS[backend],
+    )
+    return header, p
+
+def load_from_container(path: str, *, verify: Optional[bool] = None) -> GDFAImage:
+    """
+    ZIDSv2（二進位 header）或 ZIDSv1（JSON header）容器。
+    verify=None → 依環境變數 ZIDS_GDFA_VERIFY（預設校驗）。
+    """
+    blob = map_readonly(path)
+    magic = blob[:len(_MAGIC)]
     p = len(_MAGIC)
-    (hlen,) = struct.unpack_from(">I", blob, p)
-    p += 4
-    hbytes = blob[p:p+hlen]; p += hlen
-    header_obj = json.loads(hbytes.decode("utf-8"))
+    if magic == _MAGIC_V2:
+        header, p = _parse_header_v2(blob, p)
+    elif magic == _MAGIC:
+        (hlen,) = struct.unpack_from(">I", blob, p)
+        p += 4
+        hbytes = blob[p:p+hlen]; p += hlen
+        header = _parse_header_obj(json_loads(hbytes))
+    else:
+        raise ValueError("bad container magic")
+    _check_prg_backend(header, path)
     rows_end = len(blob) - 32  # sha256 digest
     rows_blob = blob[p:rows_end]
     digest = blob[rows_end:]
-    if hashlib.sha256(rows_blob).digest() != digest:
+    if _verify_default(verify) and _rows_sha256(path, rows_blob) != digest:
         raise ValueError("container rows sha256 mismatch")
-    header = _parse_header_obj(header_obj)
 
     # artifact dir = where the .gdfa sits (aux tables live here)
     art_dir = os.path.dirname(os.path.abspath(path))
     return GDFAImage(header, rows_blob, art_dir=art_dir)
 
-def load_from_jsonbin(dirpath: str) -> GDFAImage:
+def load_from_jsonbin(dirpath: str, *, verify: Optional[bool] = None) -> GDFAImage:
+    """verify 只在 header 帶 rows_sha256 時生效；verify=None → 依 ZIDS_GDFA_VERIFY。"""
     # header.json (optionally gz) + rows.bin
     header_path = os.path.join(dirpath, "header.json")
     if not os.path.exists(header_path):
@@ -204,24 +442,37 @@ def load_from_jsonbin(dirpath: str) -> GDFAImage:
     else:
         with open(header_path, "rb") as f:
             hbytes = f.read()
-    header_obj = json.loads(hbytes.decode("utf-8"))
-    rows_path = os.path.join(dirpath, "rows.bin")
-    with open(rows_path, "rb") as f:
-        rows_blob = f.read()
-    # optional rows_sha256 for verification
-    if "rows_sha256" in header_obj:
-        if hashlib.sha256(rows_blob).hexdigest() != header_obj["rows_sha256"]:
-            raise ValueError("rows.bin sha256 mismatch against header")
+    header_obj = json_loads(hbytes)
     header = _parse_header_obj(header_obj)
+    _check_prg_backend(header, dirpath)
+    rows_name = "rows_soa.bin" if header_obj.get("layout") == "soa" else "rows.bin"
+    rows_path = os.path.join(dirpath, rows_name)
+    rows_blob = map_readonly(rows_path)
+    # optional rows_sha256 for verification
+    if "rows_sha256" in header_obj and _verify_default(verify):
+        if _rows_sha256(rows_path, rows_blob).hex() != header_obj["rows_sha256"]:
+            raise ValueError(f"{rows_name} sha256 mismatch against header")
     return GDFAImage(header, rows_blob, art_dir=os.path.abspath(dirpath))
 
-def load_gdfa(path: str) -> GDFAImage:
+def load_gdfa(path: str, *, verify: Optional[bool] = None) -> GDFAImage:
     """
     Auto-detect by extension: *.gdfa => container, else treat as directory for jsonbin.
+    verify: rows sha256 check; None → env ZIDS_GDFA_VERIFY (default on).
+
+    Results are cached per (realpath, artifact mtimes, verify): repeated loads of unchanged
+    artifacts return the SAME GDFAImage, which callers must treat as shared and read-only.
     """
+    rp = os.path.realpath(path)
+    if os.path.isdir(rp):
+        names = ("header.json", "header.json.gz", "rows.bin", "rows_soa.bin", "row_aids.bin")
+        stamp = artifact_stamp(*(os.path.join(rp, n) for n in names))
+    else:
+        stamp = artifact_stamp(rp, os.path.join(os.path.dirname(rp), "row_aids.bin"))
+    return _load_gdfa_cached(rp, stamp, _verify_default(verify))
+
+@lru_cache(maxsize=8)
+def _load_gdfa_cached(path: str, _stamp: tuple, verify: bool) -> GDFAImage:
     if os.path.isdir(path):
-        return load_from_jsonbin(path)
-    if path.lower().endswith(".gdfa"):
-        return load_from_container(path)
-    # if it's a file but not .gdfa, attempt container anyway
-    return load_from_container(path)
\ No newline at end of file
+        return load_from_jsonbin(path, verify=verify)
+    # *.gdfa, or any other file: attempt container
+    return load_from_container(path, verify=verify)
\ No newline at end of file
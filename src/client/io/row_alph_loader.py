@@ -1,9 +1,14 @@
 # src/client/io/row_alph_loader.py
 from __future__ import annotations
-import json
 import os
 from dataclasses import dataclass
-from typing import List
+from functools import lru_cache
+from typing import List, Tuple
+
+from src.client.io.gdfa_loader import artifact_stamp, json_loads, map_readonly
+
+# get_cols 单候选结果的共享元组：(0,), (1,), ..., (255,)——热路径不必每次新建
+_SINGLE_COLS: Tuple[Tuple[int], ...] = tuple((c,) for c in range(256))
 
 @dataclass(frozen=True)
 class RowAlphabetMeta:
@@ -23,27 +28,19 @@ class RowAlphabetMap:
     公开 API（稳定面）：
       - num_rows() / num_cols(row)            -> int
       - get_col(row, byte)                    -> int          （历史兼容）
-      - get_cols(row, byte)                   -> List[int]    （候选列集合；旧布局退化为 [get_col]）
+      - get_cols(row, byte)                   -> Tuple[int, ...]（候选列集合，恒为元组；旧布局退化为 (get_col,)）
+      - get_col_fast(row, byte)               -> int          （热路径：不做范围检查，仅 single8）
+      - table                                 -> memoryview   （single8 的 row<<8|byte 平铺表；其他布局为 None）
     """
 
     # ---- 装载（目录） ----
     @staticmethod
     def load(dirpath: str) -> "RowAlphabetMap":
-        meta_path = os.path.join(dirpath, "row_alph.json")
-        bin_path  = os.path.join(dirpath, "row_alph.bin")
-        with open(meta_path, "rb") as f:
-            meta_obj = json.loads(f.read().decode("utf-8"))
-        meta = RowAlphabetMeta(
-            num_rows=int(meta_obj["num_rows"]),
-            cols_per_row=list(map(int, meta_obj["cols_per_row"])),
-            format=str(meta_obj.get("format", "")),
-        )
-        with open(bin_path, "rb") as f:
-            tbl = f.read()
-        return RowAlphabetMap(meta, tbl)
+        """同一组未变更的工件返回同一个（共享、只读）实例；见 _load_pair。"""
+        return _load_pair(os.path.join(dirpath, "row_alph.json"), os.path.join(dirpath, "row_alph.bin"))
 
     # ---- 初始化 ----
-    def __init__(self, meta: RowAlphabetMeta, table_bytes: bytes):
+    def __init__(self, meta: RowAlphabetMeta, table_bytes: bytes | memoryview):
         # 基本校验
         if len(meta.cols_per_row) != meta.num_rows:
             raise ValueError("cols_per_row length mismatch with num_rows")
@@ -57,7 +54,11 @@ class RowAlphabetMap:
         single_layout_len = meta.num_rows * 256
         if len(table_bytes) == single_layout_len:
             self._layout = "single8"   # 旧布局
-            self._tbl = table_bytes    # bytes；索引结果是 0..255 的 int
+            self._tbl = memoryview(table_bytes).cast("B")  # bytes 或 mmap 視圖；索引结果是 0..255 的 int
+            # 一次性校验映射范围（工件不配套/损坏），热路径因此可以省掉逐字节检查
+            for r, m in enumerate(meta.cols_per_row):
+                if max(self._tbl[r << 8:(r + 1) << 8]) >= m:
+                    raise ValueError(f"row_alph mapping out of range at row={r} (m={m})")
         else:
             # 未来新布局：建议定义带魔数/版本的自描述格式；这里先拒绝，避免“猜错破坏用户空间”
             raise NotImplementedError(
@@ -70,6 +71,11 @@ class RowAlphabetMap:
     def num_rows(self) -> int:
         return self.meta.num_rows
 
+    @property
+    def table(self) -> memoryview | None:
+        """single8 布局的平铺表：col = table[(row << 8) | byte]；已在载入时校验范围。"""
+        return self._tbl if self._layout == "single8" else None
+
     def num_cols(self, row: int) -> int:
         self._check_row(row)
         return self.meta.cols_per_row[row]
@@ -88,14 +94,18 @@ class RowAlphabetMap:
             return col
         raise NotImplementedError(f"get_col unsupported for layout={self._layout}")
 
-    def get_cols(self, row: int, byte_val: int) -> List[int]:
+    def get_col_fast(self, row: int, byte_val: int) -> int:
+        """热路径：single8 单次索引，调用方保证 row/byte 合法。"""
+        return self._tbl[(row << 8) | byte_val]
+
+    def get_cols(self, row: int, byte_val: int) -> Tuple[int, ...]:
         """
-        候选列集合（≤ cmax）：
-          - 旧布局退化为 [get_col(row, byte)]
+        候选列集合（≤ cmax），恒为元组（调用方直接迭代，不必判型）：
+          - 旧布局退化为 (get_col(row, byte),)（共享的预建单元素元组）
           - 新布局（未来）返回多列
         """
         if self._layout == "single8":
-            return [self.get_col(row, byte_val)]
+            return _SINGLE_COLS[self.get_col(row, byte_val)]
         raise NotImplementedError(f"get_cols unsupported for layout={self._layout}")
 
     # ---- 内部校验 ----
@@ -124,14 +134,20 @@ def load_row_alph(path_or_dir: str) -> RowAlphabetMap:
     meta_path = os.path.join(dirpath, "row_alph.json")
     if not os.path.exists(meta_path):
         raise FileNotFoundError(f"row_alph.json not found beside '{path_or_dir}'")
+    return _load_pair(meta_path, path_or_dir)
+
+def _load_pair(meta_path: str, bin_path: str) -> RowAlphabetMap:
+    meta_path, bin_path = os.path.realpath(meta_path), os.path.realpath(bin_path)
+    return _load_pair_cached(meta_path, bin_path, artifact_stamp(meta_path, bin_path))
 
+@lru_cache(maxsize=8)
+def _load_pair_cached(meta_path: str, bin_path: str, _stamp: tuple) -> RowAlphabetMap:
+    # 以 (路径, mtime_ns) 为键缓存：长驻进程重复载入同一工件时不再重解析/重校验
     with open(meta_path, "rb") as f:
-        meta_obj = json.loads(f.read().decode("utf-8"))
+        meta_obj = json_loads(f.read())
     meta = RowAlphabetMeta(
         num_rows=int(meta_obj["num_rows"]),
         cols_per_row=list(map(int, meta_obj["cols_per_row"])),
         format=str(meta_obj.get("format", "")),
     )
-    with open(path_or_dir, "rb") as f:
-        tbl = f.read()
-    return RowAlphabetMap(meta, tbl)
\ No newline at end of file
+    return RowAlphabetMap(meta, map_readonly(bin_path))
\ No newline at end of file
@@ -1,16 +1,51 @@
 # src/client/engine/abp_decide.py
 from __future__ import annotations
-from typing import Iterable, Dict, Tuple, List
+from dataclasses import dataclass
+from typing import Iterable, Dict, Tuple, List, FrozenSet, Union
+
+@dataclass(frozen=True)
+class ActionSets:
+    """
+    載入時預先分好的動作集合（未列出的 id 預設 BLOCK，與 dict 版一致）：
+      - allow: 動作為 ALLOW 的 id
+      - other: 動作既非 ALLOW 也非 BLOCK 的 id（不計入任何命中）
+    判定時只剩集合運算，不再逐 id 查 dict + 比字串。
+    """
+    allow: FrozenSet[int]
+    other: FrozenSet[int]
 
 def load_id_to_action(json_dict: Dict[str, str]) -> Dict[int, str]:
     """把 JSON 內的字串 key 轉成 int key。"""
     return {int(k): v.upper() for k, v in json_dict.items()}
 
-def decide_from_rule_ids(rule_ids: Iterable[int], id_to_action: Dict[int, str]) -> Tuple[str, List[int]]:
+def compile_actions(id_to_action: Dict[int, str]) -> ActionSets:
+    return ActionSets(
+        allow=frozenset(k for k, v in id_to_action.items() if v == "ALLOW"),
+        other=frozenset(k for k, v in id_to_action.items() if v not in ("ALLOW", "BLOCK")),
+    )
+
+def load_action_sets(json_dict: Dict[str, str]) -> ActionSets:
+    """load_id_to_action + compile_actions：給需要反覆判定的呼叫方。"""
+    return compile_actions(load_id_to_action(json_dict))
+
+def decide_from_rule_ids(rule_ids: Iterable[int],
+                         id_to_action: Union[Dict[int, str], ActionSets]) -> Tuple[str, List[int]]:
     """
     ABP 優先序：命中任何 ALLOW → ALLOW；否則命中任何 BLOCK → BLOCK；否則 NOMATCH。
     回傳 (verdict, 命中的 rule_id 列表)。
+    id_to_action 可給 dict（逐 id 查表）或 compile_actions() 的結果（集合運算）。
     """
+    if isinstance(id_to_action, ActionSets):
+        ids = list(map(int, rule_ids))
+        allow = id_to_action.allow
+        if not allow.isdisjoint(ids):
+            return "ALLOW", [rid for rid in ids if rid in allow]
+        other = id_to_action.other
+        hits = [rid for rid in ids if rid not in other] if other else ids
+        if hits:
+            return "BLOCK", hits
+        return "NOMATCH", []
+
     hits_allow: List[int] = []
     hits_block: List[int] = []
     for rid in rule_ids:
@@ -23,4 +58,4 @@ def decide_from_rule_ids(rule_ids: Iterable[int], id_to_action: Dict[int, str])
         return "ALLOW", hits_allow
     if hits_block:
         return "BLOCK", hits_block
-    return "NOMATCH", []
\ No newline at end of file
+    return "NOMATCH", []
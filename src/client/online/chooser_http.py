@@ -2,8 +2,25 @@
 from __future__ import annotations
 
 import base64
-from typing import Optional, Dict, Any
+import re
+import threading
+from concurrent.futures import Future
+from typing import Optional, Dict, Any, Iterable, List, Tuple
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:  # 可選：HTTP/2 多工（需 httpx[http2]）；沒有就用 requests 的 keep-alive 連線池
+    import httpx
+except ImportError:
+    httpx = None
+
+# "gk" 欄位的 base64 判別：先去掉 ASCII 空白（換行折行的 base64 也要收，舊的非驗證 b64decode 會略過它們），
+# 再看字元集 + 長度是否為 4 的倍數；不符才當 hex。
+# url-safe 的 "-"/"_" 刻意不收（落到 fromhex → ValueError）：舊的 b64decode 會默默丟掉它們、解出錯的 GK。
+# 長度為 4 倍數的 hex（例如 "00ff"）字元集也合 base64，照舊當 base64；要明確 hex 請用 "gk_hex"。
+_B64_RE = re.compile(r"[A-Za-z0-9+/]*={0,2}")
+_ASCII_WS = str.maketrans("", "", " \t\n\r\x0b\x0c")
 
 class HttpChooser:
     """
@@ -17,20 +34,55 @@ class HttpChooser:
       - {"gk": "<base64 或 hex>"}（自動判別）
       - {"gk_hex": "<hex>"}
 
+    整行預載（可選，協定允許時）：ensure_row_payload_cached(row) 呼叫
+      POST {base_url}/ot/row        body: {"row": <int>}
+      回應 {"gks_b64": ["<base64>", ...]}（按列序）；快取後同一行的 choose_one 不再連網。
+      後端回 404 時記住不支援，退回舊的 /ot/preload 提示端點。
+
+    批次（可選）：choose_many(pairs) 呼叫
+      POST {base_url}/ot/batch      body: {"pairs": [[row, col], ...]}
+      回應 {"gks": [<同上單筆回應物件 或 base64 字串>, ...]}（與 pairs 同序）；
+      後端回 404 時記住不支援，之後直接逐筆 choose_one。
+
+    連線：
+      - 預設 requests.Session + keep-alive 連線池（pool_maxsize），對 502/503/504 自動重試 retries 次。
+      - http2=True 且已安裝 httpx[http2] 時改用 httpx.Client(http2=True)，所有請求走同一條多工連線。
+
     備註：
-      - ensure_row_payload_cached(row) 是可選優化；若後端沒有 /ot/preload，這裡靜默忽略。
+      - ensure_row_payload_cached(row) 是可選優化；若後端沒有 /ot/row 與 /ot/preload，這裡靜默忽略。
       - acquire_gk(...) 為舊介面相容，直接轉呼叫 choose_one(row, col)。
     """
 
-    def __init__(self, base_url: str, timeout: float = 10.0, extra_headers: Optional[Dict[str, str]] = None):
+    def __init__(self, base_url: str, timeout: float = 10.0, extra_headers: Optional[Dict[str, str]] = None,
+                 *, pool_maxsize: int = 256, retries: int = 2, http2: bool = False):
         self.base_url = base_url.rstrip("/")
         self.timeout = timeout
-        self.s = requests.Session()
+        self.s = _make_session(pool_maxsize=pool_maxsize, retries=retries, http2=http2)
         if extra_headers:
             self.s.headers.update(extra_headers)
+        self._batch_supported = True  # /ot/batch 回 404 後設為 False
+        self._row_supported = True    # /ot/row 回 404 後設為 False
+        self._row_cache: Dict[int, List[bytes]] = {}  # row -> 該行全部 GK（按列序）
+        # single-flight：同一 (row, col) 已有請求在路上時，其他呼叫者等同一個 Future，不重送
+        self._inflight: Dict[int, Future] = {}  # 鍵：row << 16 | col
+        self._inflight_lock = threading.Lock()
 
     # 新式接口（推薦）
     def ensure_row_payload_cached(self, row: int) -> None:
+        if row in self._row_cache:
+            return
+        if self._row_supported:
+            try:
+                resp = self.s.post(f"{self.base_url}/ot/row", json={"row": row}, timeout=self.timeout)
+                if resp.status_code == 404:
+                    self._row_supported = False
+                elif 200 <= resp.status_code < 300:
+                    gks = resp.json().get("gks_b64")
+                    if isinstance(gks, list):
+                        self._row_cache[row] = [base64.b64decode(g) for g in gks]
+                        return
+            except Exception:
+                pass
         # 後端若有預載端點就用；沒有就忽略錯誤
         try:
             url = f"{self.base_url}/ot/preload"
@@ -39,6 +91,30 @@ class HttpChooser:
             pass
 
     def choose_one(self, row: int, col: int) -> bytes:
+        gks = self._row_cache.get(row)
+        if gks is not None and 0 <= col < len(gks):
+            return gks[col]
+        key = (row << 16) | col
+        with self._inflight_lock:
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._inflight[key] = Future()
+        if not leader:
+            return fut.result()
+        try:
+            gk = self._fetch_one(row, col)
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(gk)
+            return gk
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def _fetch_one(self, row: int, col: int) -> bytes:
         last_err: Optional[Exception] = None
         candidates = [
             (f"{self.base_url}/ot", {"row": row, "col": col}),
@@ -48,22 +124,71 @@ class HttpChooser:
             try:
                 resp = self.s.post(url, json=body, timeout=self.timeout)
                 if 200 <= resp.status_code < 300:
-                    data: Dict[str, Any] = resp.json()
-                    if "gk_b64" in data:
-                        return base64.b64decode(data["gk_b64"])
-                    if "gk_hex" in data:
-                        return bytes.fromhex(data["gk_hex"])
-                    if "gk" in data:
-                        # 先試 base64，失敗再當 hex
-                        try:
-                            return base64.b64decode(data["gk"])
-                        except Exception:
-                            return bytes.fromhex(data["gk"])
+                    gk = _decode_gk(resp.json())
+                    if gk is not None:
+                        return gk
             except Exception as e:
                 last_err = e
                 continue
         raise RuntimeError(f"HttpChooser failed to fetch GK for row={row} col={col}; last_err={last_err}")
 
+    def choose_many(self, pairs: Iterable[Tuple[int, int]]) -> List[bytes]:
+        """一次往返取回多個 (row, col) 的 GK（與 pairs 同序）；無批次端點時退回逐筆 choose_one。"""
+        pairs = list(pairs)
+        if not pairs:
+            return []
+        if self._batch_supported:
+            try:
+                resp = self.s.post(f"{self.base_url}/ot/batch",
+                                   json={"pairs": [[r, c] for r, c in pairs]}, timeout=self.timeout)
+                if resp.status_code == 404:
+                    self._batch_supported = False
+                elif 200 <= resp.status_code < 300:
+                    items = resp.json().get("gks")
+                    if isinstance(items, list) and len(items) == len(pairs):
+                        gks = [_decode_gk(it if isinstance(it, dict) else {"gk_b64": it}) for it in items]
+                        if all(gk is not None for gk in gks):
+                            return gks  # type: ignore[return-value]
+            except Exception:
+                pass
+        return [self.choose_one(r, c) for r, c in pairs]
+
     # 舊式接口（相容）
     def acquire_gk(self, *, row_id: int, m: int, col: int, aad: bytes) -> bytes:
-        return self.choose_one(row_id, col)
\ No newline at end of file
+        return self.choose_one(row_id, col)
+
+def _make_session(*, pool_maxsize: int, retries: int, http2: bool):
+    """建立共用連線的 HTTP client；httpx.Client 與 requests.Session 的 post/headers 用法相同。"""
+    if http2 and httpx is not None:
+        try:
+            return httpx.Client(http2=True, limits=httpx.Limits(max_keepalive_connections=64,
+                                                                max_connections=pool_maxsize))
+        except ImportError:  # 裝了 httpx 但沒有 h2
+            pass
+    s = requests.Session()
+    try:
+        retry = Retry(total=retries, backoff_factor=0.05, status_forcelist=[502, 503, 504],
+                      allowed_methods=None)  # GK 查詢可重送：POST 也重試
+    except TypeError:  # urllib3 < 1.26
+        retry = Retry(total=retries, backoff_factor=0.05, status_forcelist=[502, 503, 504],
+                      method_whitelist=False)
+    adapter = HTTPAdapter(pool_connections=64, pool_maxsize=pool_maxsize, max_retries=retry)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    s.headers["Connection"] = "keep-alive"
+    return s
+
+
+def _decode_gk(data: Dict[str, Any]) -> Optional[bytes]:
+    """單筆 GK 回應物件 → bytes；沒有可辨識欄位時回 None。"""
+    if "gk_b64" in data:
+        return base64.b64decode(data["gk_b64"])
+    if "gk_hex" in data:
+        return bytes.fromhex(data["gk_hex"])
+    if "gk" in data:
+        # 先判斷一次再解：去空白後看起來像 base64 就當 base64，否則當 hex（不靠例外分流）
+        s = data["gk"].translate(_ASCII_WS)
+        if len(s) % 4 == 0 and _B64_RE.fullmatch(s):
+            return base64.b64decode(s, validate=False)
+        return bytes.fromhex(s)
+    return None
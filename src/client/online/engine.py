@@ -1,16 +1,26 @@
 # src/client/online/engine.py
 from __future__ import annotations
 
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, Tuple, Protocol, Iterable, List, Optional
+from functools import lru_cache
+from typing import Dict, Tuple, Protocol, Iterable, List, Optional, Type, Union
 import importlib
 from pathlib import Path
 
 from src.client.io.gdfa_loader import GDFAImage
 from src.client.io.row_alph_loader import RowAlphabetMap, load_row_alph
-from src.common.odfa.seed_rules import seed_from_gk, i2osp, PRG_LABEL_CELL
+from src.common.odfa.seed_rules import seed_from_gk, cell_pad, cell_pads, i2osp, PRG_LABEL_CELL
 from src.common.crypto.prg import prg
+from src.common.utils.encode import xor_bytes
 from src.common.urlnorm import canonicalize  # 舊管線入口用
+from src.client.online.ot_client import LocalTrivialOTChooser
+try:  # HttpChooser 需要 requests；沒裝時只是不預先註冊（仍可走 import_module 後備）
+    from src.client.online.chooser_http import HttpChooser
+except ImportError:
+    HttpChooser = None  # type: ignore[assignment,misc]
 
 # ---------------- OT chooser 介面 ----------------
 class OTChooser(Protocol):
@@ -26,6 +36,68 @@ class EngineConfig:
     session_id: str
     enable_gk_cache: bool = True
     k_bytes: int = 16  # = manifest.crypto_params.k // 8
+    pad_cache_size: int = 100_000  # pad LRU 上限（條目數）；0 = 不快取 pad。僅在 enable_gk_cache 時生效
+    # 背景預取 GK 的執行緒數；0 = 不開執行緒（chooser 必須可跨執行緒呼叫，例如 HttpChooser）。僅在 enable_gk_cache 時生效
+    fetch_workers: int = 0
+    speculate_depth: int = 4  # 轉移表未命中時，對後面幾個 byte 猜「留在同一 row」並預先取 GK
+
+# run()/run_batch() 的 URL 正規化結果快取：純函式，重複 URL 不再重做；同一輸入回傳同一個 bytes 物件
+@lru_cache(maxsize=4096)
+def _canon_cached(data: bytes | str) -> bytes:
+    return canonicalize(data)
+
+def _canon(data) -> bytes:
+    # memoryview/bytearray 不可雜湊，直接正規化
+    return _canon_cached(data) if isinstance(data, (bytes, str)) else canonicalize(data)
+
+# 非 single8 的 row_alph：稠密 (row << 8 | byte) → col 表的兩個哨兵值（表在走訪時逐格懶填）
+_COL_UNSET = 0xFFFF  # 尚未問過 row_alph
+_COL_MULTI = 0xFFFE  # 多候選列：走 get_cols 慢路徑
+
+# GK 快取槽位數（num_states × cols_per_row）不超過此值時用稠密 list，否則退回 dict
+_GK_DENSE_MAX_SLOTS = 1 << 22
+
+def _slot_table(slots: int):
+    """(table, lookup)：稠密 list[Optional[...]] 或（形狀太大時）dict；lookup(slot) 未命中回 None。"""
+    if slots <= _GK_DENSE_MAX_SLOTS:
+        table: Union[list, dict] = [None] * slots
+        return table, table.__getitem__
+    table = {}
+    return table, table.get
+
+def _make_cell_decoder(num_rows: int, aid_bits: int):
+    """
+    依 GDFA 形狀把 _decode_cell_plain 的衍生常數（row_bits/row_bytes/aid_bytes/兩個 mask）一次算好，
+    回傳 decode(plain) -> (next_row, aid)，兩種方案都超界時回 None（不拋例外；由呼叫方決定怎麼報錯）。
+    aid_bits == 0 時 B 方案不存在，直接生成無回退的版本。
+    """
+    row_bits = max(1, (num_rows - 1).bit_length())
+    row_bytes = (row_bits + 7) // 8
+    mask_row = (1 << row_bits) - 1
+    from_bytes = int.from_bytes
+
+    if not aid_bits:
+        def decode(plain: bytes) -> Optional[Tuple[int, int]]:
+            nr = from_bytes(plain[:row_bytes], "little") & mask_row
+            if nr < num_rows:
+                return nr, 0
+            return None
+        return decode
+
+    aid_bytes = (aid_bits + 7) // 8
+    mask_aid = (1 << aid_bits) - 1
+    a_aid_end = row_bytes + aid_bytes
+    b_row_end = aid_bytes + row_bytes
+
+    def decode(plain: bytes) -> Optional[Tuple[int, int]]:
+        nr = from_bytes(plain[:row_bytes], "little") & mask_row
+        if nr < num_rows:
+            return nr, from_bytes(plain[row_bytes:a_aid_end], "little") & mask_aid
+        nr2 = from_bytes(plain[aid_bytes:b_row_end], "little") & mask_row
+        if nr2 < num_rows:
+            return nr2, from_bytes(plain[:aid_bytes], "little") & mask_aid
+        return None
+    return decode
 
 # ---------------- 主引擎 ----------------
 class ZIDSEngine:
@@ -42,12 +114,58 @@ class ZIDSEngine:
         self.row_alph = row_alph
         self.chooser = chooser
         self.cfg = cfg
-        self._gk_cache: Dict[Tuple[int, int], bytes] = {}
+        # chooser 介面在建構時解析一次（優先新式接口），_get_gk 不再逐 cell hasattr 探測
+        self._preload_fn = getattr(chooser, "ensure_row_payload_cached", None)
+        # 已預載完成的 row（每行只預載一次）；只在呼叫端執行緒讀寫，背景預取執行緒不碰它
+        self._preloaded: set = set()
+        # 舊式 acquire_gk 的 AAD：只有最後 4 bytes（row）會變；每個 row 組一次
+        self._aad_prefix = b"ZIDS|GK|sid=" + cfg.session_id.encode("ascii") + b"|row="
+        self._aad_cache: Dict[int, bytes] = {}
+        if hasattr(chooser, "choose_one"):
+            self._choose_fn = chooser.choose_one  # type: ignore[attr-defined]
+        elif hasattr(chooser, "acquire_gk"):
+            self._choose_fn = self._acquire_gk_adapter
+        else:
+            raise RuntimeError("OT chooser does not provide choose_one()/acquire_gk()")
+        # GK 快取：槽位 = row * cols_per_row + col（單一 int 索引，不建 tuple key）
+        #   稠密：list[Optional[bytes]]，命中只是一次 list 索引；形狀太大時退回 dict（稀疏）
+        self._gk_cols = gdfa.cols_per_row
+        slots = gdfa.num_states * self._gk_cols
+        self._gk_cache, self._gk_lookup = _slot_table(slots)
+        # 轉移表（single8 驅動迴圈用）：同一 session 內 (row, col) 解出的 (next_row, 命中 AID) 是確定的，
+        # 第一次開 cell 後記下，之後同槽位只剩查表；與 GK 快取同開同關
+        self._trans, self._trans_lookup = _slot_table(slots)
+        # pad LRU（槽位 → pad）：GK 快取命中後仍要重做的 seed+PRG 也省掉
+        self._pad_cache: Optional[OrderedDict[int, bytes]] = (
+            OrderedDict() if cfg.enable_gk_cache and cfg.pad_cache_size > 0 else None
+        )
+        # row_alph 沒有 single8 平鋪表時，自建稠密 uint16 表取代逐 byte 的 get_cols 分派
+        self._col_tbl: Optional[array] = (
+            None if row_alph.table is not None else array("H", [_COL_UNSET]) * (row_alph.num_rows << 8)
+        )
+        # cell 明文解碼：形狀常數在載入後固定，預先折疊
+        self._decode_cell_plain = _make_cell_decoder(gdfa.num_states, getattr(gdfa, "aid_bits", 0) or 0)
+        # 投機預取：HTTP 往返與本地 PRG/XOR 重疊（槽位 → 進行中的 Future）
+        self._executor: Optional[ThreadPoolExecutor] = (
+            ThreadPoolExecutor(max_workers=cfg.fetch_workers, thread_name_prefix="zids-gk")
+            if cfg.enable_gk_cache and cfg.fetch_workers > 0 else None
+        )
+        self._spec: Dict[int, Future] = {}
+        self._specialize()
+
+    def close(self) -> None:
+        """停掉背景預取執行緒（沒開就不做事）。"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            self._spec.clear()
 
     # ----- GK/PRG -----
     def _aad_for_row(self, row_id: int) -> bytes:
-        return (b"ZIDS|GK|sid=" + self.cfg.session_id.encode("ascii") +
-                b"|row=" + i2osp(row_id, 4))
+        aad = self._aad_cache.get(row_id)
+        if aad is None:
+            aad = self._aad_cache[row_id] = self._aad_prefix + i2osp(row_id, 4)
+        return aad
 
     def _derive_seed(self, gk: bytes, row: int, col: int) -> bytes:
         return seed_from_gk(gk, row, col, self.cfg.k_bytes)
@@ -55,101 +173,207 @@ class ZIDSEngine:
     def _prg(self, seed: bytes, nbytes: int) -> bytes:
         return prg(seed, PRG_LABEL_CELL, nbytes)
 
+    def _acquire_gk_adapter(self, row: int, col: int) -> bytes:
+        """舊式接口 acquire_gk(...) 轉成 choose_one(row, col) 的形狀。"""
+        m = self.row_alph.num_cols(row)
+        return self.chooser.acquire_gk(row_id=row, m=m, col=col, aad=self._aad_for_row(row))  # type: ignore[attr-defined]
+
     def _get_gk(self, row: int, col: int) -> bytes:
         if self.cfg.enable_gk_cache:
-            key = (row, col)
-            if key in self._gk_cache:
-                return self._gk_cache[key]
-
-        # 優先新式接口
-        if hasattr(self.chooser, "ensure_row_payload_cached"):
-            self.chooser.ensure_row_payload_cached(row)
-        if hasattr(self.chooser, "choose_one"):
-            gk = self.chooser.choose_one(row, col)  # type: ignore[attr-defined]
-        elif hasattr(self.chooser, "acquire_gk"):
-            m = self.row_alph.num_cols(row)
-            gk = self.chooser.acquire_gk(row_id=row, m=m, col=col, aad=self._aad_for_row(row))  # type: ignore[attr-defined]
-        else:
-            raise RuntimeError("OT chooser does not provide choose_one()/acquire_gk()")
+            slot = row * self._gk_cols + col
+            gk = self._gk_lookup(slot)
+            if gk is not None:
+                return gk
+            fut = self._spec.pop(slot, None)
+            if fut is not None:
+                try:
+                    gk = self._gk_cache[slot] = fut.result()
+                    return gk
+                except Exception:
+                    pass  # 投機那次失敗：下面同步重取，錯誤從這裡原樣拋出
 
+        gk = self._fetch_gk(row, col)
         if self.cfg.enable_gk_cache:
-            self._gk_cache[(row, col)] = gk
+            self._gk_cache[slot] = gk
         return gk
 
+    def _ensure_preloaded(self, row: int) -> None:
+        # 預載完成後才記下：預載失敗（拋例外）的 row 下次還會重試
+        if self._preload_fn is not None and row not in self._preloaded:
+            self._preload_fn(row)
+            self._preloaded.add(row)
+
+    def _fetch_gk(self, row: int, col: int) -> bytes:
+        self._ensure_preloaded(row)
+        return self._choose_fn(row, col)
+
+    def _reap_spec(self) -> None:
+        """
+        一次走訪結束時呼叫：已完成的投機 Future 從 _spec 移除，成功取回的 GK 放進 GK 快取。
+        猜錯（走訪離開了該 row）的槽位之後不一定會再被造訪：不收掉就一直掛在 _spec，
+        之後冷造訪同一槽位還會再取一次。還在進行中的留到下一次走訪再收。
+        """
+        spec = self._spec
+        done = [slot for slot, fut in spec.items() if fut.done()]
+        for slot in done:
+            fut = spec.pop(slot)
+            if fut.exception() is None and self._gk_lookup(slot) is None:
+                self._gk_cache[slot] = fut.result()
+
+    def _speculate(self, tbl: memoryview, data: bytes, start: int, row: int) -> None:
+        """
+        轉移表在 (row, data[start-1]) 未命中、即將同步取 GK 時呼叫：
+        假設接下來幾個 byte 仍停在 row（DFA 在起始列自迴圈最常見），把它們的 GK 先丟給背景執行緒取。
+        猜錯只浪費一次往返；猜對時同步路徑直接拿 Future 結果。
+        row 的預載在這裡（呼叫端執行緒）先做完再 submit：背景只跑 choose，
+        不會有「主執行緒以為已預載、其實預載還在背景進行中」的競態。
+        """
+        submit = self._executor.submit  # type: ignore[union-attr]
+        spec = self._spec
+        cols = self._gk_cols
+        choose = self._choose_fn
+        for b in data[start:start + self.cfg.speculate_depth]:
+            col = tbl[(row << 8) | b]
+            slot = row * cols + col
+            if slot in spec or self._gk_lookup(slot) is not None or self._trans_lookup(slot) is not None:
+                continue
+            self._ensure_preloaded(row)
+            spec[slot] = submit(choose, row, col)
+
+    def _prefetch_rows(self, rows: Iterable[int]) -> None:
+        """chooser 有 prefetch(rows)（整行載荷批次預載）時，把尚未預載的 row 一次交給它；否則不做事。"""
+        prefetch = getattr(self.chooser, "prefetch", None)
+        if prefetch is None:
+            return
+        todo = [r for r in dict.fromkeys(rows) if r not in self._preloaded]
+        if todo:
+            prefetch(todo)
+            self._preloaded.update(todo)
+
+    def _prefetch_gks(self, pairs: Iterable[Tuple[int, int]]) -> None:
+        """
+        chooser 有 choose_many（批次端點）時，把尚未快取、也尚未解出轉移的 (row, col) GK 一次取回；
+        否則不做事（之後照常逐筆 _get_gk）。
+        """
+        choose_many = getattr(self.chooser, "choose_many", None)
+        if choose_many is None or not self.cfg.enable_gk_cache:
+            return
+        cols = self._gk_cols
+        todo = [(r, c) for r, c in dict.fromkeys(pairs)
+                if self._gk_lookup(r * cols + c) is None and self._trans_lookup(r * cols + c) is None]
+        if not todo:
+            return
+        gks = choose_many(todo)
+        for (r, c), gk in zip(todo, gks):
+            self._gk_cache[r * cols + c] = gk
+        # 這批 cell 接著都會被開：pad 一次批次算好放進 LRU
+        cache = self._pad_cache
+        if cache is not None:
+            pads = cell_pads([(gk, r, c) for (r, c), gk in zip(todo, gks)], self.cfg.k_bytes, self.gdfa.cell_bytes)
+            for (r, c), pad in zip(todo, pads):
+                cache[r * cols + c] = pad
+            while len(cache) > self.cfg.pad_cache_size:
+                cache.popitem(last=False)
+
+    def _get_pad(self, row: int, col: int) -> bytes:
+        cache = self._pad_cache
+        if cache is None:
+            return cell_pad(self._get_gk(row, col), row, col, self.cfg.k_bytes, self.gdfa.cell_bytes)
+        slot = row * self._gk_cols + col
+        pad = cache.get(slot)
+        if pad is not None:
+            cache.move_to_end(slot)
+            return pad
+        pad = cache[slot] = cell_pad(self._get_gk(row, col), row, col, self.cfg.k_bytes, self.gdfa.cell_bytes)
+        if len(cache) > self.cfg.pad_cache_size:
+            cache.popitem(last=False)
+        return pad
+
     # ----- 解 cell -----
-    def _decode_cell_plain(self, plain: bytes) -> tuple[int, int]:
+    def _decode_cell_plain(self, plain: bytes) -> Optional[tuple[int, int]]:
         """
         明文佈局（LE）：
           A 方案：[next_row(row_bits)][aid(aid_bits)][padding]
           若 next_row 超界，回退為：
           B 方案：[aid(aid_bits)][next_row(row_bits)][padding]
+        兩者皆超界 → None。
+        （__init__ 會以 _make_cell_decoder 的常數化版本蓋掉本方法；這裡保留通用寫法作為規格）
         """
-        num_rows = self.gdfa.num_states
-        row_bits = max(1, (num_rows - 1).bit_length())
-        row_bytes = (row_bits + 7) // 8
-
-        aid_bits = getattr(self.gdfa, "aid_bits", 0) or 0
-        aid_bytes = (aid_bits + 7) // 8 if aid_bits > 0 else 0
+        return _make_cell_decoder(self.gdfa.num_states, getattr(self.gdfa, "aid_bits", 0) or 0)(plain)
 
-        mask_row = (1 << row_bits) - 1
-        mask_aid = (1 << aid_bits) - 1 if aid_bits > 0 else 0
-
-        nr = int.from_bytes(plain[:row_bytes], "little") & mask_row
-        aid = 0
-        if aid_bits:
-            aid = int.from_bytes(plain[row_bytes:row_bytes + aid_bytes], "little") & mask_aid
-        if 0 <= nr < num_rows:
-            return nr, aid
-
-        if aid_bits:
-            aid2 = int.from_bytes(plain[:aid_bytes], "little") & mask_aid
-            nr2 = int.from_bytes(plain[aid_bytes:aid_bytes + row_bytes], "little") & mask_row
-            if 0 <= nr2 < num_rows:
-                return nr2, aid2
-
-        raise ValueError("decoded next_row out of range")
-
-    def _open_cell(self, row: int, col: int) -> tuple[int, int]:
+    def _open_cell(self, row: int, col: int) -> Optional[tuple[int, int]]:
+        """(next_row, cell_aid)；解出的 next_row 超界（錯的列/GK）回 None。"""
         ct = self.gdfa.get_cell_cipher(row, col)
-        gk = self._get_gk(row, col)
-        seed = self._derive_seed(gk, row, col)
-        pad = self._prg(seed, self.gdfa.cell_bytes)
-        plain = bytes(a ^ b for a, b in zip(ct, pad))
-        return self._decode_cell_plain(plain)
+        return self._decode_cell_plain(xor_bytes(ct, self._get_pad(row, col)))
 
     # ----- 執行（舊 URL 正規化入口；保留相容） -----
     def run(self, data: bytes) -> List[int]:
-        data = canonicalize(data)
+        data = _canon(data)
         return self._run_bytes(data)
 
+    # ----- 批次執行（同 run 的正規化）：共享前綴只走一次 -----
+    def run_batch(self, inputs: Iterable[bytes | str | memoryview], *, canonical: bool = False) -> List[List[int]]:
+        """
+        回傳與 inputs 同序的命中列表；GK 快取在整批之間共享。
+        canonical=True：inputs 已是 canonicalize() 的輸出（例如串流讀檔時先行正規化），不再重做；
+        str 以 UTF-8 編碼、其他 bytes-like 轉成 bytes（批次路徑要排序、切前綴）。
+        """
+        if canonical:
+            return self._run_bytes_batch([
+                x if type(x) is bytes else x.encode("utf-8") if isinstance(x, str) else bytes(x)
+                for x in inputs
+            ])
+        return self._run_bytes_batch([_canon(x) for x in inputs])
+
     # ----- 執行（ABP 已正規化 payload；不要再 canonicalize） -----
-    def run_abp_payload(self, payload: str | bytes) -> List[int]:
-        data = payload if isinstance(payload, bytes) else payload.encode("utf-8")
+    def run_abp_payload(self, payload: str | bytes | memoryview) -> List[int]:
+        # bytes-like（含 mmap 的 memoryview）直接逐 byte 走，不複製
+        data = payload.encode("utf-8") if isinstance(payload, str) else payload
         return self._run_bytes(data)
 
     # ----- 內部主迴圈 -----
     def _run_bytes(self, data: bytes) -> List[int]:
+        tbl = self.row_alph.table  # single8：每 (row, byte) 恰一列 → 走緊湊驅動迴圈
+        if tbl is not None:
+            return self._drive(tbl, data)
+
         hits: List[int] = []
+        append = hits.append  # 綁定一次；CPython 下比預配陣列 + 索引計數更快
         row = self.gdfa.start_row
+        col_tbl = self._col_tbl
+        step = self._step_fn()
 
         for b in data:
-            cols: Iterable[int] = self.row_alph.get_cols(row, b)
-            if isinstance(cols, int):
-                cols = [cols]
+            i = (row << 8) | b
+            c = col_tbl[i]
+            if c == _COL_UNSET:
+                c = col_tbl[i] = self._fill_col(row, b)
+            if c != _COL_MULTI:
+                # 單一候選列：與 single8 相同的（帶轉移表的）開 cell
+                row, hit = step(row, c, b)
+                if hit:
+                    append(hit)
+                continue
+
+            cols: Tuple[int, ...] = self.row_alph.get_cols(row, b)
 
             next_row: Optional[int] = None
-            last_err: Optional[Exception] = None
+            last_err: Optional[Exception | str] = None
 
             for col in cols:
                 try:
-                    nr, aid_cell = self._open_cell(row, col)
+                    opened = self._open_cell(row, col)
+                    if opened is None:
+                        last_err = "decoded next_row out of range"
+                        continue
+                    nr, aid_cell = opened
                     row = nr  # 遷移
                     # 命中：先 row_aid，再 cell_aid
                     aid_row = self.gdfa.get_row_aid(row) if hasattr(self.gdfa, "get_row_aid") else 0
                     if aid_row > 0:
-                        hits.append(aid_row)
+                        append(aid_row)
                     elif aid_cell > 0:
-                        hits.append(aid_cell)
+                        append(aid_cell)
                     next_row = nr
                     break
                 except Exception as e:
@@ -157,10 +381,238 @@ class ZIDSEngine:
                     continue
 
             if next_row is None:
-                raise ValueError(f"no valid column among {list(cols)} at row={row} byte={b} ({last_err})")
+                raise ValueError("no valid column among %r at row=%d byte=%d (%s)" % (list(cols), row, b, last_err))
 
         return hits
 
+    def _fill_col(self, row: int, b: int) -> int:
+        """第一次遇到 (row, b)：問 row_alph 一次，單一候選記成列號，多候選記成 _COL_MULTI。"""
+        cols = self.row_alph.get_cols(row, b)  # 約定：恆為 tuple
+        return cols[0] if len(cols) == 1 and cols[0] < _COL_MULTI else _COL_MULTI
+
+    def _run_bytes_batch(self, datas: List[bytes]) -> List[List[int]]:
+        """
+        按字典序走訪輸入（等同 DFS 一棵前綴樹）：與上一筆的共同前綴直接沿用
+        已記錄的 (row, 命中數)，只從第一個不同的 byte 開始分叉。
+        """
+        tbl = self.row_alph.table
+        if tbl is None:
+            return [self._run_bytes(d) for d in datas]
+
+        out: List[List[int]] = [[] for _ in datas]
+        step = self._step_fn()
+        if self.cfg.enable_gk_cache and (hasattr(self.chooser, "choose_many") or hasattr(self.chooser, "prefetch")):
+            self._warm_batch(tbl, datas, step)
+
+        prev = b""
+        rows: List[int] = [self.gdfa.start_row]  # rows[i]：走完 prev[:i] 後的 row
+        marks: List[int] = [0]                   # marks[i]：走完 prev[:i] 後的命中數
+        hits: List[int] = []
+        push_hit, push_row, push_mark = hits.append, rows.append, marks.append
+        for idx in sorted(range(len(datas)), key=datas.__getitem__):
+            data = datas[idx]
+            lcp = 0
+            n = min(len(prev), len(data))
+            while lcp < n and prev[lcp] == data[lcp]:
+                lcp += 1
+            del rows[lcp + 1:], marks[lcp + 1:], hits[marks[lcp]:]
+
+            row = rows[lcp]
+            for b in data[lcp:]:
+                row, hit = step(row, tbl[(row << 8) | b], b)
+                if hit:
+                    push_hit(hit)
+                push_row(row)
+                push_mark(len(hits))
+
+            out[idx] = list(hits)
+            prev = data
+        if self._spec:
+            self._reap_spec()
+        return out
+
+    def _warm_batch(self, tbl: memoryview, datas: List[bytes], step) -> None:
+        """
+        逐層（同一深度）推進所有輸入：每層要用的 row 先經 _prefetch_rows 整批預載、
+        (row, col) 再經 _prefetch_gks 一次批次取回，
+        再 step 填好轉移表；之後的前綴樹走訪就只剩查表。下一層的 row 要等本層解密才知道，
+        所以一層一次往返。
+        """
+        active = [(self.gdfa.start_row, d) for d in dict.fromkeys(datas) if d]
+        depth = 0
+        while active:
+            pairs = [(row, tbl[(row << 8) | d[depth]]) for row, d in active]
+            self._prefetch_rows(row for row, _ in active)
+            self._prefetch_gks(pairs)
+            nxt = []
+            for (row, d), (_, col) in zip(active, pairs):
+                nr, _hit = step(row, col, d[depth])
+                if len(d) > depth + 1:
+                    nxt.append((nr, d))
+            active = nxt
+            depth += 1
+
+    def _resolve(self, row: int, col: int, b: int) -> Tuple[int, int]:
+        """
+        融合開 cell：取密文 cell → GK → cell_pad（seed+PRG 融合）→ XOR → 解碼，
+        回傳 (next_row, hit)；hit = 先 row_aid、再 cell_aid，皆無則 0。
+        單一候選列沒有別的列可試：不包 try，解碼失敗（None）才組錯誤訊息；GK 取得失敗等例外原樣上拋。
+        """
+        cell_bytes = self.gdfa.cell_bytes
+        x = int.from_bytes(self.gdfa.get_cell_cipher(row, col), "little") ^ int.from_bytes(self._get_pad(row, col), "little")
+        opened = self._decode_cell_plain(x.to_bytes(cell_bytes, "little"))  # 遷移
+        if opened is None:
+            raise ValueError(f"no valid column among [{col}] at row={row} byte={b} (decoded next_row out of range)")
+        nr, aid_cell = opened
+        aid_row = self.gdfa.get_row_aid(nr) if hasattr(self.gdfa, "get_row_aid") else 0
+        if aid_row > 0:
+            return nr, aid_row
+        return nr, aid_cell if aid_cell > 0 else 0
+
+    def _step_fn(self):
+        """
+        回傳 step(row, col, b) -> (next_row, hit)。開 GK 快取時先查轉移表（命中即純查表，
+        不再做任何 HMAC/XOR/解碼），未命中才 _resolve 並記下。
+        """
+        resolve = self._resolve
+        if not self.cfg.enable_gk_cache:
+            return resolve
+        cols = self._gk_cols
+        trans = self._trans
+        lookup = self._trans_lookup
+
+        def step(row: int, col: int, b: int) -> Tuple[int, int]:
+            slot = row * cols + col
+            t = lookup(slot)
+            if t is None:
+                t = trans[slot] = resolve(row, col, b)
+            return t
+
+        return step
+
+    def _specialize(self) -> None:
+        """
+        依本次載入的 GDFA 形狀與設定生成 _resolve / _walk（exec 模板）：
+          - cell_bytes、cols_per_row 以常數寫進 bytecode
+          - 沒有 row_aid 表、或關閉 GK 快取（無轉移表）時，對應分支整段不生成
+          - 開背景預取時，轉移表未命中先呼叫 _speculate 再同步開 cell
+          - _get_pad / cell 解碼內聯進 resolve：pad LRU、GK 快取與位元拆解都在同一個函式裡，
+            熱路徑不再經過 self._xxx 方法分派
+        _resolve 方法本體保留作為語義規格；生成版覆蓋在實例上。
+        """
+        has_row_aid = callable(getattr(self.gdfa, "get_row_aid", None))
+        memo = self.cfg.enable_gk_cache
+        spec = self._executor is not None  # 只在 memo 時才會開
+        cell_bytes = self.gdfa.cell_bytes
+        num_rows = self.gdfa.num_states
+        aid_bits = getattr(self.gdfa, "aid_bits", 0) or 0
+        row_bits = max(1, (num_rows - 1).bit_length())
+        mask_row = (1 << row_bits) - 1
+        bad = "        raise ValueError(f'no valid column among [{col}] at row={row} byte={b} (decoded next_row out of range)')"
+        lines = [
+            "def resolve(row, col, b):",
+            f"    slot = row * {self._gk_cols} + col",
+        ]
+        # pad：LRU → GK 快取 → chooser（_get_pad/_get_gk 的內聯版；冷路徑才呼叫 get_gk）
+        if self._pad_cache is not None:
+            lines += [
+                "    pad = pad_get(slot)",
+                "    if pad is None:",
+                "        gk = gk_lookup(slot)",
+                "        if gk is None:",
+                "            gk = get_gk(row, col)",
+                f"        pad = pads[slot] = cell_pad(gk, row, col, {self.cfg.k_bytes}, {cell_bytes})",
+                f"        if len(pads) > {self.cfg.pad_cache_size}:",
+                "            evict(False)",
+                "    else:",
+                "        touch(slot)",
+            ]
+        else:
+            lines += ["    gk = gk_lookup(slot)", "    if gk is None:"] if memo else []
+            lines += [
+                ("        " if memo else "    ") + "gk = get_gk(row, col)",
+                f"    pad = cell_pad(gk, row, col, {self.cfg.k_bytes}, {cell_bytes})",
+            ]
+        # 解碼直接在 XOR 後的 int 上做位移/遮罩（_make_cell_decoder 的內聯版，不再 to_bytes 回 bytes）
+        lines += [
+            "    x = from_bytes(cell(row, col), 'little') ^ from_bytes(pad, 'little')",
+            f"    nr = x & {mask_row}",
+        ]
+        if not aid_bits:
+            lines += [f"    if nr >= {num_rows}:", bad, "    aid_cell = 0"]
+        else:
+            row_bytes = (row_bits + 7) // 8
+            aid_bytes = (aid_bits + 7) // 8
+            mask_aid = (1 << aid_bits) - 1
+            lines += [
+                f"    if nr < {num_rows}:",
+                f"        aid_cell = (x >> {row_bytes * 8}) & {mask_aid}",
+                "    else:",
+                f"        nr = (x >> {aid_bytes * 8}) & {mask_row}",
+                f"        if nr >= {num_rows}:",
+                "    " + bad,
+                f"        aid_cell = x & {mask_aid}",
+            ]
+        if has_row_aid:
+            lines += [
+                "    aid_row = row_aid(nr)",
+                "    if aid_row > 0:",
+                "        return nr, aid_row",
+            ]
+        lines += [
+            "    return nr, aid_cell if aid_cell > 0 else 0",
+            "",
+            "def walk(tbl, data, row):",
+            "    hits = []",
+            "    append = hits.append",
+            "    for i, b in enumerate(data):" if spec else "    for b in data:",
+            "        col = tbl[(row << 8) | b]",
+        ]
+        if memo:
+            lines += [
+                f"        slot = row * {self._gk_cols} + col",
+                "        t = lookup(slot)",
+                "        if t is None:",
+            ] + (["            speculate(tbl, data, i + 1, row)"] if spec else []) + [
+                "            t = trans[slot] = resolve(row, col, b)",
+                "        row, hit = t",
+            ]
+        else:
+            lines += ["        row, hit = resolve(row, col, b)"]
+        lines += [
+            "        if hit:",
+            "            append(hit)",
+            "    return hits",
+        ]
+        ns = {
+            "from_bytes": int.from_bytes,
+            "cell": self.gdfa.get_cell_cipher,
+            "cell_pad": cell_pad,
+            "get_gk": self._get_gk,
+            "gk_lookup": self._gk_lookup,
+            "row_aid": getattr(self.gdfa, "get_row_aid", None),
+            "lookup": self._trans_lookup,
+            "trans": self._trans,
+            "speculate": self._speculate,
+        }
+        if self._pad_cache is not None:
+            ns.update(pads=self._pad_cache, pad_get=self._pad_cache.get,
+                      touch=self._pad_cache.move_to_end, evict=self._pad_cache.popitem)
+        exec(compile("\n".join(lines) + "\n", f"<zids walk {self.gdfa.num_states}x{self._gk_cols}x{cell_bytes}>", "exec"), ns)
+        self._resolve = ns["resolve"]
+        self._walk = ns["walk"]
+
+    def _drive(self, tbl: memoryview, data: bytes) -> List[int]:
+        """
+        single8 驅動迴圈：col = tbl[row<<8 | b]（載入時已校驗範圍）。
+        開 GK 快取時，(row, col) → (next_row, hit) 的轉移表直接內聯在迴圈裡：
+        熱路徑只剩兩次查表；只有新槽位才走 _resolve 的融合開 cell。迴圈本體由 _specialize 生成。
+        """
+        hits = self._walk(tbl, data, self.gdfa.start_row)
+        if self._spec:
+            self._reap_spec()
+        return hits
+
 # ---------------- 模組級入口（給 CLI/工具呼叫） ----------------
 ENGINE: Optional[ZIDSEngine] = None  # 由 init_for_cli() 或服務啟動時注入
 
@@ -178,6 +630,26 @@ def eval_rule_ids(payload: str | bytes):
         raise RuntimeError("ENGINE is not initialized. Call init_for_cli(...) or set_engine(...).")
     return ENGINE.run_abp_payload(payload)
 
+# ---------------- chooser 註冊表（init_for_cli 先查表，未知名稱才 import_module） ----------------
+_CHOOSER_REGISTRY: Dict[str, Type[OTChooser]] = {
+    "local": LocalTrivialOTChooser,
+    "src.client.online.ot_client:LocalTrivialOTChooser": LocalTrivialOTChooser,
+}
+if HttpChooser is not None:
+    _CHOOSER_REGISTRY["http"] = HttpChooser
+    _CHOOSER_REGISTRY["src.client.online.chooser_http:HttpChooser"] = HttpChooser
+
+def register_chooser(name: str, cls: Type[OTChooser]) -> None:
+    _CHOOSER_REGISTRY[name] = cls
+
+def _resolve_chooser_cls(spec: str) -> Type[OTChooser]:
+    cls = _CHOOSER_REGISTRY.get(spec)
+    if cls is None:
+        # 動態載入 "pkg.mod:ClassName"；載入一次後記進註冊表
+        mod_name, cls_name = spec.split(":")
+        cls = _CHOOSER_REGISTRY[spec] = getattr(importlib.import_module(mod_name), cls_name)
+    return cls
+
 # ---------------- CLI 初始化（只支援真引擎；不再提供 regex 後備） ----------------
 def init_for_cli(cfg: dict) -> None:
     """
@@ -186,8 +658,9 @@ def init_for_cli(cfg: dict) -> None:
         "gdfa":    "path/to/gdfa.bin",
         "rowalph": "path/to/row_alph.bin",  # 同目錄要有 row_alph.json
         "session_id": "cli",
-        "chooser_cls": "pkg.mod:ClassName",
-        "chooser_kwargs": { ... }
+        "chooser_cls": "http",              # 註冊名（http/local）或 "pkg.mod:ClassName"
+        "chooser_kwargs": { ... },
+        "fetch_workers": 0                  # 可選；>0 開背景 GK 預取（chooser 須執行緒安全）
       }
     """
     # 基本校驗
@@ -198,10 +671,7 @@ def init_for_cli(cfg: dict) -> None:
     if not cls_spec:
         raise RuntimeError("init_for_cli: missing 'chooser_cls' (e.g., 'src.client.online.chooser_http:HttpChooser')")
 
-    # 動態載入 chooser 類
-    mod_name, cls_name = cls_spec.split(":")
-    mod = importlib.import_module(mod_name)
-    chooser_cls = getattr(mod, cls_name)
+    chooser_cls = _resolve_chooser_cls(cls_spec)
     chooser_kwargs = cfg.get("chooser_kwargs", {}) or {}
     chooser: OTChooser = chooser_cls(**chooser_kwargs)
 
@@ -218,7 +688,8 @@ def init_for_cli(cfg: dict) -> None:
     if getattr(gdfa, "alphabet_size", 256) != 256:
         raise ValueError("this client assumes 256-byte input alphabet; got gdfa.alphabet_size != 256")
 
-    set_engine(ZIDSEngine(gdfa, row_alph, chooser, EngineConfig(session_id=sid)))
+    set_engine(ZIDSEngine(gdfa, row_alph, chooser,
+                          EngineConfig(session_id=sid, fetch_workers=int(cfg.get("fetch_workers", 0)))))
 
 def _require_path(cfg: dict, key: str) -> str:
     p = cfg.get(key)
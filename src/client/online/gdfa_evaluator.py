@@ -6,6 +6,7 @@ from typing import Iterable, List, Tuple, Protocol, Optional
 from src.common.odfa.params import SecurityParams, SparsityParams, PackingParams
 from src.server.offline.gdfa_builder import GDFAPublicHeader, GDFASecrets  # secrets 僅供本地測試用
 from src.common.crypto.prg import G_bits
+from src.common.utils.encode import xor_bytes
 
 
 # =========================
@@ -185,7 +186,7 @@ class GDFARunner:
             # 2) 取出該欄位密文並解密
             enc_row = self.store.get(row)
             ct = self._slice_cell(enc_row, col)
-            pt = bytes(a ^ b for a, b in zip(ct, pad))
+            pt = xor_bytes(ct, pad)
 
             # 3) 解析明文，更新 row 與 attack 狀態
             ns, aid = _unpack_cell(pt, self.fmt)
@@ -1,15 +1,15 @@
 # src/client/online/ot_client.py
 from __future__ import annotations
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Iterable
 
-from src.common.odfa.seed_rules import seed_from_gk
+from src.common.odfa.seed_rules import seed_resolver
 
 class LocalTrivialOTChooser:
     """
     本地评测用的“假 OT”：
       - 一次取整行载荷 (aad, payload)，缓存
-      - 第一次使用某 (row, logical_col) 时，通过对比“客户端种子 vs 服务器种子”
-        解析出 payload 的物理槽位，建立映射 (row, logical_col) -> slot
+      - 第一次使用某 row 时，通过对比“客户端种子 vs 服务器种子”一次解析出整行
+        logical_col -> 物理槽位 的置换（每行只做一次）
       - 以后直接用该 slot 取 GK
     这样适配了“服务器可对 payload 做置换/填充”的情况，避免列错位。
     """
@@ -18,33 +18,62 @@ class LocalTrivialOTChooser:
         self.session_id = session_id
         self.seed_k_bytes = seed_k_bytes
         self._row_payload_cache: Dict[int, Tuple[bytes, List[bytes]]] = {}
-        self._slot_map: Dict[Tuple[int, int], int] = {}  # (row, logical_col) -> physical_slot
+        # row -> perm，perm[logical_col] = physical_slot（-1 = 该列在 payload 里找不到）
+        self._row_perm_cache: Dict[int, List[int]] = {}
 
     def ensure_row_payload_cached(self, row: int) -> None:
         if row not in self._row_payload_cache:
             self._row_payload_cache[row] = self.server.ot_row_payload(self.session_id, row)
 
+    def prefetch(self, rows: Iterable[int]) -> None:
+        """一次取回多行载荷（服务器有 ot_rows_payload 时走单次批量调用）；已缓存的行跳过。"""
+        todo = [r for r in dict.fromkeys(rows) if r not in self._row_payload_cache]
+        if not todo:
+            return
+        batch = getattr(self.server, "ot_rows_payload", None)
+        if batch is None:
+            for r in todo:
+                self._row_payload_cache[r] = self.server.ot_row_payload(self.session_id, r)
+            return
+        for r, item in zip(todo, batch(self.session_id, todo)):
+            self._row_payload_cache[r] = item
+
     def get_row_payload(self, row: int) -> Tuple[bytes, List[bytes]]:
         self.ensure_row_payload_cached(row)
         return self._row_payload_cache[row]
 
-    def _resolve_slot_for_col(self, row: int, logical_col: int) -> int:
-        key = (row, logical_col)
-        if key in self._slot_map:
-            return self._slot_map[key]
-
-        aad, payload = self.get_row_payload(row)
-        # 服务器（真源）给出该逻辑列对应的“正确种子”
-        seed_srv = self.server.sessions.derive_seed(self.session_id, row, logical_col, self.seed_k_bytes)
-
-        # 扫描这一行 payload 的每个物理槽位，寻找与 seed_srv 一致的 GK
+    def _row_perm(self, row: int) -> List[int]:
+        """
+        整行一次解析：先取服务器端 m 个种子，再对每个槽位从“尚未配对的列”里找种子一致者。
+        先试 c = slot（未置换的常见情形），整行约 m 次客户端 HMAC；最坏 O(m²)，但每行只做一次。
+        """
+        perm = self._row_perm_cache.get(row)
+        if perm is not None:
+            return perm
+        _, payload = self.get_row_payload(row)
+        m = len(payload)
+        k = self.seed_k_bytes
+        seeds_srv = [self.server.sessions.derive_seed(self.session_id, row, c, k) for c in range(m)]
+        seed_cli = seed_resolver(row, m, k)  # 整行共用 info 訊息，每次只剩一次 HMAC
+        perm = [-1] * m
+        unresolved = set(range(m))
         for slot, gk in enumerate(payload):
-            seed_cli = seed_from_gk(gk, row, logical_col, self.seed_k_bytes)
-            if seed_cli == seed_srv:
-                self._slot_map[key] = slot
-                return slot
+            cands = [slot] if slot in unresolved else []
+            cands += [c for c in unresolved if c != slot]
+            for c in cands:
+                if seed_cli(gk, c) == seeds_srv[c]:
+                    perm[c] = slot
+                    unresolved.discard(c)
+                    break
+        self._row_perm_cache[row] = perm
+        return perm
 
-        raise ValueError(f"cannot resolve payload slot for row={row} logical_col={logical_col} (payload mismatch)")
+    def _resolve_slot_for_col(self, row: int, logical_col: int) -> int:
+        perm = self._row_perm(row)
+        slot = perm[logical_col] if 0 <= logical_col < len(perm) else -1
+        if slot < 0:
+            raise ValueError(f"cannot resolve payload slot for row={row} logical_col={logical_col} (payload mismatch)")
+        return slot
 
     def choose_one(self, row: int, logical_col: int) -> bytes:
         self.ensure_row_payload_cached(row)
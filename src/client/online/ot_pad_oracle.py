@@ -8,7 +8,7 @@ from src.client.online.gdfa_evaluator import PadOracle, RowStore  # uses same Ce
 from src.common.odfa.params import PackingParams
 from src.common.crypto.prf import prf_msg
 from src.common.crypto.prg import G_bits
-from src.common.utils.encode import i2osp
+from src.common.odfa.seed_rules import seed_info
 
 def _ceil_div(a: int, b: int) -> int:
     if b <= 0:
@@ -25,9 +25,6 @@ def _derive_cell_format(pub: GDFAPublicHeader):
     cell_bytes = _ceil_div(cell_bits, 8)
     return cell_bits, cell_bytes, ns_bits, aid_bits, pad_bits
 
-def _pack_info(row_id: int, col: int) -> bytes:
-    return b"ZIDS|SEED|row=" + i2osp(row_id, 4) + b"|col=" + i2osp(col, 2)
-
 class TokenSource(Protocol):
     """Return the OT token (bytes of length == cmax*k' bytes) for this (row, x)."""
     def get_token(self, row_id: int, x: int) -> bytes: ...
@@ -62,7 +59,7 @@ class OTPadOracle(PadOracle):
             start = c * self.pub.cell_bytes
             ct = enc_row[start:start+self.pub.cell_bytes]
             for gk in gks:
-                seed = prf_msg(gk, _pack_info(row_id, c), self.pack.k_bytes)
+                seed = prf_msg(gk, seed_info(row_id, c), self.pack.k_bytes)
                 pad  = G_bits(seed, cell_bits, label=b"PRG|GDFA|cell")
                 pt   = bytes(a ^ b for a, b in zip(ct, pad))
                 # validate plaintext: low pad_bits are zero; next-state is in range
@@ -22,13 +22,18 @@ class OTQuery:
             raise ValueError(f"x must be a byte (0..255), got {self.x}")
 
 
+def _qkey(row_id: int, x: int) -> int:
+    """快取鍵：(row_id, x) 打包成單一 int（x 為 byte），查表不必建 tuple。"""
+    return (row_id << 8) | x
+
+
 class _LRUCache:
-    """簡易 LRU，鍵為 (row_id, x)，值為 bytes token。"""
+    """簡易 LRU，鍵為 _qkey(row_id, x)，值為 bytes token。"""
     def __init__(self, capacity: int):
         self.cap = max(0, int(capacity))
-        self._map: OrderedDict[Tuple[int, int], bytes] = OrderedDict()
+        self._map: OrderedDict[int, bytes] = OrderedDict()
 
-    def get(self, key: Tuple[int, int]) -> Optional[bytes]:
+    def get(self, key: int) -> Optional[bytes]:
         if self.cap == 0:
             return None
         v = self._map.get(key)
@@ -36,7 +41,7 @@ class _LRUCache:
             self._map.move_to_end(key)
         return v
 
-    def put(self, key: Tuple[int, int], value: bytes) -> None:
+    def put(self, key: int, value: bytes) -> None:
         if self.cap == 0:
             return
         m = self._map
@@ -86,7 +91,7 @@ class OTQueryBuilder:
         q = OTQuery(row_id=row_id, x=x)
         q.sanity_check(self.pub)
 
-        key = (row_id, x)
+        key = _qkey(row_id, x)
         cached = self._cache.get(key)
         if cached is not None:
             self.cache_hits += 1
@@ -118,15 +123,15 @@ class OTQueryBuilder:
             return []
 
         # 檢查、去重
-        unique_keys: Dict[Tuple[int, int], int] = {}  # key -> first index
-        need_fetch: List[Tuple[int, int]] = []
+        unique_keys: Dict[int, List[int]] = {}  # key -> 所有出現位置
+        need_fetch: List[OTQuery] = []
         out: List[Optional[bytes]] = [None] * len(qs)
 
         for idx, q in enumerate(qs):
             if not isinstance(q, OTQuery):
                 raise TypeError("queries must yield OTQuery objects")
             q.sanity_check(self.pub)
-            key = (q.row_id, q.x)
+            key = _qkey(q.row_id, q.x)
 
             # 先看 cache
             cached = self._cache.get(key)
@@ -135,15 +140,18 @@ class OTQueryBuilder:
                 out[idx] = cached
                 continue
 
-            # 沒命中則登記 fetch，並記錄第一個出現位置
-            if key not in unique_keys:
-                unique_keys[key] = idx
-                need_fetch.append(key)
+            # 沒命中則登記 fetch，並記錄出現位置
+            pos = unique_keys.get(key)
+            if pos is None:
+                unique_keys[key] = [idx]
+                need_fetch.append(q)
+            else:
+                pos.append(idx)
 
         # 一一取回未命中的 token（目前 TokenSource 僅有單筆 API）
-        for key in need_fetch:
-            row_id, x = key
-            token = self.token_source.get_token(row_id, x)
+        for q in need_fetch:
+            key = _qkey(q.row_id, q.x)
+            token = self.token_source.get_token(q.row_id, q.x)
             if not isinstance(token, (bytes, bytearray)):
                 raise TypeError("TokenSource.get_token must return bytes")
             token = bytes(token)
@@ -153,15 +161,9 @@ class OTQueryBuilder:
                 )
             self._cache.put(key, token)
             self.requests += 1
-            # 填回所有該 key 的位置（第一個位置一定存在）
-            first_idx = unique_keys[key]
-            # 先填第一個
-            if out[first_idx] is None:
-                out[first_idx] = token
-            # 其餘相同 key 的位置也補上
-            for idx, q in enumerate(qs):
-                if out[idx] is None and (q.row_id, q.x) == key:
-                    out[idx] = token
+            # 填回所有該 key 的位置
+            for idx in unique_keys[key]:
+                out[idx] = token
 
         # 最終保證無 None
         assert all(isinstance(t, (bytes, bytearray)) for t in out)
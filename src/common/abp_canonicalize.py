@@ -3,7 +3,18 @@ from __future__ import annotations
 
 import re
 import urllib.parse
-from typing import Tuple, Optional
+from functools import lru_cache
+from typing import Tuple, Optional, Union
+
+# eTLD+1 後端：模組載入時解析一次（可選依賴；都沒有就用內建的簡易後綴表）
+try:
+    import tldextract  # type: ignore
+except Exception:
+    tldextract = None
+try:
+    from publicsuffix2 import get_sld  # type: ignore
+except Exception:
+    get_sld = None
 
 # ====== 與 easylist_loader 對齊的哨兵 ======
 SEP = "\x1f"       # <SEP>：ABP 的 ^（一個「分隔符」字元）
@@ -25,46 +36,63 @@ TYPE_CODE = {
     "other": "O",
 }
 DEFAULT_TYPE_CHAR = "O"
+_TYPE_CODE_B = {k.encode("ascii"): v.encode("ascii") for k, v in TYPE_CODE.items()}
 
 _ALLOWED_CHARS = set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_.%")
+# ASCII 路徑的 SEP 化查表：允許字元映到自己，其餘 → SEP（bytes.translate 一次走完整串）
+_SEP_TRANSLATE = bytes(i if chr(i) in _ALLOWED_CHARS else ord(SEP) for i in range(256))
 _IPV6_RE = re.compile(r"^\[?[0-9a-f:]+\]?$", re.IGNORECASE)
+# 常見絕對 URL（scheme://netloc/path?query#frag）的單次掃描；含 [ ] 或 \t\r\n 等需 urlsplit 特別處理者不匹配
+_FAST_URL_RE = re.compile(r"([A-Za-z][A-Za-z0-9+.\-]*)://([^/?#\[\]\t\r\n]*)((?:/[^?#\t\r\n]*)?)(?:\?([^#\t\r\n]*))?(?:#[^\t\r\n]*)?")
+_FAST_URL_RE_B = re.compile(_FAST_URL_RE.pattern.encode("ascii"))
 
-_COMMON_MULTI_TLDS = {
+_COMMON_MULTI_TLDS = frozenset({
     "co.uk", "org.uk", "ac.uk",
     "com.au", "net.au", "org.au",
     "com.br", "com.cn", "com.tw", "net.tw", "org.tw", "edu.tw",
     "co.jp", "ne.jp", "or.jp",
-}
+})
 
+@lru_cache(maxsize=16384)
 def _etld1(host: str) -> str:
+    # 同一批流量裡 req/doc host 高度重複：每個 host 只查一次後綴表
     host = host.strip(".")
     if not host or host.startswith("[") or _IPV6_RE.match(host) or host.replace(".", "").isdigit():
         return host.lower()
-    try:
-        import tldextract  # type: ignore
-        ext = tldextract.extract(host)
-        rd = ext.registered_domain or host
-        return rd.lower()
-    except Exception:
-        pass
-    try:
-        from publicsuffix2 import get_sld  # type: ignore
-        rd = get_sld(host)
-        return (rd or host).lower()
-    except Exception:
-        pass
-    labels = host.lower().split(".")
-    if len(labels) <= 2:
-        return host.lower()
-    tail2 = ".".join(labels[-2:])
-    tail3 = ".".join(labels[-3:])
-    if tail2 in _COMMON_MULTI_TLDS and len(labels) >= 3:
-        return ".".join(labels[-3:])
-    if tail3 in _COMMON_MULTI_TLDS and len(labels) >= 4:
-        return ".".join(labels[-4:])
+    if tldextract is not None:
+        try:
+            return (tldextract.extract(host).registered_domain or host).lower()
+        except Exception:
+            pass
+    if get_sld is not None:
+        try:
+            return (get_sld(host) or host).lower()
+        except Exception:
+            pass
+    return _etld1_fallback(host)
+
+def _etld1_fallback(host: str) -> str:
+    # 只需要最右邊至多 4 個 label：rsplit 一次切好，不拆整串、不重複 join
+    host = host.lower()
+    labels = host.rsplit(".", 3)
+    n = len(labels)
+    if n <= 2:
+        return host
+    tail2 = labels[-2] + "." + labels[-1]
+    if tail2 in _COMMON_MULTI_TLDS:
+        return labels[-3] + "." + tail2
+    if n >= 4:
+        tail3 = labels[-3] + "." + tail2
+        if tail3 in _COMMON_MULTI_TLDS:
+            return labels[-4] + "." + tail3
     return tail2
 
+@lru_cache(maxsize=8192)
 def _idna_punycode(host: str) -> str:
+    if host.isascii():
+        # 純 ASCII label 的 idna 編碼就是原字串：只剩小寫 + 去掉空 label，不進 codec
+        h = host.strip(".").lower()
+        return ".".join(filter(None, h.split("."))) if ".." in h else h
     out = []
     for lbl in host.strip(".").split("."):
         if not lbl:
@@ -75,6 +103,7 @@ def _idna_punycode(host: str) -> str:
             out.append(lbl.lower())
     return ".".join(out)
 
+@lru_cache(maxsize=4096)
 def _split_host_port(netloc: str) -> Tuple[str, Optional[int]]:
     if netloc.startswith("["):
         if "]" in netloc:
@@ -96,6 +125,31 @@ def _split_host_port(netloc: str) -> Tuple[str, Optional[int]]:
             return netloc, None
     return netloc, None
 
+@lru_cache(maxsize=4096)
+def _split_url(url: str) -> Tuple[str, str, str, str]:
+    """
+    (scheme 小寫, netloc, path, query)，結果同 urllib.parse.urlsplit。
+    ASCII、首尾非空白、形如 scheme://... 的一般 URL 走一次 regex；其餘（IPv6 方括號、控制字元、相對 URL…）交給 urlsplit。
+    快取：同一頁面的子資源請求 doc_url 都一樣，只拆一次。
+    """
+    if url.isascii() and url[-1:] > " ":
+        m = _FAST_URL_RE.fullmatch(url)
+        if m is not None:
+            scheme, netloc, path, query = m.groups()
+            return scheme.lower(), netloc, path, query or ""
+    u = urllib.parse.urlsplit(url)
+    return u.scheme.lower(), u.netloc, u.path, u.query
+
+@lru_cache(maxsize=4096)
+def _split_url_b(url: bytes) -> Optional[Tuple[bytes, bytes, bytes, bytes]]:
+    """_split_url 的 bytes 版，只有快速路徑；不適用（非 ASCII、IPv6 方括號…）回 None 由呼叫方改走 str。"""
+    if url.isascii() and url[-1:] > b" ":
+        m = _FAST_URL_RE_B.fullmatch(url)
+        if m is not None:
+            scheme, netloc, path, query = m.groups()
+            return scheme.lower(), netloc, path, query or b""
+    return None
+
 def _strip_default_port(scheme: str, port: Optional[int]) -> Optional[int]:
     if port is None:
         return None
@@ -105,20 +159,27 @@ def _strip_default_port(scheme: str, port: Optional[int]) -> Optional[int]:
 
 def _to_sep_encoded(s: str) -> str:
     # 將非 [A-Za-z0-9-_.%] 的字元映為單一 SEP；不解碼 %xx
+    if s.isascii():
+        return s.encode("ascii").translate(_SEP_TRANSLATE).decode("ascii")
+    # 非 ASCII 字元要整個字元換成一個 SEP（不能先轉 UTF-8 再逐 byte 換）
     return "".join(SEP if ch not in _ALLOWED_CHARS else ch for ch in s)
 
-def _canon_host_and_url(req_url: str) -> Tuple[str, str]:
-    u = urllib.parse.urlsplit(req_url)
-    scheme = u.scheme.lower()
-    host_raw, port = _split_host_port(u.netloc)
+@lru_cache(maxsize=4096)
+def _canon_host(scheme: str, netloc: str) -> str:
+    host_raw, port = _split_host_port(netloc)
     port = _strip_default_port(scheme, port)
 
     host = _idna_punycode(host_raw.lower())
     if port is not None and not _IPV6_RE.match(host_raw):
         host = f"{host}:{port}"
+    return host
 
-    path = u.path or "/"
-    path_q = f"{path}?{u.query}" if u.query else path
+def _canon_host_and_url(req_url: str) -> Tuple[str, str]:
+    scheme, netloc, path, query = _split_url(req_url)
+    host = _canon_host(scheme, netloc)
+
+    path = path or "/"
+    path_q = f"{path}?{query}" if query else path
     return host, _to_sep_encoded(path_q)
 
 def _type_char(req_type: str | None) -> str:
@@ -138,12 +199,48 @@ def canonicalize_for_abp(req_url: str, doc_url: str, req_type: str | None = None
     - host/docdomain：小寫 + IDNA；去預設埠；不解碼 %xx
     - 路徑與查詢中非 [A-Za-z0-9-_.%] 的字元會變為 SEP
     """
-    du = urllib.parse.urlsplit(doc_url)
-    doc_host_raw, _ = _split_host_port(du.netloc)
+    doc_host_raw, _ = _split_host_port(_split_url(doc_url)[1])
     doc_host = _idna_punycode(doc_host_raw.lower())
 
     req_host, pathq_sep = _canon_host_and_url(req_url)
 
     meta = f"{_type_char(req_type)}{_party_char(req_host, doc_host)}{doc_host}{META_SEP}"
     urlp = f"{DOMSTART}{req_host}{SEP}{pathq_sep}"
-    return meta + urlp
\ No newline at end of file
+    return meta + urlp
+
+@lru_cache(maxsize=4096)
+def _meta_and_host_b(req_scheme: bytes, req_netloc: bytes, doc_netloc: bytes) -> bytes:
+    # <PARTY><docdomain><META_SEP><DOMSTART><host><SEP>：只由兩個 netloc 決定，整段快取成 bytes
+    req_host = _canon_host(req_scheme.decode("ascii"), req_netloc.decode("ascii"))
+    doc_host = _idna_punycode(_split_host_port(doc_netloc.decode("ascii"))[0].lower())
+    return f"{_party_char(req_host, doc_host)}{doc_host}{META_SEP}{DOMSTART}{req_host}{SEP}".encode("utf-8")
+
+def _type_char_b(req_type: Union[str, bytes, None]) -> bytes:
+    if not req_type:
+        return DEFAULT_TYPE_CHAR.encode("ascii")
+    if isinstance(req_type, str):
+        return _type_char(req_type).encode("ascii")
+    return _TYPE_CODE_B.get(req_type.strip().lower(), DEFAULT_TYPE_CHAR.encode("ascii"))
+
+def _as_str(x: Union[str, bytes, None]) -> Optional[str]:
+    return x.decode("utf-8", "replace") if isinstance(x, bytes) else x
+
+def canonicalize_for_abp_bytes(req_url: Union[str, bytes], doc_url: Union[str, bytes],
+                               req_type: Union[str, bytes, None] = None) -> bytes:
+    """
+    canonicalize_for_abp 的 bytes 版：結果等於 canonicalize_for_abp(...).encode("utf-8")，
+    可直接交給 ZIDSEngine.run_abp_payload（省掉引擎端的 encode）。
+    兩個 URL 都是一般 ASCII bytes 時全程不轉 str：拆 URL 用 bytes regex、路徑直接 bytes.translate，
+    host/META 段按 netloc 快取；其餘輸入（str、非 ASCII、IPv6…）走 str 版再編碼。
+    """
+    req = _split_url_b(req_url) if isinstance(req_url, bytes) else None
+    doc = _split_url_b(doc_url) if req is not None and isinstance(doc_url, bytes) else None
+    if doc is None:
+        return canonicalize_for_abp(_as_str(req_url), _as_str(doc_url), _as_str(req_type)).encode("utf-8")
+
+    scheme, netloc, path, query = req
+    path = path or b"/"
+    path_q = path + b"?" + query if query else path
+    return (_type_char_b(req_type)
+            + _meta_and_host_b(scheme, netloc, doc[1])
+            + path_q.translate(_SEP_TRANSLATE))
@@ -3,6 +3,27 @@
 
 import secrets
 
+# 固定底數 g 的視窗表：_G_TABLES[(g, p)][i][d] = g^(d * 2^(W*i)) mod p。
+# 每個 OT 都要算 g^a / g^b（底數固定），查表後只剩 ~bits/W 次模乘、不用平方；全行程共用一份。
+_FIXED_BASE_W = 4
+_G_TABLES: dict = {}
+
+def _fixed_base_table(g: int, p: int, bits: int) -> list:
+    tbl = _G_TABLES.get((g, p))
+    if tbl is None:
+        tbl = []
+        base = g
+        for _ in range((bits + _FIXED_BASE_W - 1) // _FIXED_BASE_W):
+            row = [1] * (1 << _FIXED_BASE_W)
+            acc = 1
+            for d in range(1, 1 << _FIXED_BASE_W):
+                acc = acc * base % p
+                row[d] = acc
+            tbl.append(row)
+            base = acc * base % p
+        _G_TABLES[(g, p)] = tbl
+    return tbl
+
 class DDHGroup:
     def __init__(self):
         """
@@ -29,7 +50,26 @@ class DDHGroup:
         assert pow(self.g, self.q, self.p) == 1 and pow(self.g, 2, self.p) != 1, "Generator g is not valid"
 
     def power(self, base: int, exp: int) -> int:
-        return pow(base % self.p, exp % self.q, self.p)
+        base %= self.p
+        if base == self.g:
+            return self.power_g(exp)
+        return pow(base, exp % self.q, self.p)
+
+    def power_g(self, exp: int) -> int:
+        """g^exp mod p，用固定底數視窗表（第一次呼叫時建表，約 2 MB）。"""
+        e = exp % self.q
+        p = self.p
+        tbl = _fixed_base_table(self.g, p, self.q.bit_length())
+        mask = (1 << _FIXED_BASE_W) - 1
+        r = 1
+        i = 0
+        while e:
+            d = e & mask
+            if d:
+                r = r * tbl[i][d] % p
+            e >>= _FIXED_BASE_W
+            i += 1
+        return r
 
     def multiply(self, a: int, b: int) -> int:
         return (a * b) % self.p
@@ -4,8 +4,22 @@
 from __future__ import annotations
 import hmac, hashlib, struct
 
+try:  # 直接用 OpenSSL 的 HMAC 物件（hmac.new 外層的 Python 包裝每次 copy()/digest() 都多一層）
+    from _hashlib import hmac_new as _openssl_hmac_new
+except ImportError:
+    _openssl_hmac_new = None
+
 _BLOCK = 32  # SHA-256 output size
 
+def hmac_sha256(key: bytes, msg: bytes | None = None):
+    """
+    HMAC-SHA256 物件（介面同 hmac.HMAC：update/copy/digest）。
+    有 OpenSSL 後端時走 _hashlib（SHA-NI 等硬體加速由 OpenSSL 自行選用），否則退回 hmac.new。
+    """
+    if _openssl_hmac_new is not None:
+        return _openssl_hmac_new(key, msg, "sha256")
+    return hmac.new(key, msg, hashlib.sha256)
+
 def _hkdf_expand(prk: bytes, info: bytes, out_len: int) -> bytes:
     """
     Simple HKDF-Expand style expander using HMAC-SHA256.
@@ -15,12 +29,18 @@ def _hkdf_expand(prk: bytes, info: bytes, out_len: int) -> bytes:
         raise ValueError("out_len must be non-negative")
     if out_len == 0:
         return b""
+    if out_len <= _BLOCK:
+        # 單一 block（seed 推導的常見情形）：T(1) = HMAC-PRK(info || 1)
+        return hmac_sha256(prk, info + b"\x00\x00\x00\x01").digest()[:out_len]
+    mac = hmac_sha256(prk)  # key schedule 只做一次，每個 block copy()
     okm = bytearray()
     counter = 1
     t = b""
     while len(okm) < out_len:
         # T(n) = HMAC-PRK(T(n-1) || info || counter)
-        t = hmac.new(prk, t + info + struct.pack(">I", counter), hashlib.sha256).digest()
+        h = mac.copy()
+        h.update(t + info + struct.pack(">I", counter))
+        t = h.digest()
         okm += t
         counter += 1
     return bytes(okm[:out_len])
@@ -41,6 +61,27 @@ def prf_msg(key: bytes, info: bytes, out_len: int) -> bytes:
     # For our use we treat `key` directly as PRK (already secret, fixed-length is fine)
     return _hkdf_expand(bytes(key), bytes(info), out_len)
 
+def prf_msg_fn(key: bytes, out_len: int):
+    """
+    固定 key / out_len 的 prf_msg：回傳 f(info) == prf_msg(key, info, out_len)。
+    out_len ≤ 32 時 HMAC key schedule 只做一次，之後每次只剩 copy() + update/digest；
+    給同一把 key 要導出大量 info 的呼叫方（例如整張 GK / pad seed 表）。
+    """
+    if not isinstance(key, (bytes, bytearray)) or len(key) == 0:
+        raise TypeError("key must be non-empty bytes")
+    if out_len < 0:
+        raise ValueError("out_len must be non-negative")
+    key = bytes(key)
+    if out_len == 0 or out_len > _BLOCK:
+        return lambda info: prf_msg(key, info, out_len)
+    mac = hmac_sha256(key)
+
+    def f(info: bytes) -> bytes:
+        h = mac.copy()
+        h.update(info + b"\x00\x00\x00\x01")
+        return h.digest()[:out_len]
+    return f
+
 def prf_labeled(key: bytes, label: bytes, out_len: int) -> bytes:
     """
     Convenience wrapper: PRF with a label only.
@@ -1,16 +1,70 @@
 # common/crypto/prg.py
 from __future__ import annotations
-import hmac
 import hashlib
-from typing import Optional
+import os
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
 
 from src.common.utils.encode import i2osp
+from src.common.crypto.prf import hmac_sha256
 
 _HASH = hashlib.sha256
 _BLOCKLEN = _HASH().digest_size  # 32 bytes for SHA-256
 
-def _hmac(key: bytes, data: bytes) -> bytes:
-    return hmac.new(key, data, _HASH).digest()
+# PRG 後端（整個行程固定一種；離線建置與線上引擎必須一致，否則 pad 對不上）：
+#   hmac   —— HMAC-SHA256-CTR（預設；既有工件都是這個）
+#   blake3 —— BLAKE3 keyed XOF（需 pip install blake3；要用它就得整套工件重建）
+# 工件會記下建置時的後端（header / manifest 的 prg_backend；沒有記錄的舊工件視為 hmac），
+# 載入時與本行程的 PRG_BACKEND 不符就直接拒絕，不會用錯的 pad 解出一堆垃圾列號。
+# 順序即 v2 container header 裡的後端代碼（見 gdfa_packager._header_v2），只能往後加。
+PRG_BACKENDS = ("hmac", "blake3")
+PRG_BACKEND = os.environ.get("ZIDS_PRG_BACKEND", "hmac").strip().lower()
+if PRG_BACKEND not in PRG_BACKENDS:
+    raise ValueError(f"ZIDS_PRG_BACKEND must be 'hmac' or 'blake3', got {PRG_BACKEND!r}")
+if PRG_BACKEND == "blake3":
+    import blake3  # type: ignore  # 明確要求卻沒裝：直接 ImportError，不默默退回 HMAC
+
+@lru_cache(maxsize=64)
+def _ctr_msgs(label: bytes, out_len: int) -> Tuple[bytes, ...]:
+    """每個 (label, out_len) 的 block 訊息只組一次（引擎裡 out_len 固定為 cell_bytes）。"""
+    n = (out_len + _BLOCKLEN - 1) // _BLOCKLEN
+    prefix = b"PRG|" + label + b"|ctr="
+    len_suffix = b"|len=" + i2osp(out_len, 4)
+    return tuple(prefix + i.to_bytes(4, "big") + len_suffix for i in range(1, n + 1))
+
+def prg_keyed(mac, label: bytes, out_len: int) -> bytes:
+    """
+    同 _prg_ctr，但吃已經 keyed 的 HMAC 物件（hmac_sha256() 或 hmac.new() 的回傳值）：key schedule 只做一次，
+    每個 block 只 copy() + update()（跨 block 重用同一個 ctx）。呼叫方負責參數合法性。
+    """
+    out = []
+    for msg in _ctr_msgs(label, out_len):
+        h = mac.copy()
+        h.update(msg)
+        out.append(h.digest())
+    # 累加器刻意用 list + join：join 先算總長、只配置一次；out_len 是 32 的倍數時（cell_bytes=192 等）
+    # [:out_len] 回傳原物件不複製。預配 bytearray + 切片寫入實測反而較慢（多一次 bytes() 複製）。
+    return b"".join(out)[:out_len]
+
+def prg_many(seeds: Iterable[bytes], label: bytes, out_len: int) -> List[bytes]:
+    """
+    批次版 prg(seed, label, out_len)：同一 (label, out_len) 的 block 訊息只取一次，
+    每個 seed 只做一次 HMAC key schedule，迴圈內的名稱查找全部提出來。輸出與逐個呼叫相同。
+    """
+    if PRG_BACKEND == "blake3":
+        return [_prg_blake3(bytes(seed), out_len, label=bytes(label)) for seed in seeds]
+    msgs = _ctr_msgs(bytes(label), out_len)
+    new = hmac_sha256
+    out: List[bytes] = []
+    for seed in seeds:
+        mac = new(bytes(seed))
+        blocks = []
+        for msg in msgs:
+            h = mac.copy()
+            h.update(msg)
+            blocks.append(h.digest())
+        out.append(b"".join(blocks)[:out_len])
+    return out
 
 def _prg_ctr(seed: bytes, out_len: int, *, label: bytes) -> bytes:
     """
@@ -18,6 +72,24 @@ def _prg_ctr(seed: bytes, out_len: int, *, label: bytes) -> bytes:
     data = b"PRG|" + label + b"|ctr=" + I2OSP(i,4) + b"|len=" + I2OSP(out_len,4)
     block_i = HMAC(seed, data), i = 1,2,...
     output = block_1 || block_2 || ... (truncate to out_len)
+    HMAC key schedule 只在這裡做一次（prg_keyed 每個 block copy()），block 訊息由 _ctr_msgs 快取。
+    """
+    if not isinstance(seed, (bytes, bytearray)):
+        raise TypeError("seed must be bytes")
+    if len(seed) == 0:
+        raise ValueError("seed must be non-empty")
+    if not isinstance(label, (bytes, bytearray)):
+        raise TypeError("label must be bytes")
+    if out_len < 0:
+        raise ValueError("out_len must be non-negative")
+
+    return prg_keyed(hmac_sha256(bytes(seed)), bytes(label), out_len)
+
+def _prg_blake3(seed: bytes, out_len: int, *, label: bytes) -> bytes:
+    """
+    BLAKE3 keyed XOF：key = BLAKE3-derive_key("ZIDS PRG key v1", seed)（seed 任意長度 → 32 bytes key），
+    output = BLAKE3-keyed(key, "PRG|" + label + "|len=" + I2OSP(out_len,4)) 的前 out_len bytes。
+    domain separation 與 HMAC 版相同（label + 長度進訊息），但兩個後端的輸出互不相容。
     """
     if not isinstance(seed, (bytes, bytearray)):
         raise TypeError("seed must be bytes")
@@ -27,18 +99,15 @@ def _prg_ctr(seed: bytes, out_len: int, *, label: bytes) -> bytes:
         raise TypeError("label must be bytes")
     if out_len < 0:
         raise ValueError("out_len must be non-negative")
+    key = blake3.blake3(bytes(seed), derive_key_context="ZIDS PRG key v1").digest()
+    msg = b"PRG|" + bytes(label) + b"|len=" + out_len.to_bytes(4, "big")
+    return blake3.blake3(msg, key=key).digest(length=out_len)
 
-    out = bytearray()
-    i = 1
-    while len(out) < out_len:
-        data = b"PRG|" + bytes(label) + b"|ctr=" + i2osp(i, 4) + b"|len=" + i2osp(out_len, 4)
-        out.extend(_hmac(bytes(seed), data))
-        i += 1
-    return bytes(out[:out_len])
+_expand = _prg_blake3 if PRG_BACKEND == "blake3" else _prg_ctr
 
 def G_bytes(seed: bytes, out_len: int, *, label: bytes = b"ZIDS|PRG") -> bytes:
     """Expand to an exact number of BYTES."""
-    return _prg_ctr(seed, out_len, label=label)
+    return _expand(seed, out_len, label=label)
 
 def G_bits(seed: bytes, out_bits: int, *, label: bytes = b"ZIDS|PRG") -> bytes:
     """Expand to an exact number of BITS (MSB-first truncation on the last byte)."""
@@ -47,7 +116,7 @@ def G_bits(seed: bytes, out_bits: int, *, label: bytes = b"ZIDS|PRG") -> bytes:
     out_len = (out_bits + 7) // 8
     if out_len == 0:
         return b""
-    buf = _prg_ctr(seed, out_len, label=label)
+    buf = _expand(seed, out_len, label=label)
     r = out_bits & 7
     if r == 0:
         return buf
@@ -58,4 +127,4 @@ def G_bits(seed: bytes, out_bits: int, *, label: bytes = b"ZIDS|PRG") -> bytes:
 def prg(seed: bytes, label: bytes, out_len: int) -> bytes:
     return G_bytes(seed, out_len, label=label)
 
-__all__ = ["prg", "G_bytes", "G_bits"]
+__all__ = ["prg", "prg_keyed", "prg_many", "G_bytes", "G_bits", "PRG_BACKEND", "PRG_BACKENDS"]
@@ -1,17 +1,69 @@
 # src/common/odfa/seed_rules.py
 from __future__ import annotations
-from typing import Final
-from src.common.utils.encode import i2osp
-from src.common.crypto.prf import prf_msg  # HMAC-SHA256 PRF(key, msg, out_len)
+import struct
+from functools import lru_cache
+from typing import Final, Iterable, List, Tuple
+from src.common.utils.encode import i2osp  # engine 仍從這裡 import
+from src.common.crypto.prf import prf_msg, hmac_sha256  # HMAC-SHA256 PRF(key, msg, out_len)
+from src.common.crypto.prg import prg, prg_keyed, prg_many, PRG_BACKEND
 
 # 唯一標籤（PRG domain separation）
 PRG_LABEL_CELL: Final[bytes] = b"ZIDS|CELL"
 
+@lru_cache(maxsize=1 << 16)
 def seed_info(row: int, col: int) -> bytes:
     # 嚴禁改動；改了要重建離線工件
-    return b"ZIDS|SEED|row=" + i2osp(row, 4) + b"|col=" + i2osp(col, 2)
+    # 同一 (row, col) 在整個 session 會被反覆推 seed：位元組串只組一次（快取）
+    # 直接 int.to_bytes（同 i2osp 的位元組；越界改丟 OverflowError）
+    return b"ZIDS|SEED|row=" + row.to_bytes(4, "big") + b"|col=" + col.to_bytes(2, "big")
 
 def seed_from_gk(gk: bytes, row: int, col: int, k_bytes: int) -> bytes:
     if not gk or k_bytes <= 0:
         raise ValueError("seed_from_gk: bad gk/k_bytes")
     return prf_msg(gk, seed_info(row, col), k_bytes)
+
+def seed_resolver(row: int, m: int, k_bytes: int):
+    """
+    回傳 f(gk, col) == seed_from_gk(gk, row, col, k_bytes)，col ∈ [0, m)：
+    整行共用的 HKDF 訊息（seed_info || ctr）先組好，k_bytes ≤ 32 時每次只剩一次 HMAC。
+    給需要對同一行的多個 (gk, col) 反覆推 seed 的呼叫方（例如槽位解析）。
+    """
+    if k_bytes <= 0:
+        raise ValueError("seed_from_gk: bad gk/k_bytes")
+    if k_bytes > 32:
+        return lambda gk, col: seed_from_gk(gk, row, col, k_bytes)
+    msgs = [seed_info(row, c) + b"\x00\x00\x00\x01" for c in range(m)]
+
+    def resolve(gk: bytes, col: int) -> bytes:
+        if not gk:
+            raise ValueError("seed_from_gk: bad gk/k_bytes")
+        return hmac_sha256(gk, msgs[col]).digest()[:k_bytes]
+    return resolve
+
+def cell_pad(gk: bytes, row: int, col: int, k_bytes: int, cell_bytes: int) -> bytes:
+    """
+    融合版 prg(seed_from_gk(gk, row, col, k_bytes), PRG_LABEL_CELL, cell_bytes)：
+    seed 的 HKDF 展開與 PRG 的 HMAC-CTR 在同一個函式內完成，PRG 的 keyed HMAC 跨 block 重用。
+    輸出與分步呼叫逐 byte 相同。（非 HMAC 的 PRG 後端沒有可融合的 keyed ctx，直接走 prg。）
+    """
+    if PRG_BACKEND != "hmac":
+        return prg(_seed_inline(gk, row, col, k_bytes), PRG_LABEL_CELL, cell_bytes)
+    return prg_keyed(hmac_sha256(_seed_inline(gk, row, col, k_bytes)), PRG_LABEL_CELL, cell_bytes)
+
+def cell_pads(items: Iterable[Tuple[bytes, int, int]], k_bytes: int, cell_bytes: int) -> List[bytes]:
+    """批次版 cell_pad：items = [(gk, row, col), ...]，PRG 段走 prg_many。"""
+    return prg_many([_seed_inline(gk, row, col, k_bytes) for gk, row, col in items], PRG_LABEL_CELL, cell_bytes)
+
+def _seed_inline(gk: bytes, row: int, col: int, k_bytes: int) -> bytes:
+    """seed_from_gk 的內聯版（HKDF-Expand 直接展開，不經 prf_msg 的型別檢查）。"""
+    if not gk or k_bytes <= 0:
+        raise ValueError("seed_from_gk: bad gk/k_bytes")
+    info = seed_info(row, col)
+    okm = b""
+    t = b""
+    ctr = 1
+    while len(okm) < k_bytes:
+        t = hmac_sha256(gk, t + info + struct.pack(">I", ctr)).digest()
+        okm += t
+        ctr += 1
+    return okm[:k_bytes]
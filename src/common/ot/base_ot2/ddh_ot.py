@@ -7,6 +7,7 @@ class DDHOTSender:
         self.group = group
         self.a = self.group.get_random_exponent()  # Sender's secret exponent
         self.A = self.group.power(self.group.g, self.a)  # Sender's public key A
+        self._A_inv = None  # A^{-1}：同一個 sender 多次 respond 時只算一次
 
     def respond(self, B: int, m0: bytes, m1: bytes) -> tuple[bytes, bytes]:
         # Validate public key B
@@ -23,7 +24,9 @@ class DDHOTSender:
         
         # Compute shared secrets
         K0 = self.group.power(B, self.a)  # K0 = B^a
-        A_inv = self.group.inverse(self.A)
+        A_inv = self._A_inv
+        if A_inv is None:
+            A_inv = self._A_inv = self.group.inverse(self.A)
         K1 = self.group.power((B * A_inv) % self.group.p, self.a)
 
         # Derive pads via PRF
@@ -27,15 +27,17 @@ def _norm_host(raw: str) -> str:
     except Exception:
         return host
 
-def canonicalize(inp: bytes | str) -> bytes:
+def canonicalize(inp: bytes | str | memoryview | bytearray) -> bytes:
     """
-    输入：HTTP 请求报文 或 URL（bytes/str）
+    输入：HTTP 请求报文 或 URL（bytes/str；或 memoryview/mmap 等 bytes-like）
     输出：b'host/path?query'（若无 path，用 '/'；若无 host，返回原始 bytes）
     """
     if isinstance(inp, str):
         data = inp.encode('utf-8', errors='ignore')
-    else:
+    elif isinstance(inp, bytes):
         data = inp
+    else:
+        data = bytes(inp)
 
     # 1) 尝试当作 HTTP 请求
     try:
@@ -8,10 +8,12 @@ from typing import Iterable, List, Tuple
 # =========================
 
 def xor_bytes(a: bytes, b: bytes) -> bytes:
-    """XOR two equal-length byte strings."""
-    if len(a) != len(b):
+    """XOR two equal-length byte strings (or bytes-like views)."""
+    n = len(a)
+    if n != len(b):
         raise ValueError("xor_bytes: length mismatch")
-    return bytes(x ^ y for x, y in zip(a, b))
+    # 整段轉成大整數做一次 XOR（C 層逐 limb），不走逐 byte 的 Python 產生器
+    return (int.from_bytes(a, "little") ^ int.from_bytes(b, "little")).to_bytes(n, "little")
 
 def random_bytes(length: int) -> bytes:
     """Cryptographically strong random bytes."""
@@ -4,9 +4,6 @@ import argparse
 import json
 import os
 import sys
-import gzip
-import struct
-import hashlib
 from dataclasses import asdict
 from typing import List, Dict, Any, Iterable, Optional
 
@@ -14,6 +11,7 @@ from typing import List, Dict, Any, Iterable, Optional
 from src.common.odfa.matrix import ODFA, ODFARow, ODFAEdge
 from src.common.odfa.params import SecurityParams, SparsityParams, make_packing
 from src.server.offline.gdfa_builder import build_gdfa_stream, GDFAPublicHeader, GDFAStream
+from src.server.offline.export import gdfa_packager as packager
 from src.common.crypto.prf import prf_msg
 
 # ============================================================
@@ -81,87 +79,18 @@ def load_odfa_json(path: str) -> ODFA:
 # ============================================================
 
 def write_twofile(output_dir: str, pub: GDFAPublicHeader, rows: Iterable[bytes], *, gzip_header: bool = False) -> None:
-    os.makedirs(output_dir, exist_ok=True)
+    # 同 gdfa_packager.write_jsonbin(aos)：rows 串流寫入 rows.bin、邊寫邊算 sha256，再寫 header
+    packager.write_jsonbin(output_dir, pub, rows, gzip_header=gzip_header, layout="aos")
     header_path = os.path.join(output_dir, "header.json" + (".gz" if gzip_header else ""))
     rows_path   = os.path.join(output_dir, "rows.bin")
-
-    # Collect rows into a single bytes object for hashing and length check
-    rows_list = list(rows)
-    for i, r in enumerate(rows_list):
-        if len(r) != pub.row_bytes:
-            raise ValueError(f"row {i} length {len(r)} != row_bytes {pub.row_bytes}")
-    rows_blob = b"".join(rows_list)
-    expected = pub.num_states * pub.row_bytes
-    if len(rows_blob) != expected:
-        raise ValueError(f"rows total length {len(rows_blob)} != {expected}")
-
-    # Prepare header (JSON) and rows SHA-256
-    header_obj = {
-        "alphabet_size": pub.alphabet_size,
-        "outmax": pub.outmax,
-        "cmax": pub.cmax,
-        "num_states": pub.num_states,
-        "start_row": pub.start_row,
-        "permutation": pub.permutation,
-        "cell_bytes": pub.cell_bytes,
-        "row_bytes": pub.row_bytes,
-        "aid_bits": pub.aid_bits,
-        "rows_sha256": hashlib.sha256(rows_blob).hexdigest(),
-    }
-    header_bytes = json.dumps(header_obj, indent=2, sort_keys=True).encode("utf-8")
-
-    # Write header
-    if gzip_header:
-        with gzip.open(header_path, "wb") as gz:
-            gz.write(header_bytes)
-    else:
-        with open(header_path, "wb") as f:
-            f.write(header_bytes)
-
-    # Write rows.bin
-    with open(rows_path, "wb") as f:
-        f.write(rows_blob)
-
     print(f"[OK] Wrote {header_path}")
-    print(f"[OK] Wrote {rows_path} ({len(rows_blob)} bytes)")
-
+    print(f"[OK] Wrote {rows_path} ({pub.num_states * pub.row_bytes} bytes)")
 
-_MAGIC = b"ZIDSv1\0"
 
 def write_container(container_path: str, pub: GDFAPublicHeader, rows: Iterable[bytes]) -> None:
-    os.makedirs(os.path.dirname(container_path) or ".", exist_ok=True)
-
-    rows_list = list(rows)
-    for i, r in enumerate(rows_list):
-        if len(r) != pub.row_bytes:
-            raise ValueError(f"row {i} length {len(r)} != row_bytes {pub.row_bytes}")
-    rows_blob = b"".join(rows_list)
-    expected = pub.num_states * pub.row_bytes
-    if len(rows_blob) != expected:
-        raise ValueError(f"rows total length {len(rows_blob)} != {expected}")
-
-    header_obj = {
-        "alphabet_size": pub.alphabet_size,
-        "outmax": pub.outmax,
-        "cmax": pub.cmax,
-        "num_states": pub.num_states,
-        "start_row": pub.start_row,
-        "permutation": pub.permutation,
-        "cell_bytes": pub.cell_bytes,
-        "row_bytes": pub.row_bytes,
-        "aid_bits": pub.aid_bits,
-    }
-    hdr_bytes = json.dumps(header_obj, separators=(",", ":")).encode("utf-8")
-    body_hash = hashlib.sha256(rows_blob).digest()
-
-    with open(container_path, "wb") as f:
-        f.write(_MAGIC)
-        f.write(struct.pack(">I", len(hdr_bytes)))
-        f.write(hdr_bytes)
-        f.write(rows_blob)
-        f.write(body_hash)
-
-    print(f"[OK] Wrote container {container_path} ({len(rows_blob)} bytes + header + sha256)")
+    # ZIDSv1（JSON header）container，格式同 gdfa_packager.write_container(version=1)
+    packager.write_container(container_path, pub, rows, layout="aos", version=1)
+    print(f"[OK] Wrote container {container_path} ({pub.num_states * pub.row_bytes} bytes + header + sha256)")
 
 
 # ============================================================
@@ -274,14 +203,13 @@ def main(argv: List[str]) -> None:
         pad_seed_fn=pad_seed_fn,
     )
     pub = stream.public
-    rows_iter = list(stream.rows)  # materialize once for hashing/writing
 
-    # 5) Write outputs
+    # 5) Write outputs（rows 直接從 stream 串流寫出）
     if args.format == "jsonbin":
-        write_twofile(args.outdir, pub, rows_iter, gzip_header=args.gzip_header)
+        write_twofile(args.outdir, pub, stream.rows, gzip_header=args.gzip_header)
     else:
         path = args.container_path or os.path.join(args.outdir, "gdfa.gdfa")
-        write_container(path, pub, rows_iter)
+        write_container(path, pub, stream.rows)
 
     # 6) Optional secrets dump
     write_secrets(args.outdir, stream, args.save_secrets)
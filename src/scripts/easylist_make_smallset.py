@@ -1,30 +1,37 @@
 # src/scripts/easylist_make_smallset.py
 from __future__ import annotations
 import os, re, json, random, argparse
+from typing import List, NamedTuple
 from urllib.parse import urlparse
 
 # ------------------ 基本 ABP 規則處理（簡化版） ------------------
 
+_SIMPLE_TYPES = frozenset(("domain_anchor", "scheme_anchor", "substring"))
+_DOMAIN_ANCHOR_RE = re.compile(r"\|\|([A-Za-z0-9.-]+)")
+
+def classify_rule(s: str) -> str:
+    if s.startswith("@@") or "$" in s:
+        return "unsupported"
+    if len(s) >= 2 and s[0] == "/" and s[1] != "/" and s.rfind("/") > 0:
+        return "unsupported"    # regex 規則
+    if s.startswith("||"):
+        return "domain_anchor"   # 例如 "||example.com^"
+    if s.startswith(("|http://", "|https://")):
+        return "scheme_anchor"   # 例如 "|https://cdn.example.com/ads/"
+    if s.startswith("|") or s.endswith("|"):
+        return "anchored"        # 超過最小範圍，先跳過
+    # 剩下視為「純字串子路徑」類，如 "ads.js"
+    return "substring"
+
 class Rule:
+    __slots__ = ("raw", "is_exception", "has_opts", "is_regex", "type")
+
     def __init__(self, raw: str):
         self.raw = raw
         self.is_exception = raw.startswith("@@")
         self.has_opts = "$" in raw
         self.is_regex = (len(raw) >= 2 and raw[0] == "/" and raw.rfind("/") > 0 and raw[1] != "/")
-        self.type = self._classify()
-
-    def _classify(self) -> str:
-        s = self.raw
-        if self.is_exception or self.has_opts or self.is_regex:
-            return "unsupported"
-        if s.startswith("||"):
-            return "domain_anchor"   # 例如 "||example.com^"
-        if s.startswith("|http://") or s.startswith("|https://"):
-            return "scheme_anchor"   # 例如 "|https://cdn.example.com/ads/"
-        if s.startswith("|") or s.endswith("|"):
-            return "anchored"        # 超過最小範圍，先跳過
-        # 剩下視為「純字串子路徑」類，如 "ads.js"
-        return "substring"
+        self.type = classify_rule(raw)
 
     def cleaned(self) -> str:
         # 去掉 ABP 轉義：目前只處理 ^ （分隔符）→ "/"，其他保持
@@ -46,7 +53,7 @@ def pos_neg_for_rule(r: Rule) -> tuple[str, str] | None:
         # 例： "||example.com^" → 匹配 example.com 及其子域名
         # 生成正例： https://sub.example.com/ads.js
         # 反例： https://examplex.com/
-        m = re.match(r"^\|\|([A-Za-z0-9.-]+)", s)
+        m = _DOMAIN_ANCHOR_RE.match(s)
         if not m:
             return None
         dom = m.group(1).strip(".")
@@ -107,22 +114,24 @@ def to_http_request_bytes(url: str) -> bytes:
 
 # ------------------ 主流程 ------------------
 
-def load_rules(path: str) -> list[Rule]:
-    out: list[Rule] = []
+class RuleColumns(NamedTuple):
+    """整份清單的欄式表示：raw[i] 與 type[i] 對應同一條規則（不為每行建 Rule 物件）。"""
+    raw: List[str]
+    type: List[str]
+
+def load_rules(path: str) -> RuleColumns:
+    # 一次讀檔、一次解碼，逐行只做分類；Rule 物件留到抽樣後才建
     with open(path, "rb") as f:
-        for raw in f:
-            s = raw.decode("utf-8", errors="ignore").strip()
-            if not s or s.startswith("!") or s.startswith("[Adblock"):
-                continue
-            r = Rule(s)
-            out.append(r)
-    return out
-
-def sample_simple_rules(rules: list[Rule], k: int = 10) -> list[Rule]:
+        text = f.read().decode("utf-8", errors="ignore")
+    raws = [s for s in map(str.strip, text.split("\n"))
+            if s and not s.startswith(("!", "[Adblock"))]
+    return RuleColumns(raws, list(map(classify_rule, raws)))
+
+def sample_simple_rules(rules: RuleColumns, k: int = 10) -> list[Rule]:
     # 只挑「容易轉 URL」的類型
-    simple = [r for r in rules if r.type in ("domain_anchor","scheme_anchor","substring")]
+    simple = [i for i, t in enumerate(rules.type) if t in _SIMPLE_TYPES]
     random.shuffle(simple)
-    return simple[:k]
+    return [Rule(rules.raw[i]) for i in simple[:k]]
 
 def main():
     ap = argparse.ArgumentParser(description="Make a tiny URL test set from easylist.txt")
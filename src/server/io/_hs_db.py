@@ -0,0 +1,68 @@
+# src/server/io/_hs_db.py
+from __future__ import annotations
+
+import re
+from typing import Iterable, List, Sequence
+
+try:  # 可選：Hyperscan 多模式 DB（整批規則一次掃描）；沒裝就逐條 re.search
+    import hyperscan  # type: ignore
+except ImportError:
+    hyperscan = None
+
+class RuleMatcher:
+    """
+    把一批 RuleSpec（easylist_loader.parse_easylist 的輸出）編成一個比對器：
+      - 有 hyperscan：所有規則編進同一個 block-mode DB，每個輸入只掃一次
+      - 否則（或 DB 編譯失敗）：逐條預編的 re.Pattern，語義與 tools/smoke_abp 原本的迴圈相同
+    Python re 編不過的規則直接略過（記在 skipped），與原本「不讓一條垃圾規則拖垮整體」一致。
+    """
+    def __init__(self, specs: Iterable):
+        self.rules: List = []
+        self.skipped: List[tuple] = []  # (spec, re.error)
+        compiled: List[re.Pattern] = []
+        for s in specs:
+            flags = (re.IGNORECASE if s.ignore_case else 0) | (re.DOTALL if getattr(s, "dotall", False) else 0)
+            try:
+                compiled.append(re.compile(s.pattern, flags))
+            except re.error as e:
+                self.skipped.append((s, e))
+                continue
+            self.rules.append(s)
+        self._compiled = compiled
+        self._db = _build_hs_db(self.rules) if hyperscan is not None else None
+
+    @property
+    def backend(self) -> str:
+        return "hyperscan" if self._db is not None else "re"
+
+    def match_ids(self, payload: str) -> List[int]:
+        """命中規則在 self.rules 中的索引（遞增序，不重複）。"""
+        if self._db is None:
+            return [i for i, rx in enumerate(self._compiled) if rx.search(payload)]
+        hits: set = set()
+
+        def on_match(rid, _from, _to, _flags, _ctx):
+            hits.add(rid)
+
+        self._db.scan(payload.encode("utf-8"), match_event_handler=on_match)
+        return sorted(hits)
+
+def _build_hs_db(rules: Sequence):
+    flags = []
+    for s in rules:
+        f = hyperscan.HS_FLAG_SINGLEMATCH | hyperscan.HS_FLAG_ALLOWEMPTY
+        if s.ignore_case:
+            f |= hyperscan.HS_FLAG_CASELESS
+        if getattr(s, "dotall", False):
+            f |= hyperscan.HS_FLAG_DOTALL
+        if not s.pattern.isascii():
+            f |= hyperscan.HS_FLAG_UTF8
+        flags.append(f)
+    db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+    try:
+        db.compile(expressions=[s.pattern.encode("utf-8") for s in rules],
+                   ids=list(range(len(rules))), elements=len(rules), flags=flags)
+    except Exception:
+        # Hyperscan 不支援的語法（反向參照、lookaround…）讓整個 DB 編不過：退回 re
+        return None
+    return db
@@ -4,7 +4,8 @@ from __future__ import annotations
 import os
 import re
 from dataclasses import dataclass
-from typing import List, Tuple
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Tuple
 
 # 共用常數（嚴格與 canonicalize 對齊）
 from src.common.abp_canonicalize import SEP, DOMSTART, META_SEP, TYPE_CODE
@@ -24,42 +25,38 @@ except Exception:
 
 # === 對外介面 ===
 
+_SNIFF_BYTES = 4096
+_SNIFF_MAX = 1 << 20  # 檔頭行再長也只讀到這裡（避免把單行巨檔整個讀進來）
+
 def is_abp_file(path: str, sniff_lines: int = 16) -> bool:
-    try:
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            for i, line in enumerate(f):
-                if i >= sniff_lines:
-                    break
-                s = line.strip()
-                if not s:
-                    continue
-                if s.startswith("[Adblock"):
-                    return True
-                if s.startswith("! Title:") or s.startswith("! Version:") or "Adblock" in s:
-                    return True
-        return False
-    except FileNotFoundError:
-        raise
+    # 只讀檔頭、不解碼：前 sniff_lines 行內出現 "Adblock"，或某行以 "! Title:"/"! Version:" 開頭
+    # 第一個 block 不夠 sniff_lines 行（檔頭很長）就加倍續讀；\n、\r\n、\r 都算行尾（bytes.splitlines）
+    with open(path, "rb") as f:
+        head = f.read(_SNIFF_BYTES)
+        while len(head) < _SNIFF_MAX and len(head.splitlines()) <= sniff_lines:
+            more = f.read(len(head))
+            if not more:
+                break
+            head += more
+    lines = head.splitlines()[:sniff_lines]
+    if b"Adblock" in b"\n".join(lines):
+        return True
+    return any(ln.lstrip().startswith((b"! Title:", b"! Version:")) for ln in lines)
 
 def parse_easylist(path: str, default_case_insensitive: bool = True) -> List[RuleSpec]:
-    specs: List[RuleSpec] = []
+    base = os.path.basename(path)
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        for lineno, raw in enumerate(f, 1):
-            line = raw.strip()
-            if not line or line.startswith("!"):
-                continue
-            if "##" in line or "#@#" in line:  # cosmetic 規則：略過
-                continue
-            try:
-                rs = _abp_line_to_rulespecs(
-                    line=line,
-                    default_case_insensitive=default_case_insensitive,
-                    src_label=f"{os.path.basename(path)}:{lineno}",
-                )
-                specs.extend(rs)
-            except _SkipRule:
-                continue
-    return specs
+        return _abp_lines_to_rulespecs(_rule_lines(f, base), default_case_insensitive=default_case_insensitive)
+
+def _rule_lines(f, base: str) -> Iterator[Tuple[str, str]]:
+    """過濾掉空行、註解與 cosmetic 規則，產出 (line, "檔名:行號")。"""
+    for lineno, raw in enumerate(f, 1):
+        line = raw.strip()
+        if not line or line[0] == "!":
+            continue
+        if "##" in line or "#@#" in line:  # cosmetic 規則：略過
+            continue
+        yield line, f"{base}:{lineno}"
 
 # === 內部實作 ===
 
@@ -71,10 +68,51 @@ _SPECIALS = r".^$+?{}[]()|\\"  # regex 需跳脫
 def _esc_lit(ch: str) -> str:
     return ("\\" + ch) if ch in _SPECIALS else ch
 
+# 哨兵的 regex 形式與固定片段：載入時算一次，不在每條規則裡重複 re.escape
+_SEP_ESC = re.escape(SEP)
+_DOMSTART_ESC = re.escape(DOMSTART)
+_META_SEP_ESC = re.escape(META_SEP)
+_SUBDOMAINS_RE = r"(?:[^" + _SEP_ESC + r".]*\.)*"   # ||domain 前的 (subdomain.)*
+_DOCDOMAIN_ANY_RE = r"[^" + _SEP_ESC + r"]+"
+_DOMAIN_HEAD_RE = re.compile(r"[A-Za-z0-9.-]+")
+# EasyList 大宗的 ||host^ / ||host：固定前綴 + 網域 (+ SEP)，不走一般分支
+_DOMAIN_ONLY_RE = re.compile(r"\|\|([A-Za-z0-9.-]+)(\^?)")
+_DOMAIN_PREFIX = _DOMSTART_ESC + _SUBDOMAINS_RE
+# 字面字串的最小跳脫：只動 regex 裡真有特殊意義的字元（re.escape 還會跳脫 - # & ~ 空白等，
+# 在字元類別外都多餘）；pattern 較短，語言不變，下游 regex→DFA 要掃的字也少
+_LIT_ESC_TABLE = str.maketrans({c: "\\" + c for c in _SPECIALS + "*"})
+
+# ABP 主體（去掉錨與跳脫後）逐字元映射表：* → .*；^ 與 /?:&= → SEP；其餘 regex 特殊字元加 '\'
+_REST_TABLE = str.maketrans({
+    **{c: _esc_lit(c) for c in _SPECIALS if c != "\\"},
+    "*": ".*",
+    **{c: _SEP_ESC for c in "^/?:&="},
+})
+# ABP 跳脫：'\x' → 字面 x；行尾孤兒 '\' → '\\'
+_ABP_ESCAPE_RE = re.compile(r"\\(.)|\\\Z", re.S)
+
+def _emit_rest(rest: str) -> str:
+    # 整段 translate（C 迴圈），只在 '\' 處切段；量過逐 token 的 re.finditer 分派（跳脫/特殊字元/字面串）慢約 3 倍
+    if "\\" not in rest:
+        return rest.translate(_REST_TABLE)
+    out: list[str] = []
+    pos = 0
+    for m in _ABP_ESCAPE_RE.finditer(rest):
+        out.append(rest[pos:m.start()].translate(_REST_TABLE))
+        ch = m.group(1)
+        if ch is None:
+            out.append(r"\\")
+        else:
+            out.append(ch.translate(_LIT_ESC_TABLE))
+        pos = m.end()
+    out.append(rest[pos:].translate(_REST_TABLE))
+    return "".join(out)
+
 def _split_filter_and_modifiers(s: str) -> Tuple[str, dict]:
     if "$" not in s:
         return s, {}
     pat, mod_str = s.split("$", 1)
+    # EasyList 的 $mods 多半只有 1～3 個 token：split + 迴圈比 re.finditer 一次掃描（量過慢約 2 倍）還快
     mods: dict[str, str | bool] = {}
     for token in mod_str.split(","):
         token = token.strip()
@@ -102,6 +140,12 @@ def _abp_body_to_regex(body: str) -> str:
     """
     body = body.strip()
 
+    # ==== 0) 快速路徑：||host^ 或 ||host（結果與下方 '||' 分支相同） ====
+    m = _DOMAIN_ONLY_RE.fullmatch(body)
+    if m is not None:
+        domain, caret = m.groups()
+        return _DOMAIN_PREFIX + domain.translate(_LIT_ESC_TABLE) + (_SEP_ESC if caret else "")
+
     # ==== 1) 原生 ABP 正則：/ ... /flags? ====
     if len(body) >= 2 and body[0] == "/" and body.count("/") >= 2:
         # 找到最後一個分隔符（簡化處理：EasyList 規則結尾基本都是未跳脫的 /）
@@ -111,63 +155,32 @@ def _abp_body_to_regex(body: str) -> str:
         else:
             pat = body[1:last]
         # 若內文以孤兒 '\' 結尾，補上一個 '\'
-        if pat.endswith("\\"):
+        if pat[-1:] == "\\":
             pat += "\\"
         return pat
 
     # ==== 2) 非 raw 的 | 錨/|| 網域錨 ====
-    anchor_end = body.endswith("|") and not body.endswith(r"\|")
+    tail = body[-2:]
+    anchor_end = tail[-1:] == "|" and tail != r"\|"
     if anchor_end:
         body = body[:-1]
 
-    def emit_rest(rest: str, out: list[str]) -> None:
-        i = 0
-        while i < len(rest):
-            c = rest[i]
-            # ABP 的跳脫：'\x' → 字面 x；孤兒 '\' → '\\'
-            if c == "\\":
-                if i + 1 < len(rest):
-                    out.append(re.escape(rest[i + 1]))
-                    i += 2
-                    continue
-                else:
-                    out.append(r"\\")
-                    i += 1
-                    continue
-            if c == "*":
-                out.append(".*")
-            elif c == "^":
-                out.append(re.escape(SEP))
-            elif c in "/?:&=":
-                out.append(re.escape(SEP))
-            elif c == ".":
-                out.append(r"\.")
-            elif c == "|":
-                out.append(r"\|")
-            else:
-                out.append(_esc_lit(c))
-            i += 1
-
     # '||' 網域錨（優先處理）
     if body.startswith("||"):
         rem = body[2:]
-        m = re.match(r"([A-Za-z0-9.-]+)", rem)
-        domain = m.group(1) if m else ""
+        m = _DOMAIN_HEAD_RE.match(rem)
+        domain = m.group(0) if m else ""
         rest = rem[len(domain):] if m else rem
 
-        out: list[str] = []
-        out.append(re.escape(DOMSTART))
-        out.append(r"(?:[^" + re.escape(SEP) + r".]*\.)*")
-        if domain:
-            out.append(re.escape(domain))
+        # 片段固定只有幾段：直接串接，不建 list 再 join
+        pat = _DOMAIN_PREFIX + domain.translate(_LIT_ESC_TABLE)
         # 若 rest 不以 ABP 分隔符 '^' 開頭，插入 1 個 host/path 邊界 SEP
-        if rest and not rest.startswith("^"):
-            out.append(re.escape(SEP))
-        emit_rest(rest, out)
+        if rest and rest[0] != "^":
+            pat += _SEP_ESC
+        pat += _emit_rest(rest)
         if anchor_end:
-            out.append("$")
-        pat = "".join(out)
-        if pat.endswith("\\"):
+            pat += "$"
+        if pat[-1:] == "\\":
             pat += "\\"
         return pat
 
@@ -176,25 +189,25 @@ def _abp_body_to_regex(body: str) -> str:
     if anchor_start:
         body = body[1:]
 
-    out2: list[str] = []
+    pat = _emit_rest(body)
     if anchor_start:
-        out2.append("^")
-    emit_rest(body, out2)
+        pat = "^" + pat
     if anchor_end:
-        out2.append("$")
-    pat = "".join(out2)
-    if pat.endswith("\\"):
+        pat += "$"
+    if pat[-1:] == "\\":
         pat += "\\"
     return pat
 
+_ALL_TYPES_CLASS = "[" + "".join(sorted(set(TYPE_CODE.values()))) + "]"
+_TYPE_CODE_KEYSET = frozenset(TYPE_CODE)
+
 def _mods_to_classes_and_domains(mods: dict, default_case_insensitive: bool):
     # type class
-    if any(k in TYPE_CODE for k in mods.keys()):
-        tset = {TYPE_CODE[k] for k in mods.keys() if k in TYPE_CODE}
-        type_class = "[" + "".join(sorted(tset)) + "]"
+    hits = _TYPE_CODE_KEYSET & mods.keys() if mods else None
+    if hits:
+        type_class = "[" + "".join(sorted({TYPE_CODE[k] for k in hits})) + "]"
     else:
-        all_types = "".join(sorted(set(TYPE_CODE.values())))
-        type_class = "[" + all_types + "]"
+        type_class = _ALL_TYPES_CLASS
 
     # party class
     if "third-party" in mods:
@@ -224,46 +237,104 @@ def _mods_to_classes_and_domains(mods: dict, default_case_insensitive: bool):
     return type_class, party_class, pos_domains, neg_domains, ignore_case
 
 def _docdomain_any_regex() -> str:
-    return r"[^" + re.escape(SEP) + r"]+"
+    return _DOCDOMAIN_ANY_RE
+
+_DOCDOMAIN_SUBDOMAINS_RE = r"(?:[^.\x1f]*\.)*"  # 不吃 SEP 與 dot 以外的 label 分隔
 
+# domain= 清單在彙整過的 EasyList 裡大量重複；type/party 類別只有少數組合：兩者都按參數快取
+@lru_cache(maxsize=8192)
 def _domain_to_alt_regex(domain: str) -> str:
     # 匹配 docdomain 欄位： (subdomain.)*domain
-    esc = re.escape(domain)
-    return r"(?:[^.\x1f]*\.)*" + esc  # 不吃 SEP 與 dot 以外的 label 分隔
+    esc = domain.translate(_LIT_ESC_TABLE)
+    return _DOCDOMAIN_SUBDOMAINS_RE + esc
+
+def _domain_trie_alts(node: dict) -> List[str]:
+    # node：label → 子節點（反轉後的網域 trie）；None 鍵標記「到這裡就是一個完整網域」
+    parts: List[str] = []
+    for label in sorted(k for k in node if k is not None):
+        child = node[label]
+        lit = label.translate(_LIT_ESC_TABLE)
+        if len(child) == 1 and None in child:
+            parts.append(lit)
+            continue
+        sub = _domain_trie_alts(child)
+        inner = sub[0] if len(sub) == 1 else "(?:" + "|".join(sub) + ")"
+        parts.append(("(?:" + inner + r"\.)?" if None in child else inner + r"\.") + lit)
+    return parts
 
+def _domains_to_alt_regex(domains: List[str]) -> str:
+    """
+    多個 domain= 的 docdomain 比對：(subdomain.)*(d1|d2|...)，d_i 依 label 由右往左建 trie 共用後綴，
+    例如 a.google.com|youtube.com → (?:a.google|youtube).com（點另行跳脫）。語言與逐一 _domain_to_alt_regex 再 | 起來相同。
+    """
+    trie: dict = {}
+    for d in domains:
+        node = trie
+        for label in reversed(d.split(".")):
+            node = node.setdefault(label, {})
+        node[None] = {}
+    return _DOCDOMAIN_SUBDOMAINS_RE + "(?:" + "|".join(_domain_trie_alts(trie)) + ")"
+
+@lru_cache(maxsize=8192)
 def _build_meta_prefix(type_class: str, party_class: str, docdomain_alt: str | None) -> str:
     docre = _docdomain_any_regex() if docdomain_alt is None else docdomain_alt
-    return "^" + type_class + party_class + docre + re.escape(META_SEP)
+    return "^" + type_class + party_class + docre + _META_SEP_ESC
+
+# 沒有 $type / domain= 的規則（絕大多數）只會用到這三個前綴：載入時先算好，熱路徑只剩一次 dict 查詢
+_META_PREFIX_ANY = {(_ALL_TYPES_CLASS, p): _build_meta_prefix(_ALL_TYPES_CLASS, p, None)
+                    for p in ("[FT]", "[F]", "[T]")}
 
 def _abp_line_to_rulespecs(*, line: str, default_case_insensitive: bool, src_label: str) -> List[RuleSpec]:
-    action = "BLOCK"
-    s = line
-    if s.startswith("@@"):
-        action = "ALLOW"
-        s = s[2:]
-
-    body, mods = _split_filter_and_modifiers(s)
-    url_regex = _abp_body_to_regex(body)
-    type_class, party_class, pos_domains, neg_domains, ignore_case = _mods_to_classes_and_domains(
-        mods, default_case_insensitive
-    )
+    return _abp_lines_to_rulespecs(((line, src_label),), default_case_insensitive=default_case_insensitive)
 
+def _abp_lines_to_rulespecs(items: Iterable[Tuple[str, str]], *, default_case_insensitive: bool) -> List[RuleSpec]:
+    """
+    一批 (line, src_label) → RuleSpec[]（依序串接；丟 _SkipRule 的行略過）。
+    整批共用一個迴圈與輸出 list，熱路徑用到的函式先綁成區域變數（LOAD_FAST）。
+    """
+    split_mods = _split_filter_and_modifiers
+    body_to_regex = _abp_body_to_regex
+    mods_to_classes = _mods_to_classes_and_domains
+    meta_any = _META_PREFIX_ANY.get
+    meta_prefix = _build_meta_prefix
+    dom_alt = _domain_to_alt_regex
+    spec = RuleSpec
     rules: List[RuleSpec] = []
+    append = rules.append
+    for line, src_label in items:
+        try:
+            action = "BLOCK"
+            s = line
+            if s[:2] == "@@":
+                action = "ALLOW"
+                s = s[2:]
+
+            body, mods = split_mods(s)
+            url_regex = body_to_regex(body)
+            type_class, party_class, pos_domains, neg_domains, ignore_case = mods_to_classes(
+                mods, default_case_insensitive
+            )
+        except _SkipRule:
+            continue
 
-    # 正向 domain 白名單（若有）
-    if pos_domains:
-        alt = "|".join(_domain_to_alt_regex(d) for d in pos_domains)
-        meta = _build_meta_prefix(type_class, party_class, "(?:" + alt + ")")
-        rules.append(RuleSpec(pattern=meta + url_regex, ignore_case=ignore_case, action=action, label=src_label))
-    else:
-        meta = _build_meta_prefix(type_class, party_class, None)
-        rules.append(RuleSpec(pattern=meta + url_regex, ignore_case=ignore_case, action=action, label=src_label))
-
-    # 負向 domain：對 BLOCK 規則產生 ALLOW 覆蓋
-    if action == "BLOCK" and neg_domains:
-        for d in neg_domains:
-            meta = _build_meta_prefix(type_class, party_class, _domain_to_alt_regex(d))
-            rules.append(RuleSpec(pattern=meta + url_regex, ignore_case=ignore_case, action="ALLOW",
-                                  label=src_label + " (domain-except)"))
+        # 正向 domain 白名單（若有）
+        if pos_domains:
+            if len(pos_domains) == 1:
+                alt = "(?:" + dom_alt(pos_domains[0]) + ")"
+            else:
+                alt = _domains_to_alt_regex(pos_domains)
+            meta = meta_prefix(type_class, party_class, alt)
+        else:
+            meta = meta_any((type_class, party_class)) or meta_prefix(type_class, party_class, None)
+        append(spec(pattern=meta + url_regex, ignore_case=ignore_case, action=action, label=src_label))
+
+        # 負向 domain：對 BLOCK 規則產生 ALLOW 覆蓋
+        # （每條覆蓋規則的 pattern 都得是完整 str；能共用的是快取的 meta 前綴與同一個 label 物件）
+        if action == "BLOCK" and neg_domains:
+            except_label = src_label + " (domain-except)"
+            for d in neg_domains:
+                meta = meta_prefix(type_class, party_class, dom_alt(d))
+                append(spec(pattern=meta + url_regex, ignore_case=ignore_case, action="ALLOW",
+                            label=except_label))
 
     return rules
\ No newline at end of file
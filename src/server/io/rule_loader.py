@@ -1,7 +1,8 @@
 # src/server/io/rule_loader.py
 from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import List, Optional, Iterable, Any
+from typing import Dict, List, Optional, Iterable, Any
 import os
 
 # 既有型別（你 repo 已有）
@@ -9,7 +10,7 @@ from src.server.offline.rules_to_dfa.chain_rules import RuleSpec
 from src.server.offline.rules_to_dfa.regex_to_dfa import RegexFlags
 
 # EasyList 解析器（你 repo 已有；不同分支有「吃路徑」或「吃行迭代器」兩種版本）
-from src.server.io.easylist_loader import parse_easylist as _parse_easylist
+from src.server.io.easylist_loader import parse_easylist as _parse_easylist, is_abp_file
 
 # ---- 相容：離線建置器會匯入這個 ----
 @dataclass(frozen=True)
@@ -23,20 +24,7 @@ LoadRulesConfig = LoaderConfig
 def _looks_like_abp(path: str, sniff: int = 32) -> bool:
     """輕量偵測 ABP/EasyList 檔頭。"""
     try:
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            for i, line in enumerate(f):
-                if i >= sniff:
-                    break
-                s = line.strip()
-                if not s:
-                    continue
-                if s.startswith("[Adblock"):
-                    return True
-                if s.startswith("! Title:") or s.startswith("! Version:"):
-                    return True
-                if "Adblock" in s:
-                    return True
-        return False
+        return is_abp_file(path, sniff_lines=sniff)
     except FileNotFoundError:
         raise
     except Exception:
@@ -71,27 +59,14 @@ def _load_easylist(path: str) -> List[RuleSpec]:
     return specs
 
 def _load_regex_txt(path: str, *, ignore_case_default: bool, anchored: bool, dotall: bool) -> List[RuleSpec]:
-    """每行一條 regex 的純文字檔。"""
-    specs: List[RuleSpec] = []
+    """每行一條 regex 的純文字檔；AID = 載入序（從 1）。"""
+    # 整檔讀進來一次切行、在推導式裡過濾（text mode 已把 \r\n / \r 轉成 \n）
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        for lineno, raw in enumerate(f, 1):
-            line = raw.strip()
-            if not line or line.startswith("#"):
-                continue
-            pattern = line
-            if anchored:
-                if not pattern.startswith("^"):
-                    pattern = "^" + pattern
-                if not pattern.endswith("$"):
-                    pattern = pattern + "$"
-            flags = RegexFlags(ignore_case=ignore_case_default, dotall=dotall, anchored=anchored)
-            specs.append(RuleSpec(pattern=pattern, attack_id=0, flags=flags))
-    # 回填 AID（載入序，從 1）
-    out: List[RuleSpec] = []
-    for i, r in enumerate(specs, 1):
-        aid = r.attack_id if r.attack_id > 0 else i
-        out.append(RuleSpec(r.pattern, aid, r.flags))
-    return out
+        lines = [ln for ln in map(str.strip, f.read().split("\n")) if ln and not ln.startswith("#")]
+    if anchored:
+        lines = [("" if ln.startswith("^") else "^") + ln + ("" if ln.endswith("$") else "$") for ln in lines]
+    flags = RegexFlags(ignore_case=ignore_case_default, dotall=dotall, anchored=anchored)
+    return [RuleSpec(pattern, i, flags) for i, pattern in enumerate(lines, 1)]
 
 # def _try_load_snort(path: str, cfg: LoaderConfig) -> List[RuleSpec]:
 #     """只有在 snort_parser 存在時才啟用；否則友善退出。"""
@@ -109,29 +84,55 @@ def _load_regex_txt(path: str, *, ignore_case_default: bool, anchored: bool, dot
 #     )
 #     return parse_snort_file(path, cfg=scfg)
 
-def load_rules(paths: Iterable[str], cfg: Optional[LoaderConfig] = None) -> List[RuleSpec]:
+def _load_one(p: str, cfg: LoaderConfig) -> List[RuleSpec]:
+    """單一檔案 → RuleSpec[]（模組頂層函式，才能交給 ProcessPoolExecutor pickle）。"""
+    ext = os.path.splitext(p)[1].lower()
+    if _looks_like_abp(p):
+        return _load_easylist(p)
+    if ext in (".txt", ".re", ".regex"):
+        return _load_regex_txt(
+            p,
+            ignore_case_default=False,
+            anchored=False,
+            dotall=cfg.default_dotall,
+        )
+    # if ext in (".rules", ".snort", ".suricata"):
+    #     return _try_load_snort(p, cfg)
+    raise ValueError(f"unsupported rule file type: {p}")
+
+def _dedupe_shared(specs: List[RuleSpec]) -> None:
+    """
+    相同的 pattern 字串 / flags 只留一個物件（原地替換）：多份清單常重複同一條規則，
+    子行程載回來的又都是各自反序列化的副本；共用後省記憶體，下游 hash/比較也快。
+    """
+    patterns: Dict[str, str] = {}
+    flagset: Dict[RegexFlags, RegexFlags] = {}
+    for i, s in enumerate(specs):
+        pat = patterns.setdefault(s.pattern, s.pattern)
+        fl = flagset.setdefault(s.flags, s.flags)
+        if pat is not s.pattern or fl is not s.flags:
+            specs[i] = RuleSpec(pat, s.attack_id, fl)
+
+def load_rules(paths: Iterable[str], cfg: Optional[LoaderConfig] = None,
+               workers: Optional[int] = None) -> List[RuleSpec]:
     """
     - EasyList/ABP：自動偵測 → 轉 regex
     - .txt/.re/.regex：每行一條 regex
     - .rules/.snort/.suricata：如果 snort_parser 存在才支援
+    多個檔案時每個檔案丟給一個子行程解析（純 Python、CPU-bound；各檔互不相依），結果仍依 paths 順序串接。
+    workers：子行程數上限（預設 min(檔案數, CPU 數)）；≤1 則在本行程依序載入。
     """
     cfg = cfg or LoaderConfig()
-    all_specs: List[RuleSpec] = []
-    for p in paths:
-        ext = os.path.splitext(p)[1].lower()
-        if _looks_like_abp(p):
-            all_specs.extend(_load_easylist(p))
-        elif ext in (".txt", ".re", ".regex"):
-            all_specs.extend(_load_regex_txt(
-                p,
-                ignore_case_default=False,
-                anchored=False,
-                dotall=cfg.default_dotall,
-            ))
-        # elif ext in (".rules", ".snort", ".suricata"):
-        #     all_specs.extend(_try_load_snort(p, cfg))
-        else:
-            raise ValueError(f"unsupported rule file type: {p}")
+    paths = list(paths)
+    if workers is None:
+        workers = min(len(paths), os.cpu_count() or 1)
+    if len(paths) > 1 and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            per_file = list(ex.map(_load_one, paths, [cfg] * len(paths)))
+    else:
+        per_file = [_load_one(p, cfg) for p in paths]
+    all_specs: List[RuleSpec] = [s for specs in per_file for s in specs]
+    _dedupe_shared(all_specs)
     if not all_specs:
         raise ValueError("no rules loaded (check inputs)")
     return all_specs
\ No newline at end of file
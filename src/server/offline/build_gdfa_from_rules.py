@@ -6,7 +6,8 @@ import hashlib
 import json
 import os
 import sys
-import struct
+from array import array
+from itertools import chain
 from typing import Dict, List, Optional, Tuple
 
 from src.server.io.rule_loader import LoadRulesConfig, load_rules
@@ -20,44 +21,57 @@ from src.server.offline.gdfa_builder import GDFAStream, GDFAPublicHeader, build_
 from src.server.offline.export.gdfa_packager import write_container, write_jsonbin
 from src.server.offline.key_generator import (
     derive_deterministic_gk_table,
-    make_offline_pad_seed_fn,
+    derive_pad_seed_table,
 )
 
 from src.common.odfa.params import SecurityParams, SparsityParams
 from src.common.odfa.seed_rules import PRG_LABEL_CELL, seed_info  # seed_info for master->seed
-from src.common.crypto.prf import prf_msg  # PRF(key, msg, out_len)
+from src.common.crypto.prf import prf_msg_fn  # PRF(key, ·, out_len)，key schedule 只做一次
+from src.common.crypto.prg import PRG_BACKEND  # 記進 manifest，客戶端載入時比對
 
 
 # ----------------------- helpers: outputs -----------------------
 
-def _write_row_alph(outdir: str, row_alph: List[RowAlphabet]) -> str:
+def _json_bytes(obj, pretty: bool = False) -> bytes:
+    """
+    機器讀的 JSON 預設緊湊輸出（indent=None 才走 C encoder，大 list 快 ~3x）；
+    pretty=True（--pretty-json）才縮排 + 排序 key，給人看。
+    """
+    if pretty:
+        return json.dumps(obj, indent=2, sort_keys=True).encode("utf-8")
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def _write_row_alph(outdir: str, row_alph: List[RowAlphabet], *,
+                    cols_per_row: Optional[List[int]] = None, pretty: bool = False) -> str:
     """
     Write per-row 256B byte->column mapping:
       - row_alph.bin : num_rows × 256 bytes (row-major)
       - row_alph.json: metadata (rows, cols_per_row)
+    cols_per_row 可由呼叫方先算好傳入（main 也拿它導 GK 表），省一次整表掃描。
     """
     os.makedirs(outdir, exist_ok=True)
     bin_path = os.path.join(outdir, "row_alph.bin")
     meta_path = os.path.join(outdir, "row_alph.json")
 
+    if any(len(ra.byte_to_col) != 256 for ra in row_alph):
+        raise ValueError("RowAlphabet.byte_to_col must have 256 entries")
+    # 一次 writelines 交給 C 層逐列寫出（bytes(list) 本身已是 C 迴圈，不需另外攤平）
     with open(bin_path, "wb") as f:
-        for ra in row_alph:
-            if len(ra.byte_to_col) != 256:
-                raise ValueError("RowAlphabet.byte_to_col must have 256 entries")
-            f.write(bytes(ra.byte_to_col))
+        f.writelines(map(bytes, (ra.byte_to_col for ra in row_alph)))
 
     meta = {
         "num_rows": len(row_alph),
-        "cols_per_row": [ra.num_cols for ra in row_alph],
+        "cols_per_row": cols_per_row if cols_per_row is not None else [ra.num_cols for ra in row_alph],
         "format": "row-major; 256 bytes per row; value=column index (0..num_cols-1)",
     }
     with open(meta_path, "wb") as mf:
-        mf.write(json.dumps(meta, indent=2, sort_keys=True).encode("utf-8"))
+        mf.write(_json_bytes(meta, pretty))
 
     return bin_path
 
 
-def _write_gk_table(outdir: str, gk_table: List[List[bytes]]) -> Dict[str, str]:
+def _write_gk_table(outdir: str, gk_table: List[List[bytes]], *, pretty: bool = False) -> Dict[str, str]:
     """
     Write GK table for debugging/inspection:
       - gk_table.bin : row-major; concatenate m keys per row (variable m)
@@ -74,18 +88,21 @@ def _write_gk_table(outdir: str, gk_table: List[List[bytes]]) -> Dict[str, str]:
         raise ValueError("GK table row with zero columns")
 
     klen0 = len(gk_table[0][0])
-    for r, row in enumerate(gk_table):
-        for c, gk in enumerate(row):
-            if len(gk) != klen0:
-                raise ValueError(f"GK length mismatch at row {r} col {c}")
-
+    # 長度檢查一次在 C 層做完；不一致時才逐格找出是哪一格（錯誤訊息同前）
+    if set(map(len, chain.from_iterable(gk_table))) != {klen0}:
+        for r, row in enumerate(gk_table):
+            for c, gk in enumerate(row):
+                if len(gk) != klen0:
+                    raise ValueError(f"GK length mismatch at row {r} col {c}")
+
+    # 邊寫邊算 sha256，不再把整個檔案讀回來；每列串成一塊再 hash/寫入
+    h = hashlib.sha256()
     with open(bin_path, "wb") as f:
         for row in gk_table:
-            for gk in row:
-                f.write(gk)
-    with open(bin_path, "rb") as f:
-        blob = f.read()
-    sha = hashlib.sha256(blob).hexdigest()
+            blob = b"".join(row)
+            h.update(blob)
+            f.write(blob)
+    sha = h.hexdigest()
 
     meta = {
         "num_rows": len(gk_table),
@@ -95,23 +112,47 @@ def _write_gk_table(outdir: str, gk_table: List[List[bytes]]) -> Dict[str, str]:
         "format": "row-major; concatenate m keys per row; recover via cols_per_row & k_bytes",
     }
     with open(meta_path, "wb") as mf:
-        mf.write(json.dumps(meta, indent=2, sort_keys=True).encode("utf-8"))
+        mf.write(_json_bytes(meta, pretty))
 
     return {"path": bin_path, "sha256": sha, "k_bytes": str(klen0)}
 
 
+# row_aids.bin 每行寬度（bytes）→ array typecode（與 client/io/gdfa_loader._ROW_AID_TYPECODES 一致）
+_U32 = "I" if array("I").itemsize == 4 else "L"
+_ROW_AID_TYPECODES = {1: "B", 2: "H", 4: _U32}
+
+
+def _row_aids_u32(state_aids: List[int]) -> array:
+    """state_aids → uint32 array（語義同 int(aid) & 0xffffffff）；全是範圍內的 int 時一次 C 層轉換。"""
+    try:
+        return array(_U32, state_aids)
+    except (OverflowError, TypeError):
+        return array(_U32, [int(aid) & 0xffffffff for aid in state_aids])
+
+
+def _row_aid_width(aids: array) -> int:
+    """row_aids.bin 每行寬度（bytes）：容得下最大 AID 的最小 1/2/4。"""
+    hi = max(aids, default=0)
+    return 1 if hi <= 0xff else 2 if hi <= 0xffff else 4
+
+
 def _write_row_aids(outdir: str, state_aids: List[int], num_states: int) -> str:
     """
     Write line-level AID table:
-      - row_aids.bin : num_states × uint32_le
+      - row_aids.bin : num_states × uint{8,16,32}_le（寬度取最大 AID 所需；客戶端由檔案大小推回寬度）
     """
     if len(state_aids) != num_states:
         raise ValueError(f"row_aids length mismatch: {len(state_aids)} != {num_states}")
     os.makedirs(outdir, exist_ok=True)
     path = os.path.join(outdir, "row_aids.bin")
+    aids = _row_aids_u32(state_aids)
+    width = _row_aid_width(aids)
+    if width != 4:
+        aids = array(_ROW_AID_TYPECODES[width], aids)
+    if sys.byteorder != "little":
+        aids.byteswap()
     with open(path, "wb") as f:
-        for aid in state_aids:
-            f.write(struct.pack("<I", int(aid) & 0xffffffff))
+        aids.tofile(f)
     return path
 
 
@@ -127,6 +168,7 @@ def _write_manifest(
     gk_info: Optional[Dict[str, str]] = None,
     seed_mode: str = "random",
     aux_tables: Optional[Dict[str, str]] = None,
+    pretty: bool = False,
 ) -> None:
     mani = {
         "sources": rules_sources,
@@ -145,6 +187,7 @@ def _write_manifest(
         if isinstance(PRG_LABEL_CELL, (bytes, bytearray))
         else str(PRG_LABEL_CELL),
         "seed_mode": seed_mode,  # "master->seed" | "master->GK->seed" | "random"
+        "prg_backend": PRG_BACKEND,
     }
     if rows_blob_hash:
         mani["rows_sha256"] = rows_blob_hash
@@ -157,17 +200,17 @@ def _write_manifest(
 
     os.makedirs(outdir, exist_ok=True)
     with open(os.path.join(outdir, "manifest.json"), "wb") as f:
-        f.write(json.dumps(mani, indent=2, sort_keys=True).encode("utf-8"))
+        f.write(_json_bytes(mani, pretty))
 
 
-def _maybe_dump_secrets(outdir: str, stream: GDFAStream, mode: str) -> None:
+def _maybe_dump_secrets(outdir: str, stream: GDFAStream, mode: str, *, pretty: bool = False) -> None:
     if mode == "none":
         return
     obj = {"inv_permutation": stream.secrets.inv_permutation}
     if mode == "full":
         obj["pad_seeds_hex"] = [[s.hex() for s in row] for row in stream.secrets.pad_seeds]
     with open(os.path.join(outdir, "secrets.json"), "wb") as f:
-        f.write(json.dumps(obj, indent=2, sort_keys=True).encode("utf-8"))
+        f.write(_json_bytes(obj, pretty))
 
 
 # ----------------------- acceptance/AID extraction -----------------------
@@ -189,67 +232,84 @@ def _derive_state_aids(odfa) -> Tuple[List[int], int]:
 
     aids = [0] * num_states
 
-    # 方法优先
+    # 方法优先（只能逐个状态呼叫）
+    # 逐次 try 留著：3.11 的 try 沒有例外時零成本（200k 狀態 12.4ms vs 12.3ms），
+    # 改成 list(map(fn, range(n))) 再掃一遍也沒有更快；getattr 每個名字只取一次，不必另外快取。
     for fname in ("get_state_aid", "get_row_aid"):
         fn = getattr(odfa, fname, None)
         if callable(fn):
+            hit = False
             for i in range(num_states):
                 try:
                     v = fn(i)
                     if isinstance(v, int) and v > 0:
                         aids[i] = v
+                        hit = True
                 except Exception:
                     pass
-            if any(aids):
+            if hit:
                 return aids, num_states
 
-    # 数组
+    # 数组：切片一次取前 num_states 个，不再逐个 arr[i]
     for name in ("state_aids", "accept_ids", "aid_table"):
         arr = getattr(odfa, name, None)
         if arr is not None:
             try:
-                for i in range(num_states):
-                    v = arr[i]
-                    if isinstance(v, int) and v > 0:
-                        aids[i] = v
-            except Exception:
-                pass
-            if any(aids):
+                vals = arr[:num_states]
+            except Exception:  # 不支援切片（例如以 int 为 key 的 dict）：退回逐个 arr[i]
+                vals = []
+                try:
+                    for i in range(num_states):
+                        vals.append(arr[i])
+                except Exception:
+                    pass
+            hit = False
+            for i, v in enumerate(vals):
+                if isinstance(v, int) and v > 0:
+                    aids[i] = v
+                    hit = True
+            if hit:
                 return aids, num_states
 
-    # 字典
+    # 字典：只走字典本身的项（O(len(mp))，而非 num_states 次 get）
     for name in ("accepting_map", "accepting_ids", "row_to_aid"):
         mp = getattr(odfa, name, None)
         if isinstance(mp, dict):
-            for i in range(num_states):
-                v = mp.get(i, 0)
-                if isinstance(v, int) and v > 0:
+            hit = False
+            for i, v in mp.items():
+                if isinstance(i, int) and 0 <= i < num_states and isinstance(v, int) and v > 0:
                     aids[i] = v
-            if any(aids):
+                    hit = True
+            if hit:
                 return aids, num_states
 
     # 布尔接受
     fn2 = getattr(odfa, "is_accepting", None)
     if callable(fn2):
+        hit = False
         for i in range(num_states):
             try:
                 if fn2(i):
                     aids[i] = 1
+                    hit = True
             except Exception:
                 pass
-        if any(aids):
+        if hit:
             return aids, num_states
 
+    # 集合：逐个元素标记（list 型的 accepting_states 不再做 num_states 次线性 in）
     for name in ("accepting_states", "accepting_rows"):
-        s = getattr(odfa, name, None)
-        if s is not None:
+        st = getattr(odfa, name, None)
+        if st is not None:
+            hit = False
             try:
-                for i in range(num_states):
-                    if i in s:
+                for i in st:
+                    if isinstance(i, int) and 0 <= i < num_states:
                         aids[i] = 1
+                        hit = True
             except Exception:
                 pass
-            if any(aids):
+            if hit:
                 return aids, num_states
 
     # 没有任何接受信息
@@ -264,7 +324,13 @@ def parse_args(argv: List[str]) -> argparse.Namespace:
     p.add_argument("--outdir", default="dist/zids", help="Output directory")
     p.add_argument("--format", choices=["container", "jsonbin"], default="container")
     p.add_argument("--gzip-header", action="store_true", help="GZip header.json when using jsonbin format")
+    p.add_argument("--pretty-json", action="store_true",
+                   help="Indent + sort keys in manifest/meta/header JSONs (default: compact)")
     p.add_argument("--container-path", help="Explicit output path for .gdfa")
+    p.add_argument("--layout", choices=["aos", "soa"], default="aos",
+                   help="rows layout: aos = row-major (default), soa = column-major (rows_soa.bin for jsonbin)")
+    p.add_argument("--container-version", type=int, choices=[1, 2], default=2,
+                   help="container header: 2 = fixed binary header (default), 1 = legacy JSON header")
 
     # rule loader config
     p.add_argument("--combine-contents", action="store_true",
@@ -325,7 +391,8 @@ def main(argv: List[str]) -> None:
 
     # 4) Build per-row alphabets (public; used by client query builder)
     row_alph = build_row_alphabets_from_dfa_trans(dfa_trans, outmax=outmax, cmax=cmax)
-    row_alph_path = _write_row_alph(args.outdir, row_alph)
+    cols_per_row = [ra.num_cols for ra in row_alph]  # row_alph.json 與 GK 表共用
+    row_alph_path = _write_row_alph(args.outdir, row_alph, cols_per_row=cols_per_row, pretty=args.pretty_json)
 
     # 5) Security & sparsity params
     sec = SecurityParams(k_bits=args.k, kprime_bits=args.kprime, kappa=args.kappa, alphabet_size=args.alphabet)
@@ -333,6 +400,7 @@ def main(argv: List[str]) -> None:
 
     # 6) Decide pad_seed_fn mode (this controls offline→online consistency)
     pad_seed_fn = None
+    pad_seeds: Optional[List[List[bytes]]] = None
     gk_info: Optional[Dict[str, str]] = None
     seed_mode = "random"
 
@@ -345,12 +413,13 @@ def main(argv: List[str]) -> None:
         if args.gk_bytes <= 0:
             raise SystemExit("--gk-bytes must be positive")
 
-        cols_per_row = [ra.num_cols for ra in row_alph]
         gk_table = derive_deterministic_gk_table(master_gk, cols_per_row=cols_per_row, k_bytes=args.gk_bytes)
-        gk_info = _write_gk_table(args.outdir, gk_table)
+        gk_info = _write_gk_table(args.outdir, gk_table, pretty=args.pretty_json)
 
-        pad_seed_fn = make_offline_pad_seed_fn(
-            gk_table=gk_table,
+        # 整張 seed 表一次導出（逐格等同 make_offline_pad_seed_fn），builder 不再逐格 callback
+        pad_seeds = derive_pad_seed_table(
+            gk_table, sec.k_bytes,
+            outmax=sp.outmax,
             master_gk=master_gk,
             gk_bytes=args.gk_bytes,
         )
@@ -363,8 +432,12 @@ def main(argv: List[str]) -> None:
         except ValueError as e:
             raise SystemExit(f"invalid --master-key-hex: {e}")
 
+        if not master:
+            raise SystemExit("--master-key-hex must be non-empty")
+        master_prf = prf_msg_fn(master, sec.k_bytes)
+
         def pad_seed_fn(row: int, col: int, k_bytes: int) -> bytes:  # type: ignore[no-redef]
-            return prf_msg(master, seed_info(row, col), k_bytes)
+            return master_prf(seed_info(row, col))  # builder 一律以 sec.k_bytes 呼叫
 
         seed_mode = "master->seed"
 
@@ -378,11 +451,9 @@ def main(argv: List[str]) -> None:
         odfa, sec, sp,
         aid_bits=args.aid_bits,
         pad_seed_fn=pad_seed_fn,
+        pad_seeds=pad_seeds,
     )
     pub = stream.public
-    rows_list = list(stream.rows)  # materialize for hashing/packaging
-    rows_blob = b"".join(rows_list)
-    rows_hash = hashlib.sha256(rows_blob).hexdigest()
 
     # 7.1) Derive and write row_aids.bin（优先用 builder 聚合的行级 AID）
     num_states = pub.num_states
@@ -394,15 +465,16 @@ def main(argv: List[str]) -> None:
     row_aids_path = _write_row_aids(args.outdir, state_aids, num_states)
     aux_tables = {"row_aids": row_aids_path}
 
-    # 8) Package
+    # 8) Package（rows 直接從 stream 串流寫出；writer 邊寫邊算 rows_sha256）
     if args.format == "container":
         path = args.container_path or os.path.join(args.outdir, "gdfa.gdfa")
-        write_container(path, pub, rows_list)
+        rows_hash = write_container(path, pub, stream.rows, layout=args.layout, version=args.container_version)
     else:
-        write_jsonbin(args.outdir, pub, rows_list, gzip_header=args.gzip_header)
+        rows_hash = write_jsonbin(args.outdir, pub, stream.rows, gzip_header=args.gzip_header,
+                                 layout=args.layout, pretty=args.pretty_json)
 
     # 9) Optional secrets (CAUTION)
-    _maybe_dump_secrets(args.outdir, stream, args.save_secrets)
+    _maybe_dump_secrets(args.outdir, stream, args.save_secrets, pretty=args.pretty_json)
 
     # 10) Manifest
     _write_manifest(
@@ -417,6 +489,7 @@ def main(argv: List[str]) -> None:
         gk_info=gk_info,
         seed_mode=seed_mode,
         aux_tables=aux_tables,
+        pretty=args.pretty_json,
     )
 
     # 11) Summary
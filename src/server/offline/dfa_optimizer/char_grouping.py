@@ -61,36 +61,26 @@ def build_row_alphabets_from_dfa_trans(
     _ensure_total_transitions(trans)
 
     row_alphabets: List[RowAlphabet] = []
+    byte_range = range(alphabet_size)
     for s, mp in enumerate(trans):
-        # group bytes by next_state
-        next_to_bytes: Dict[int, List[int]] = {}
-        for b in range(alphabet_size):
-            t = mp[b]
-            next_to_bytes.setdefault(t, []).append(b)
+        # group bytes by next_state：位元組依序走過，next_state 第一次出現的順序
+        # 就是「依群內最小位元組」排序，群內位元組也天然升冪，不必再 sort
+        nexts = list(map(mp.__getitem__, byte_range))
+        col_of: Dict[int, int] = {t: i for i, t in enumerate(dict.fromkeys(nexts))}
 
         # 群的個數即列外度；需 <= outmax
-        groups = sorted(next_to_bytes.items(), key=lambda kv: min(kv[1]))
-        num_groups = len(groups)
+        num_groups = len(col_of)
         if num_groups > outmax:
             raise ValueError(
                 f"Row {s}: outdegree {num_groups} exceeds outmax={outmax}. "
                 f"Either increase outmax per sparsity analysis, or adjust patterns."
             )
 
-        columns: List[List[int]] = []
-        byte_to_col = [-1] * alphabet_size
-        for col_idx, (_t, blist) in enumerate(groups):
-            blist_sorted = sorted(blist)
-            columns.append(blist_sorted)
-            for b in blist_sorted:
-                if byte_to_col[b] != -1:
-                    raise AssertionError("internal: byte assigned twice")
-                byte_to_col[b] = col_idx
-
-        # 防守：確認每個位元組都覆蓋
-        if any(v == -1 for v in byte_to_col):
-            missing = [i for i, v in enumerate(byte_to_col) if v == -1]
-            raise AssertionError(f"internal: uncovered bytes in row {s}: {missing[:8]} ...")
+        # 每個位元組恰好落在一欄（由 nexts 直接映射而來）
+        byte_to_col = list(map(col_of.__getitem__, nexts))
+        columns: List[List[int]] = [[] for _ in range(num_groups)]
+        for b, c in enumerate(byte_to_col):
+            columns[c].append(b)
 
         row_alphabets.append(RowAlphabet(columns=columns, byte_to_col=byte_to_col))
 
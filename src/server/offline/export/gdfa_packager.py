@@ -4,27 +4,132 @@ import json
 import os
 import struct
 import hashlib
-from typing import Iterable
+import sys
+from array import array
+from typing import BinaryIO, Iterable, Tuple
 
 from src.server.offline.gdfa_builder import GDFAPublicHeader
+from src.common.crypto.prg import PRG_BACKEND, PRG_BACKENDS
 
-_MAGIC = b"ZIDSv1\0"
+_MAGIC = b"ZIDSv1\0"     # v1: JSON header
+_MAGIC_V2 = b"ZIDSv2\0"  # v2: 定長二進位 header + int32 permutation（客戶端零解析載入）
 
-def write_jsonbin(outdir: str, pub: GDFAPublicHeader, rows: Iterable[bytes], *, gzip_header: bool = False) -> None:
+# 與 client/io/gdfa_loader._V2_HDR 一致：
+#   alphabet_size, outmax, cmax, num_states, start_row, cell_bytes, row_bytes, aid_bits, layout, perm_len
+#   layout 欄：低 8 位 = rows 佈局代碼（LAYOUTS 索引），次 8 位 = PRG 後端代碼（PRG_BACKENDS 索引；0 = hmac，
+#   所以舊 v2 檔案自然讀成 hmac，而舊客戶端遇到非 hmac 的檔案會因佈局代碼不合法直接拒絕）
+_V2_HDR = struct.Struct("<10I")
+
+# aos 串流寫入時每塊的目標大小（多列 join 成一塊再 hash/寫入）
+_WRITE_CHUNK = 1 << 16
+
+# rows 佈局：aos = 行主序（num_states × row_bytes，預設）；soa = 列主序（cols × num_states × cell_bytes）
+LAYOUTS = ("aos", "soa")
+
+def _check_layout(layout: str) -> None:
+    if layout not in LAYOUTS:
+        raise ValueError(f"unknown rows layout: {layout!r} (expected one of {LAYOUTS})")
+
+def rows_to_soa(rows_blob: bytes, pub: GDFAPublicHeader) -> bytes:
+    """
+    Offline transpose of the row-major blob into column-major order:
+      cell(row, col) moves to offset (col * num_states + row) * cell_bytes.
+    """
+    cb = pub.cell_bytes
+    rb = pub.row_bytes
+    mv = memoryview(rows_blob)
+    return b"".join(
+        mv[r * rb + c * cb: r * rb + (c + 1) * cb]
+        for c in range(rb // cb)
+        for r in range(pub.num_states)
+    )
+
+def _write_rows(f: BinaryIO, pub: GDFAPublicHeader, rows: Iterable[bytes], layout: str) -> Tuple[str, "hashlib._Hash"]:
+    """
+    逐行驗長度並寫入 f，同時累積 sha256；回傳 (行主序 rows 的 sha256 hex, 實際寫入內容的 hasher)。
+    aos：邊產生邊寫，不把整個 rows blob 留在記憶體；
+    soa：每列到達時就把各 cell 散佈進預先配置好的 soa bytearray，不再保留 rows list / rows blob。
+    （量過 mmap 輸出：aos 256B/列時比 buffered write 慢 ~1.7x、4KB/列時持平；
+      soa scatter 進 mmap 比 bytearray 慢。BufferedWriter 已經把 syscall 批次化，維持 f.write。）
+    """
+    rb = pub.row_bytes
+    expected = pub.num_states * rb
+    h = hashlib.sha256()
+    if layout == "aos":
+        # 每攢滿 ~_WRITE_CHUNK 位元組的列才 join 一次再 hash/寫入，少掉逐列的 update/write 呼叫
+        per = max(1, _WRITE_CHUNK // rb)
+        chunk: list = []
+        total = 0
+        for i, r in enumerate(rows):
+            if len(r) != rb:
+                raise ValueError(f"row {i} length {len(r)} != row_bytes {rb}")
+            chunk.append(r)
+            if len(chunk) == per:
+                blob = b"".join(chunk)
+                h.update(blob)
+                f.write(blob)
+                chunk.clear()
+            total += rb
+        if chunk:
+            blob = b"".join(chunk)
+            h.update(blob)
+            f.write(blob)
+        if total != expected:
+            raise ValueError(f"rows total length {total} != {expected}")
+        return h.hexdigest(), h
+
+    # cell(row, col) 落在 (col * num_states + row) * cell_bytes，與 rows_to_soa 相同
+    cb = pub.cell_bytes
+    n = pub.num_states
+    stride = n * cb
+    soa = bytearray(expected)
+    out = memoryview(soa)
+    count = 0
+    for i, r in enumerate(rows):
+        if len(r) != rb:
+            raise ValueError(f"row {i} length {len(r)} != row_bytes {rb}")
+        if i >= n:
+            raise ValueError(f"rows total length exceeds {expected}")
+        h.update(r)
+        mv = memoryview(r)
+        o = i * cb
+        for c in range(0, rb, cb):
+            out[o:o + cb] = mv[c:c + cb]
+            o += stride
+        count = i + 1
+    if count != n:
+        raise ValueError(f"rows total length {count * rb} != {expected}")
+    body = hashlib.sha256(out)
+    f.write(out)
+    out.release()
+    return h.hexdigest(), body
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def write_jsonbin(outdir: str, pub: GDFAPublicHeader, rows: Iterable[bytes], *,
+                  gzip_header: bool = False, layout: str = "aos", pretty: bool = False) -> str:
+    """
+    rows 先串流寫進 rows.bin（邊寫邊算 sha256），再寫帶 rows_sha256 的 header。
+    header.json 預設緊湊輸出（permutation 很長時縮排格式化最花時間）；pretty=True 才縮排 + 排序 key。
+    回傳行主序 rows 的 sha256 hex（給 manifest 用）。任何一行長度不對就刪掉寫了一半的 rows 檔並丟 ValueError。
+    """
     import gzip
 
+    _check_layout(layout)
     os.makedirs(outdir, exist_ok=True)
     header_path = os.path.join(outdir, "header.json" + (".gz" if gzip_header else ""))
-    rows_path   = os.path.join(outdir, "rows.bin")
+    rows_path   = os.path.join(outdir, "rows.bin" if layout == "aos" else "rows_soa.bin")
 
-    rows_list = list(rows)
-    for i, r in enumerate(rows_list):
-        if len(r) != pub.row_bytes:
-            raise ValueError(f"row {i} length {len(r)} != row_bytes {pub.row_bytes}")
-    rows_blob = b"".join(rows_list)
-    expected = pub.num_states * pub.row_bytes
-    if len(rows_blob) != expected:
-        raise ValueError(f"rows total length {len(rows_blob)} != {expected}")
+    try:
+        with open(rows_path, "wb") as f:
+            rows_hex, body = _write_rows(f, pub, rows, layout)
+    except ValueError:
+        _remove_quietly(rows_path)
+        raise
 
     header_obj = {
         "alphabet_size": pub.alphabet_size,
@@ -36,9 +141,15 @@ def write_jsonbin(outdir: str, pub: GDFAPublicHeader, rows: Iterable[bytes], *,
         "cell_bytes": pub.cell_bytes,
         "row_bytes": pub.row_bytes,
         "aid_bits": pub.aid_bits,
-        "rows_sha256": hashlib.sha256(rows_blob).hexdigest(),
+        "rows_sha256": body.hexdigest(),
+        "prg_backend": PRG_BACKEND,
     }
-    header_bytes = json.dumps(header_obj, indent=2, sort_keys=True).encode("utf-8")
+    if layout != "aos":
+        header_obj["layout"] = layout
+    if pretty:
+        header_bytes = json.dumps(header_obj, indent=2, sort_keys=True).encode("utf-8")
+    else:
+        header_bytes = json.dumps(header_obj, separators=(",", ":")).encode("utf-8")
 
     if gzip_header:
         with gzip.open(header_path, "wb") as gz:
@@ -46,39 +157,57 @@ def write_jsonbin(outdir: str, pub: GDFAPublicHeader, rows: Iterable[bytes], *,
     else:
         with open(header_path, "wb") as f:
             f.write(header_bytes)
+    return rows_hex
 
-    with open(rows_path, "wb") as f:
-        f.write(rows_blob)
+def _header_v2(pub: GDFAPublicHeader, layout: str) -> bytes:
+    perm = array("i", pub.permutation)
+    if sys.byteorder != "little":
+        perm.byteswap()
+    fixed = _V2_HDR.pack(
+        pub.alphabet_size, pub.outmax, pub.cmax, pub.num_states, pub.start_row,
+        pub.cell_bytes, pub.row_bytes, pub.aid_bits,
+        LAYOUTS.index(layout) | (PRG_BACKENDS.index(PRG_BACKEND) << 8), len(perm),
+    )
+    return _MAGIC_V2 + fixed + perm.tobytes()
 
-def write_container(container_path: str, pub: GDFAPublicHeader, rows: Iterable[bytes]) -> None:
+def write_container(container_path: str, pub: GDFAPublicHeader, rows: Iterable[bytes], *,
+                    layout: str = "aos", version: int = 2) -> str:
+    """
+    version=2（預設）：ZIDSv2 二進位 header；version=1：舊 JSON header（給舊客戶端）。
+    兩者之後都是 rows blob + sha256(rows)。rows 串流寫入、邊寫邊算雜湊，最後補上 digest。
+    回傳行主序 rows 的 sha256 hex（給 manifest 用）；行長度不對時刪掉寫了一半的檔案並丟 ValueError。
+    """
+    _check_layout(layout)
+    if version not in (1, 2):
+        raise ValueError(f"unsupported container version: {version}")
     os.makedirs(os.path.dirname(container_path) or ".", exist_ok=True)
 
-    rows_list = list(rows)
-    for i, r in enumerate(rows_list):
-        if len(r) != pub.row_bytes:
-            raise ValueError(f"row {i} length {len(r)} != row_bytes {pub.row_bytes}")
-    rows_blob = b"".join(rows_list)
-    expected = pub.num_states * pub.row_bytes
-    if len(rows_blob) != expected:
-        raise ValueError(f"rows total length {len(rows_blob)} != {expected}")
+    if version == 2:
+        head = _header_v2(pub, layout)
+    else:
+        header_obj = {
+            "alphabet_size": pub.alphabet_size,
+            "outmax": pub.outmax,
+            "cmax": pub.cmax,
+            "num_states": pub.num_states,
+            "start_row": pub.start_row,
+            "permutation": pub.permutation,
+            "cell_bytes": pub.cell_bytes,
+            "row_bytes": pub.row_bytes,
+            "aid_bits": pub.aid_bits,
+            "prg_backend": PRG_BACKEND,
+        }
+        if layout != "aos":
+            header_obj["layout"] = layout
+        hdr_bytes = json.dumps(header_obj, separators=(",", ":")).encode("utf-8")
+        head = _MAGIC + struct.pack(">I", len(hdr_bytes)) + hdr_bytes
 
-    header_obj = {
-        "alphabet_size": pub.alphabet_size,
-        "outmax": pub.outmax,
-        "cmax": pub.cmax,
-        "num_states": pub.num_states,
-        "start_row": pub.start_row,
-        "permutation": pub.permutation,
-        "cell_bytes": pub.cell_bytes,
-        "row_bytes": pub.row_bytes,
-        "aid_bits": pub.aid_bits,
-    }
-    hdr_bytes = json.dumps(header_obj, separators=(",", ":")).encode("utf-8")
-    body_hash = hashlib.sha256(rows_blob).digest()
-
-    with open(container_path, "wb") as f:
-        f.write(_MAGIC)
-        f.write(struct.pack(">I", len(hdr_bytes)))
-        f.write(hdr_bytes)
-        f.write(rows_blob)
-        f.write(body_hash)
+    try:
+        with open(container_path, "wb") as f:
+            f.write(head)
+            rows_hex, body = _write_rows(f, pub, rows, layout)
+            f.write(body.digest())
+    except ValueError:
+        _remove_quietly(container_path)
+        raise
+    return rows_hex
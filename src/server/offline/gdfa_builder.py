@@ -98,6 +98,8 @@ def build_gdfa_stream(
     # Optional: plug the online GK→seed rule so offline rows match online decryption.
     # Signature: pad_seed_fn(new_row: int, col: int, k_bytes: int) -> bytes  (len == k_bytes)
     pad_seed_fn: Optional[Callable[[int, int, int], bytes]] = None,
+    # Optional: precomputed pad_seeds[new_row][col] (e.g. key_generator.derive_pad_seed_table)
+    pad_seeds: Optional[List[List[bytes]]] = None,
 ) -> GDFAStream:
     """
     Build a GDFA row-stream using common ODFA types, packing, and permutation helpers.
@@ -127,18 +129,29 @@ def build_gdfa_stream(
     row_aids_logical: List[int] = [0] * odfa.num_states
 
     # 4) Pre-sample per-cell seeds (server-only)
-    pad_seeds: List[List[bytes]] = []
-    for new_row in range(odfa.num_states):
-        row_seeds: List[bytes] = []
-        for c in range(sp.outmax):
-            if pad_seed_fn is None:
-                seed = os.urandom(sec.k_bytes)
-            else:
-                seed = pad_seed_fn(new_row, c, sec.k_bytes)
-                if not isinstance(seed, (bytes, bytearray)) or len(seed) != sec.k_bytes:
-                    raise ValueError("pad_seed_fn must return bytes of length k_bytes")
-            row_seeds.append(bytes(seed))
-        pad_seeds.append(row_seeds)
+    if pad_seeds is not None:
+        if pad_seed_fn is not None:
+            raise ValueError("give either pad_seed_fn or pad_seeds, not both")
+        if len(pad_seeds) != odfa.num_states:
+            raise ValueError("pad_seeds must have num_states rows")
+        k = sec.k_bytes
+        for row_seeds in pad_seeds:
+            if len(row_seeds) != sp.outmax or any(len(s) != k for s in row_seeds):
+                raise ValueError("pad_seeds rows must hold outmax seeds of length k_bytes")
+        pad_seeds = [[bytes(s) for s in row_seeds] for row_seeds in pad_seeds]
+    else:
+        pad_seeds = []
+        for new_row in range(odfa.num_states):
+            row_seeds: List[bytes] = []
+            for c in range(sp.outmax):
+                if pad_seed_fn is None:
+                    seed = os.urandom(sec.k_bytes)
+                else:
+                    seed = pad_seed_fn(new_row, c, sec.k_bytes)
+                    if not isinstance(seed, (bytes, bytearray)) or len(seed) != sec.k_bytes:
+                        raise ValueError("pad_seed_fn must return bytes of length k_bytes")
+                row_seeds.append(bytes(seed))
+            pad_seeds.append(row_seeds)
 
     public = GDFAPublicHeader(
         alphabet_size=sec.alphabet_size,
@@ -154,6 +167,8 @@ def build_gdfa_stream(
     secrets = GDFASecrets(pad_seeds=pad_seeds, inv_permutation=inv_perm)
 
     # 5) Row generator in PER order
+    #    （刻意維持 generator：packager 以 ~64KB 一塊串流 hash + 寫出，AoS 峰值記憶體只有一塊；
+    #      預先配置 mmap 讓 builder 直接寫入量過比 buffered write 慢，見 gdfa_packager._write_rows）
     def _row_iter() -> Iterator[bytes]:
         for new_row, old_state in enumerate(perm):
             base_row: ODFARow = odfa.rows[old_state]
@@ -1,10 +1,12 @@
 # src/server/offline/key_generator.py
 from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from typing import List, Optional, Callable
 import os
 
-from src.common.crypto.prf import prf_msg
-from src.common.odfa.seed_rules import seed_from_gk, i2osp
+from src.common.crypto.prf import prf_msg_fn
+from src.common.odfa.seed_rules import seed_from_gk, seed_resolver, i2osp
 
 # ------------------ GK 生成 ------------------
 
@@ -17,15 +19,12 @@ def derive_deterministic_gk_table(master_key: bytes, cols_per_row: List[int], k_
     if k_bytes <= 0:
         raise ValueError("k_bytes must be positive")
 
-    mk = bytes(master_key)
+    gk_prf = prf_msg_fn(master_key, k_bytes)   # 這裡的 k_bytes = GK 長度（--gk-bytes）
+    cols = [b"|col=" + i2osp(col, 2) for col in range(max(cols_per_row, default=0))]
     table: List[List[bytes]] = []
     for row, m in enumerate(cols_per_row):
-        row_list: List[bytes] = []
-        for col in range(m):
-            label = b"ZIDS|GK|row=" + i2osp(row, 4) + b"|col=" + i2osp(col, 2)
-            gk = prf_msg(mk, label, k_bytes)   # 這裡的 k_bytes = GK 長度（--gk-bytes）
-            row_list.append(gk)
-        table.append(row_list)
+        head = b"ZIDS|GK|row=" + i2osp(row, 4)
+        table.append([gk_prf(head + cols[col]) for col in range(m)])
     return table
 
 
@@ -48,7 +47,78 @@ def derive_seed_from_gk(gk: bytes, row: int, col: int, k_bytes: int) -> bytes:
     """
     return seed_from_gk(gk, row, col, k_bytes)
 
-# ------------------ builder 專用：pad_seed 函式工廠 ------------------
+# ------------------ builder 專用：整張 pad seed 表 / pad_seed 函式工廠 ------------------
+
+# 格數少於這個值就不開子行程（行程啟動 + pickle gk_table 的成本蓋過 HMAC 本身）
+_PARALLEL_MIN_CELLS = 1 << 16
+
+def _pad_seed_rows(
+    start: int,
+    gk_rows: List[List[bytes]],
+    k_bytes: int,
+    outmax: int,
+    master_gk: Optional[bytes],
+    gk_bytes: Optional[int],
+) -> List[List[bytes]]:
+    """
+    gk_rows 對應第 start.. 列；回傳這幾列的 seeds（模組頂層函式，才能交給 ProcessPoolExecutor pickle）。
+    每列共用 seed_resolver 預組的訊息，補位欄位的 dummy GK 共用 master_gk 的 HMAC key schedule。
+    """
+    dummy_prf = prf_msg_fn(master_gk, gk_bytes) if master_gk is not None else None
+    table: List[List[bytes]] = []
+    for row, gks in enumerate(gk_rows, start):
+        resolve = seed_resolver(row, outmax, k_bytes)
+        m = min(len(gks), outmax)
+        row_seeds = [resolve(gks[col], col) for col in range(m)]
+        if m < outmax:
+            if dummy_prf is None:
+                raise IndexError("col exceeds row's GK count and no master_gk provided for dummy slots")
+            head = b"ZIDS|GK|unused|" + i2osp(row, 4) + b"|"
+            row_seeds.extend(resolve(dummy_prf(head + i2osp(col, 2)), col) for col in range(m, outmax))
+        table.append(row_seeds)
+    return table
+
+
+def derive_pad_seed_table(
+    gk_table: List[List[bytes]],
+    k_bytes: int,
+    *,
+    outmax: int,
+    master_gk: Optional[bytes] = None,
+    gk_bytes: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> List[List[bytes]]:
+    """
+    一次導出 seeds[row][col]（col ∈ [0, outmax)），逐格等同
+    make_offline_pad_seed_fn(gk_table=..., master_gk=..., gk_bytes=...)(row, col, k_bytes)。
+    結果直接交給 build_gdfa_stream(pad_seeds=...)，省掉逐格 callback。
+    各列互不相依：格數夠多時按列切塊丟給子行程，結果依列序串接。
+    workers：子行程數上限（預設 CPU 數）；≤1 或表太小則在本行程依序導出。
+    """
+    if not isinstance(gk_table, list) or len(gk_table) == 0:
+        raise ValueError("gk_table must be non-empty list")
+    if master_gk is not None:
+        if not isinstance(gk_bytes, int) or gk_bytes <= 0:
+            raise ValueError("gk_bytes must be a positive int (== --gk-bytes)")
+
+    n = len(gk_table)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or n < 2 or n * outmax < _PARALLEL_MIN_CELLS:
+        return _pad_seed_rows(0, gk_table, k_bytes, outmax, master_gk, gk_bytes)
+
+    # 每個子行程分到幾塊，讓慢的那塊不至於拖住整體
+    step = -(-n // (workers * 4))
+    starts = list(range(0, n, step))
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        parts = ex.map(
+            _pad_seed_rows,
+            starts,
+            [gk_table[s:s + step] for s in starts],
+            repeat(k_bytes), repeat(outmax), repeat(master_gk), repeat(gk_bytes),
+        )
+        return [row for part in parts for row in part]
+
 
 def make_offline_pad_seed_fn(
     *,
@@ -74,12 +144,12 @@ def make_offline_pad_seed_fn(
             raise ValueError("master_gk must be non-empty bytes")
         if not isinstance(gk_bytes, int) or gk_bytes <= 0:
             raise ValueError("gk_bytes must be a positive int (== --gk-bytes)")
-        mk = bytes(master_gk)
+        gk_prf = prf_msg_fn(master_gk, gk_bytes)
 
         def pad_seed_from_master(row: int, col: int, k_bytes: int) -> bytes:
             # 先導出 GK(row,col)（長度 = gk_bytes），再導 seed（長度 = k_bytes）
             label = b"ZIDS|GK|row=" + i2osp(row, 4) + b"|col=" + i2osp(col, 2)
-            gk = prf_msg(mk, label, gk_bytes)
+            gk = gk_prf(label)
             return derive_seed_from_gk(gk, row, col, k_bytes)
 
         return pad_seed_from_master
@@ -87,10 +157,11 @@ def make_offline_pad_seed_fn(
     # 有 gk_table 的情形
     if not isinstance(gk_table, list) or len(gk_table) == 0:
         raise ValueError("gk_table must be non-empty list")
-    mk = bytes(master_gk) if master_gk is not None else None
-    if mk is not None:
+    dummy_prf = None
+    if master_gk is not None:
         if not isinstance(gk_bytes, int) or gk_bytes <= 0:
             raise ValueError("gk_bytes must be a positive int (== --gk-bytes)")
+        dummy_prf = prf_msg_fn(master_gk, gk_bytes)
 
     def pad_seed_from_gk_table(row: int, col: int, k_bytes: int) -> bytes:
         if row < 0 or row >= len(gk_table):
@@ -99,10 +170,10 @@ def make_offline_pad_seed_fn(
         if col < m:
             return derive_seed_from_gk(gk_table[row][col], row, col, k_bytes)
         # 補位欄位：用 master_gk 決定性導出 dummy GK（長度 = gk_bytes）
-        if mk is None:
+        if dummy_prf is None:
             raise IndexError("col exceeds row's GK count and no master_gk provided for dummy slots")
         dummy_label = b"ZIDS|GK|unused|" + i2osp(row, 4) + b"|" + i2osp(col, 2)
-        dummy_gk = prf_msg(mk, dummy_label, gk_bytes)
+        dummy_gk = dummy_prf(dummy_label)
         return derive_seed_from_gk(dummy_gk, row, col, k_bytes)
 
     return pad_seed_from_gk_table
@@ -112,5 +183,6 @@ __all__ = [
     "derive_deterministic_gk_table",
     "sample_gk_table",
     "derive_seed_from_gk",
+    "derive_pad_seed_table",
     "make_offline_pad_seed_fn",
 ]
\ No newline at end of file
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, List, Iterable
 import json, os
 
 from src.server.online.session_manager import SessionManager, SessionConfig
@@ -68,4 +68,8 @@ class ZIDSServerApp:
         上层拿去做 1-of-m OT。
         """
         aad, payload = self.sessions.payload_for_row(session_id, row_id)
-        return aad, payload
\ No newline at end of file
+        return aad, payload
+
+    def ot_rows_payload(self, session_id: str, row_ids: Iterable[int]) -> List[Tuple[bytes, List[bytes]]]:
+        """ot_row_payload 的批次版：一次呼叫取回多行，回傳與 row_ids 同序。"""
+        return self.sessions.payload_for_rows(session_id, row_ids)
\ No newline at end of file
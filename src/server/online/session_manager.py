@@ -1,7 +1,7 @@
 # src/server/online/session_manager.py
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 import os
 import secrets
 import time
@@ -104,6 +104,12 @@ class SessionManager:
         payload = builder.payload_for_row(row_id)
         return aad, payload
 
+    def payload_for_rows(self, session_id: str, row_ids: Iterable[int]) -> List[Tuple[bytes, List[bytes]]]:
+        """payload_for_row 的批次版（與 row_ids 同序）：會話查找與 OTResponseBuilder 只做一次。"""
+        st = self.get(session_id)
+        builder = OTResponseBuilder(self.meta, st.gk_store)
+        return [(st.aad_for_row(r), builder.payload_for_row(r)) for r in row_ids]
+
     # ----（選）驗證/除錯用：以 server 端複算 seed ----
 
     def derive_seed(self, session_id: str, row_id: int, col: int, out_len: int) -> bytes:
@@ -0,0 +1,79 @@
+# test/test_abp_canonicalize.py
+from __future__ import annotations
+
+from src.common.abp_canonicalize import (
+    DOMSTART, META_SEP, SEP, canonicalize_for_abp, canonicalize_for_abp_bytes,
+)
+
+def banner(s: str): print("\n======== " + s + " ========")
+
+REQ_URLS = [
+    "https://ads.example.com/banner/ad.js?x=1&y=2#frag",
+    "http://EXAMPLE.com:80/a",             # 預設埠 + 大寫 host
+    "https://example.com:443",             # 預設埠、沒有 path
+    "https://example.com:8443/p",          # 非預設埠
+    "http://example.com",                  # 沒有 path
+    "http://example.com?q=1",              # 沒有 path、有 query
+    "http://[2001:db8::1]:8080/x?y",       # IPv6 + 埠
+    "http://[::1]/",
+    "http://192.168.0.1:81/z",
+    "https://bücher.de/straße?q=ä",        # 非 ASCII host（IDNA）與 path
+    "https://xn--bcher-kva.de/",
+    "https://example.com/ü",
+    "https://example.com/%20a/%e4",        # %xx 不解碼
+    "http://user:pw@example.com/p",
+    "//cdn.example.com/x.js",              # 協定相對
+    "https://a.b.co.uk/x y",
+    "example.com/relative",
+    "",
+]
+DOC_URLS = [
+    "https://example.com/",
+    "https://news.bbc.co.uk/p",
+    "http://[2001:db8::1]/",
+    "https://bücher.de/",
+    "http://EXAMPLE.COM:80",
+    "",
+]
+REQ_TYPES = [None, "script", "image", "xhr", "SCRIPT", "bogus"]
+
+def _str_ref(r: str, d: str, t) -> object:
+    try:
+        return canonicalize_for_abp(r, d, t).encode("utf-8")
+    except Exception as e:  # 兩邊要以同一種例外失敗
+        return type(e)
+
+def _bytes_got(r, d, t) -> object:
+    try:
+        return canonicalize_for_abp_bytes(r, d, t)
+    except Exception as e:
+        return type(e)
+
+def main():
+    banner("bytes version == str version .encode()")
+    n = 0
+    for r in REQ_URLS:
+        for d in DOC_URLS:
+            for t in REQ_TYPES:
+                exp = _str_ref(r, d, t)
+                tb = t.encode("ascii") if t is not None else None
+                # str / bytes / 混合輸入都要得到同一個結果（ASCII bytes 走快路徑，其餘退回 str 版）
+                for args in ((r, d, t), (r.encode(), d.encode(), tb), (r.encode(), d, t), (r, d.encode(), tb)):
+                    got = _bytes_got(*args)
+                    assert got == exp, (args, exp, got)
+                    n += 1
+    print(f"OK ({n} combinations)")
+
+    banner("Spot checks")
+    out = canonicalize_for_abp_bytes(b"http://[2001:db8::1]:8080/x?y", b"https://example.com/", b"script")
+    assert out == ("STexample.com" + META_SEP + DOMSTART + "2001:db8::1" + SEP + SEP + "x" + SEP + "y").encode()  # "/" 與 "?" 也 SEP 化
+    out = canonicalize_for_abp_bytes(b"https://example.com:443", b"https://example.com/")
+    assert out.endswith((DOMSTART + "example.com" + SEP + SEP).encode())  # 沒有 path → "/" → SEP
+    out = canonicalize_for_abp_bytes("https://bücher.de/straße", "https://bücher.de/")
+    assert b"xn--bcher-kva.de" in out and out.isascii()
+    print("OK")
+
+    print("\nAll ABP canonicalization tests passed ✔")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+# test/test_chooser_http.py
+from __future__ import annotations
+import base64
+import binascii
+import os
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Tuple
+
+from src.client.io.gdfa_loader import load_gdfa
+from src.client.io.row_alph_loader import RowAlphabetMap
+from src.client.online.chooser_http import HttpChooser, _decode_gk
+from src.client.online.engine import ZIDSEngine, EngineConfig
+from src.client.online.ot_client import LocalTrivialOTChooser
+from src.server.online.handler import ZIDSServerApp, ServerConfig
+from src.server.online.ot_response_builder import RowAlphMeta
+
+ART = os.path.join(os.path.dirname(__file__), "..", "..", "..", "dist", "zids_easy")
+
+def banner(s: str): print("\n======== " + s + " ========")
+
+class FakeResponse:
+    def __init__(self, status_code: int, body: dict | None = None):
+        self.status_code = status_code
+        self._body = body or {}
+
+    def json(self) -> dict:
+        return self._body
+
+class FakeSession:
+    """取代 HttpChooser.s：按路徑分派給 handler(body) -> FakeResponse，並記下每次 POST（不連網）。"""
+    def __init__(self, routes: Dict[str, Callable[[dict], FakeResponse]]):
+        self.routes = routes
+        self.headers: Dict[str, str] = {}
+        self.posts: List[Tuple[str, dict]] = []
+
+    def post(self, url: str, json: dict, timeout: float) -> FakeResponse:
+        path = url.split("://", 1)[-1].split("/", 1)[-1]
+        path = "/" + path
+        self.posts.append((path, json))
+        handler = self.routes.get(path)
+        return handler(json) if handler is not None else FakeResponse(404)
+
+    def paths(self) -> List[str]:
+        return [p for p, _ in self.posts]
+
+def _chooser(routes: Dict[str, Callable[[dict], FakeResponse]]) -> HttpChooser:
+    ch = HttpChooser("http://gk.test/")
+    ch.s = FakeSession(routes)
+    return ch
+
+def _b64(gk: bytes) -> str:
+    return base64.b64encode(gk).decode("ascii")
+
+def _gk_server(row_endpoint: bool):
+    """
+    dist/zids_easy 的 GK 服務（本地 server + LocalTrivialOTChooser），包成 FakeSession 的 routes：
+      /ot      → {"gk_b64"}；/ot/row → 整行 {"gks_b64"}（row_endpoint=False 時回 404）；/ot/preload → 200
+    回傳 (routes, row_alph, gdfa, sid)。
+    """
+    meta = RowAlphMeta.load(os.path.join(ART, "row_alph.json"))
+    app = ZIDSServerApp(meta, ServerConfig(manifest_path=os.path.join(ART, "manifest.json"),
+                                           gk_files_dir=ART, gk_bytes=32))
+    sid = app.init_session()["session_id"]
+    local = LocalTrivialOTChooser(server=app, session_id=sid, seed_k_bytes=16)
+    ra = RowAlphabetMap.load(ART)
+    lock = threading.Lock()  # LocalTrivialOTChooser 的快取不是為多執行緒寫的
+
+    def ot(body):
+        with lock:
+            return FakeResponse(200, {"gk_b64": _b64(local.choose_one(body["row"], body["col"]))})
+
+    def ot_row(body):
+        if not row_endpoint:
+            return FakeResponse(404)
+        r = body["row"]
+        with lock:
+            return FakeResponse(200, {"gks_b64": [_b64(local.choose_one(r, c)) for c in range(ra.num_cols(r))]})
+
+    routes = {"/ot": ot, "/ot/row": ot_row, "/ot/preload": lambda body: FakeResponse(200)}
+    return routes, ra, load_gdfa(os.path.join(ART, "gdfa.gdfa")), sid
+
+def _old_decode(s: str) -> bytes:
+    """舊版 "gk" 解法：先試非驗證 b64decode，失敗再當 hex。"""
+    try:
+        return base64.b64decode(s)
+    except Exception:
+        return bytes.fromhex(s)
+
+def main():
+    banner('_decode_gk: "gk" field, base64 vs hex')
+    cases = [
+        ("QUJD", b"ABC"),               # base64（不需補 =）
+        ("QUJDRA==", b"ABCD"),          # base64 + padding
+        ("QUJDREU=", b"ABCDE"),
+        ("QUJD\n", b"ABC"),             # 尾端換行
+        ("QUJD\r\nRA==", b"ABCD"),      # 折行的 base64
+        (" QU JD\t", b"ABC"),
+        ("00ff10", b"\x00\xff\x10"),    # 偶數長度 hex，長度非 4 倍數 → hex
+        ("0a0b0c0d0e", b"\n\x0b\x0c\r\x0e"),
+        ("00 ff 10", b"\x00\xff\x10"),  # 帶空白的 hex
+        ("00ff", base64.b64decode("00ff")),  # 長度 4 倍數的 hex 字元也合 base64：照舊當 base64
+    ]
+    for s, want in cases:
+        got = _decode_gk({"gk": s})
+        assert got == want, (s, got, want)
+        assert got == _old_decode(s), s  # 與舊的 try-b64-then-hex 一致
+    # base64 不補 padding、長度非 4 倍數：舊版也是落到 fromhex 再失敗
+    # 奇數長度 hex：不合 base64 長度，也不是合法 hex
+    # url-safe "-"/"_"：刻意拒絕（舊版會默默丟掉這些字元，解出錯的 GK）
+    for s in ("QUJDRA", "QUJDREU", "abc", "00f", "QU-J", "QUJ_", "-_-_"):
+        try:
+            _decode_gk({"gk": s})
+            raise AssertionError(f"{s!r} should be rejected")
+        except (ValueError, binascii.Error):
+            pass
+    assert _decode_gk({"gk_hex": "00ff"}) == b"\x00\xff"  # 明確 hex
+    assert _decode_gk({"gk_b64": "QUJD"}) == b"ABC"
+    assert _decode_gk({"other": 1}) is None
+    print("OK")
+
+    banner("choose_one: rejected gk falls back to /choose_one, then RuntimeError")
+    ch = _chooser({
+        "/ot": lambda body: FakeResponse(200, {"gk": "QU-J"}),
+        "/choose_one": lambda body: FakeResponse(200, {"gk": "QUJ_"}),
+    })
+    try:
+        ch.choose_one(1, 2)
+        raise AssertionError("url-safe base64 should not decode")
+    except RuntimeError as e:
+        assert "row=1 col=2" in str(e)
+    assert ch.s.paths() == ["/ot", "/choose_one"]
+    ch = _chooser({"/ot": lambda body: FakeResponse(200, {"gk": "QUJD\r\nRA=="})})
+    assert ch.choose_one(1, 2) == b"ABCD"
+    assert ch.s.posts == [("/ot", {"row": 1, "col": 2})]
+    print("OK")
+
+    banner("/ot/row: whole-row cache, then no more requests for that row")
+    gks = [b"g0", b"g1", b"g2"]
+    ch = _chooser({"/ot/row": lambda body: FakeResponse(200, {"gks_b64": [_b64(g) for g in gks]}),
+                   "/ot": lambda body: FakeResponse(200, {"gk_b64": _b64(b"single")})})
+    ch.ensure_row_payload_cached(7)
+    ch.ensure_row_payload_cached(7)  # 已快取：不再 POST
+    assert ch.s.posts == [("/ot/row", {"row": 7})]
+    assert [ch.choose_one(7, c) for c in range(3)] == gks
+    assert ch.s.paths() == ["/ot/row"]
+    print("OK")
+
+    banner("/ot/row shorter than the row: missing columns fall through to /ot")
+    ch = _chooser({"/ot/row": lambda body: FakeResponse(200, {"gks_b64": [_b64(b"g0"), _b64(b"g1")]}),
+                   "/ot": lambda body: FakeResponse(200, {"gk_b64": _b64(b"col%d" % body["col"])})})
+    ch.ensure_row_payload_cached(4)
+    assert ch.choose_one(4, 1) == b"g1"
+    assert ch.choose_one(4, 5) == b"col5"
+    assert ch.s.posts == [("/ot/row", {"row": 4}), ("/ot", {"row": 4, "col": 5})]
+    print("OK")
+
+    banner("/ot/row 404 is latched; falls back to /ot/preload")
+    ch = _chooser({"/ot/preload": lambda body: FakeResponse(200),
+                   "/ot": lambda body: FakeResponse(200, {"gk_b64": _b64(b"x")})})
+    ch.ensure_row_payload_cached(1)
+    ch.ensure_row_payload_cached(2)
+    assert ch.s.paths() == ["/ot/row", "/ot/preload", "/ot/preload"]
+    assert ch._row_supported is False and not ch._row_cache
+    assert ch.choose_one(2, 0) == b"x" and ch.s.paths()[-1] == "/ot"
+    print("OK")
+
+    banner("choose_many: /ot/batch, and its 404 latch")
+    ch = _chooser({"/ot/batch": lambda body: FakeResponse(200, {"gks": [
+                       {"gk_b64": _b64(b"a")}, _b64(b"b"), {"gk_hex": "63"}]})})
+    assert ch.choose_many([(1, 0), (1, 1), (2, 0)]) == [b"a", b"b", b"c"]
+    assert ch.s.posts == [("/ot/batch", {"pairs": [[1, 0], [1, 1], [2, 0]]})]
+    assert ch.choose_many([]) == [] and len(ch.s.posts) == 1
+    ch = _chooser({"/ot": lambda body: FakeResponse(200, {"gk_b64": _b64(bytes([body["row"], body["col"]]))})})
+    assert ch.choose_many([(1, 0), (3, 2)]) == [b"\x01\x00", b"\x03\x02"]
+    assert ch.choose_many([(5, 1)]) == [b"\x05\x01"]
+    assert ch.s.paths() == ["/ot/batch", "/ot", "/ot", "/ot"]  # 404 之後不再試 /ot/batch
+    assert ch._batch_supported is False
+    # 長度不符的批次回應：整批退回逐筆
+    ch = _chooser({"/ot/batch": lambda body: FakeResponse(200, {"gks": [_b64(b"a")]}),
+                   "/ot": lambda body: FakeResponse(200, {"gk_b64": _b64(b"one")})})
+    assert ch.choose_many([(1, 0), (1, 1)]) == [b"one", b"one"]
+    assert ch.s.paths() == ["/ot/batch", "/ot", "/ot"] and ch._batch_supported
+    print("OK")
+
+    banner("choose_one: concurrent callers share one request (single-flight)")
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_ot(body):
+        entered.set()
+        release.wait(5)
+        return FakeResponse(200, {"gk_b64": _b64(b"shared")})
+
+    ch = _chooser({"/ot": slow_ot})
+    n = 8
+    start = threading.Barrier(n)
+    results: List[bytes] = []
+
+    def worker():
+        start.wait()
+        results.append(ch.choose_one(1, 2))
+
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for t in threads:
+        t.start()
+    assert entered.wait(5)
+    time.sleep(0.1)  # 讓其餘呼叫者都排到同一個 Future 上
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert results == [b"shared"] * n
+    assert ch.s.paths() == ["/ot"], ch.s.paths()
+    assert not ch._inflight
+    # 失敗也會分給所有等待者，之後的呼叫重新發請求
+    ch = _chooser({"/ot": lambda body: FakeResponse(500), "/choose_one": lambda body: FakeResponse(500)})
+    for _ in range(2):
+        try:
+            ch.choose_one(1, 2)
+            raise AssertionError("5xx should not produce a GK")
+        except RuntimeError:
+            pass
+    assert ch.s.paths() == ["/ot", "/choose_one"] * 2 and not ch._inflight
+    print("OK")
+
+    banner("Engine over HttpChooser: each row preloaded once")
+    inputs = [b"lHlt##tpdlt##.sll", b"t##.sll", b"t.ttl.lwi", b"tpdl", b"lHl" * 5, b"GET /abc.t##"]
+    ref = None
+    for row_endpoint in (True, False):
+        for workers in (0, 2):
+            routes, ra, gdfa, sid = _gk_server(row_endpoint)
+            ch = _chooser(routes)
+            eng = ZIDSEngine(gdfa, ra, ch, EngineConfig(session_id=sid, k_bytes=16, fetch_workers=workers))
+            try:
+                out = [eng.run_abp_payload(x) for x in inputs]
+            finally:
+                eng.close()
+            ref = out if ref is None else ref
+            assert out == ref and any(out)
+            # 有 /ot/row：每行一次 /ot/row，其餘 GK 全來自整行快取
+            # 沒有（404）：/ot/row 只試一次，之後每行一次 /ot/preload，GK 逐筆走 /ot
+            preload_path = "/ot/row" if row_endpoint else "/ot/preload"
+            per_row = Counter(body["row"] for path, body in ch.s.posts if path == preload_path)
+            assert set(per_row) == eng._preloaded
+            assert all(v == 1 for v in per_row.values()), per_row
+            if row_endpoint:
+                assert "/ot" not in ch.s.paths()
+            else:
+                assert ch.s.paths().count("/ot/row") == 1
+    print("OK")
+
+    print("\nAll HttpChooser tests passed ✔")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# test/test_easylist_loader.py
+from __future__ import annotations
+import re
+from itertools import product
+from typing import List
+
+from src.server.io.easylist_loader import _domain_to_alt_regex, _domains_to_alt_regex
+
+def banner(s: str): print("\n======== " + s + " ========")
+
+DOMAIN_SETS: List[List[str]] = [
+    ["google.com"],
+    ["a.google.com", "google.com"],                  # 巢狀：子網域與其父網域同時列出
+    ["google.com", "a.google.com", "b.a.google.com"],
+    ["a.google.com", "youtube.com"],                 # 共用後綴 .com
+    ["google.com", "google.com.au", "google.co.uk"],
+    ["a.b.example.org", "c.b.example.org", "b.example.org", "example.net"],
+    ["x-y.com", "x.y.com", "xy.com"],
+    ["google.com", "google.com"],                    # 重複
+    ["127.0.0.1", "0.0.1"],
+]
+
+def _per_domain_regex(domains: List[str]) -> str:
+    """trie 版之前的寫法：每個網域各自 (subdomain.)*domain，再 | 起來。"""
+    return "(?:" + "|".join(_domain_to_alt_regex(d) for d in domains) + ")"
+
+def _candidates(domains: List[str]) -> List[str]:
+    # 網域本身、加子網域、砍掉前段/字元、改後綴、互相拼接：涵蓋該中與不該中的 docdomain
+    labels = sorted({lb for d in domains for lb in d.split(".")} | {"a", "www", "x"})
+    out = set()
+    for d in domains:
+        out.update({d, "www." + d, "a.b." + d, "x" + d, d[1:], d + ".x", "." + d, d + "."})
+        parts = d.split(".")
+        for i in range(len(parts)):
+            out.add(".".join(parts[i:]))
+    for n in (1, 2, 3):
+        out.update(".".join(p) for p in product(labels, repeat=n))
+    out.update({"", ".", "com", "\x1fgoogle.com", "google.com\x1f"})
+    return sorted(out)
+
+def main():
+    banner("Trie alternation == per-domain alternation")
+    total = 0
+    for domains in DOMAIN_SETS:
+        trie_re = re.compile(_domains_to_alt_regex(domains), re.IGNORECASE | re.DOTALL)
+        flat_re = re.compile(_per_domain_regex(domains), re.IGNORECASE | re.DOTALL)
+        hits = 0
+        for s in _candidates(domains):
+            a = trie_re.fullmatch(s) is not None
+            assert a == (flat_re.fullmatch(s) is not None), (domains, s, trie_re.pattern)
+            hits += a
+            total += 1
+        # 每個列出的網域及其子網域都必須命中
+        for d in domains:
+            assert trie_re.fullmatch(d) and trie_re.fullmatch("sub." + d), (domains, d)
+        print(f"{domains}: {trie_re.pattern}  ({hits} hits)")
+    print(f"OK ({total} candidates)")
+
+    banner("Nested domains keep both the parent and the child")
+    pat = re.compile(_domains_to_alt_regex(["a.google.com", "google.com"]))
+    for s in ("google.com", "a.google.com", "b.google.com", "x.a.google.com"):
+        assert pat.fullmatch(s), s
+    for s in ("agoogle.com", "oogle.com", "google.co", "google.com.au"):
+        assert not pat.fullmatch(s), s
+    print("OK")
+
+    print("\nAll EasyList loader tests passed ✔")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# test/test_engine_batch.py
+from __future__ import annotations
+import os
+import random
+import threading
+import time
+from concurrent.futures import wait
+from typing import List
+
+from src.client.io.gdfa_loader import load_gdfa
+from src.client.io.row_alph_loader import RowAlphabetMap
+from src.client.online.engine import ZIDSEngine, EngineConfig
+from src.client.online.ot_client import LocalTrivialOTChooser
+from src.common.urlnorm import canonicalize
+from src.server.online.handler import ZIDSServerApp, ServerConfig
+from src.server.online.ot_response_builder import RowAlphMeta
+
+ART = os.path.join(os.path.dirname(__file__), "..", "..", "..", "dist", "zids_easy")
+
+def banner(s: str): print("\n======== " + s + " ========")
+
+class SlowPreloadChooser(LocalTrivialOTChooser):
+    """整行預載故意慢一點，並記下「該行預載還沒完成就被 choose_one」的呼叫。"""
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self.loaded: set = set()
+        self.early: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def ensure_row_payload_cached(self, row: int) -> None:
+        if row not in self.loaded:
+            time.sleep(0.005)
+        super().ensure_row_payload_cached(row)
+        self.loaded.add(row)
+
+    def choose_one(self, row: int, logical_col: int) -> bytes:
+        if row not in self.loaded:
+            with self._lock:
+                self.early.append((row, logical_col))
+        return super().choose_one(row, logical_col)
+
+def _engine(fetch_workers: int = 0, chooser_cls=LocalTrivialOTChooser) -> ZIDSEngine:
+    """本地 server + LocalTrivialOTChooser 跑 dist/zids_easy；每次新建，GK 快取互不影響。"""
+    meta = RowAlphMeta.load(os.path.join(ART, "row_alph.json"))
+    app = ZIDSServerApp(meta, ServerConfig(manifest_path=os.path.join(ART, "manifest.json"),
+                                           gk_files_dir=ART, gk_bytes=32))
+    sid = app.init_session()["session_id"]
+    chooser = chooser_cls(server=app, session_id=sid, seed_k_bytes=16)
+    return ZIDSEngine(load_gdfa(os.path.join(ART, "gdfa.gdfa")), RowAlphabetMap.load(ART),
+                      chooser, EngineConfig(session_id=sid, k_bytes=16, fetch_workers=fetch_workers))
+
+def _random_inputs(n: int, seed: int = 7) -> List[bytes]:
+    rnd = random.Random(seed)
+    alphabet = b"lHt#.pdswi/ GETabc"
+    return [bytes(rnd.choice(alphabet) for _ in range(rnd.randint(0, 40))) for _ in range(n)]
+
+def main():
+    banner("Inputs: shared prefixes, empty, duplicates")
+    xs: List[bytes] = [
+        b"lHlt##tpdlt##.sll",
+        b"lHl",
+        b"lHlt##",
+        b"",
+        b"t##.sll",
+        b"t##",
+        b"lHl",              # duplicate
+        b"t.ttl.lwi",
+        b"",                 # duplicate empty
+        b"http://x/t##",
+        b"zzz",
+    ]
+    single = _engine()
+    expect = [single.run(x) for x in xs]
+    assert any(expect), "fixture inputs should produce at least one hit"
+    print("expected:", expect)
+
+    banner("run_batch(canonical=False) == [run(x)]")
+    assert _engine().run_batch(xs) == expect
+    # str / bytearray / memoryview 輸入走同一條正規化
+    mixed = [x.decode("ascii") if i % 3 == 0 else bytearray(x) if i % 3 == 1 else memoryview(x)
+             for i, x in enumerate(xs)]
+    assert _engine().run_batch(mixed) == expect
+    print("OK")
+
+    banner("run_batch(canonical=True) == [run(x)]")
+    cs = [canonicalize(x) for x in xs]
+    assert _engine().run_batch(cs, canonical=True) == expect
+    mixed = [c.decode("ascii") if i % 3 == 0 else bytearray(c) if i % 3 == 1 else memoryview(c)
+             for i, c in enumerate(cs)]
+    assert _engine().run_batch(mixed, canonical=True) == expect
+    assert _engine().run_batch(iter(cs), canonical=True) == expect  # 一次性 iterable
+    print("OK")
+
+    banner("Empty batch")
+    assert _engine().run_batch([]) == []
+    assert _engine().run_batch([], canonical=True) == []
+    print("OK")
+
+    banner("fetch_workers > 0 == fetch_workers = 0")
+    rs = _random_inputs(200) + xs
+    ref = _engine()
+    want = [ref.run(x) for x in rs]
+    for workers in (1, 4):
+        eng = _engine(fetch_workers=workers)
+        try:
+            assert [eng.run(x) for x in rs] == want
+            assert eng.run_batch(rs) == want
+            # 猜錯的投機 Future 不會一直掛著：等它們做完，下一次走訪就收進 GK 快取
+            pending = list(eng._spec.values())
+            wait(pending)
+            eng.run(b"")
+            assert not eng._spec, f"{len(eng._spec)} speculative fetches left in _spec"
+        finally:
+            eng.close()
+        eng = _engine(fetch_workers=workers)
+        try:
+            assert eng.run_batch(rs) == want
+            assert [eng.run(x) for x in rs] == want
+        finally:
+            eng.close()
+    print("OK")
+
+    banner("Row preload finishes before speculative GK fetches")
+    eng = _engine(fetch_workers=2, chooser_cls=SlowPreloadChooser)
+    try:
+        assert [eng.run(x) for x in rs[:60]] == want[:60]
+        assert eng.chooser.early == [], eng.chooser.early[:5]
+        assert eng._preloaded <= eng.chooser.loaded
+    finally:
+        eng.close()
+    print("OK")
+
+    print("\nAll engine batch tests passed ✔")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# test/test_gdfa_packager.py
+from __future__ import annotations
+import hashlib
+import json
+import os
+import random
+import shutil
+import struct
+import tempfile
+from typing import List
+
+from src.client.io.gdfa_loader import load_from_container, load_from_jsonbin, load_gdfa
+from src.common.crypto.prg import PRG_BACKEND, PRG_BACKENDS
+from src.server.offline.export.gdfa_packager import rows_to_soa, write_container, write_jsonbin, _V2_HDR
+from src.server.offline.gdfa_builder import GDFAPublicHeader
+
+def banner(s: str): print("\n======== " + s + " ========")
+
+def _fixture(seed: int = 1):
+    """num_states > 255，permutation 打亂：int32 permutation 寫錯寬度/位元組序會直接露餡。"""
+    rnd = random.Random(seed)
+    num_states, outmax, cell_bytes = 300, 3, 5
+    perm = list(range(num_states))
+    rnd.shuffle(perm)
+    pub = GDFAPublicHeader(
+        alphabet_size=256,
+        outmax=outmax,
+        cmax=1,             # 客戶端只收 cmax=1
+        num_states=num_states,
+        start_row=perm.index(0),
+        permutation=perm,
+        cell_bytes=cell_bytes,
+        row_bytes=outmax * cell_bytes,
+        aid_bits=8,
+    )
+    rows = [bytes(rnd.getrandbits(8) for _ in range(pub.row_bytes)) for _ in range(num_states)]
+    return pub, rows
+
+def _assert_cells(img, pub: GDFAPublicHeader, rows: List[bytes]) -> None:
+    cb = pub.cell_bytes
+    for r in range(pub.num_states):
+        for c in range(pub.outmax):
+            assert bytes(img.get_cell_cipher(r, c)) == rows[r][c * cb:(c + 1) * cb], (r, c)
+
+def _assert_header(h, pub: GDFAPublicHeader) -> None:
+    for k in ("alphabet_size", "outmax", "cmax", "num_states", "start_row", "cell_bytes", "row_bytes", "aid_bits"):
+        assert getattr(h, k) == getattr(pub, k), k
+    assert list(h.permutation) == pub.permutation
+    assert h.prg_backend == PRG_BACKEND
+
+def main():
+    pub, rows = _fixture()
+    blob = b"".join(rows)
+    tmp = tempfile.mkdtemp(prefix="zids_pkg_")
+    try:
+        banner("v2 container: raw layout")
+        path = os.path.join(tmp, "v2.gdfa")
+        rows_hex = write_container(path, pub, iter(rows))
+        raw = open(path, "rb").read()
+        assert raw[:7] == b"ZIDSv2\0"
+        fields = _V2_HDR.unpack_from(raw, 7)
+        assert fields[:8] == (pub.alphabet_size, pub.outmax, pub.cmax, pub.num_states, pub.start_row,
+                              pub.cell_bytes, pub.row_bytes, pub.aid_bits)
+        assert fields[8] == 0 | (PRG_BACKENDS.index(PRG_BACKEND) << 8)  # layout aos + PRG 後端代碼
+        assert fields[9] == pub.num_states
+        p = 7 + _V2_HDR.size
+        assert list(struct.unpack_from(f"<{pub.num_states}i", raw, p)) == pub.permutation
+        p += 4 * pub.num_states
+        assert raw[p:-32] == blob
+        assert raw[-32:] == hashlib.sha256(blob).digest()
+        assert rows_hex == hashlib.sha256(blob).hexdigest()
+        print("OK")
+
+        banner("v2 container: load round trip")
+        img = load_from_container(path, verify=True)
+        _assert_header(img.h, pub)
+        assert img.layout == "aos"
+        _assert_cells(img, pub, rows)
+        print("OK")
+
+        banner("v1 container still loads")
+        path1 = os.path.join(tmp, "v1.gdfa")
+        assert write_container(path1, pub, iter(rows), version=1) == rows_hex
+        raw1 = open(path1, "rb").read()
+        assert raw1[:7] == b"ZIDSv1\0" and raw1[-32:] == hashlib.sha256(blob).digest()
+        img1 = load_from_container(path1, verify=True)
+        _assert_header(img1.h, pub)
+        _assert_cells(img1, pub, rows)
+        print("OK")
+
+        banner("Trailing digest is checked")
+        bad = os.path.join(tmp, "bad.gdfa")
+        shutil.copyfile(path, bad)
+        with open(bad, "r+b") as f:
+            f.seek(len(raw) - 32 - 1)
+            f.write(bytes([raw[-33] ^ 1]))
+        try:
+            load_from_container(bad, verify=True)
+            raise AssertionError("tampered rows should not load")
+        except ValueError as e:
+            assert "sha256" in str(e)
+        load_from_container(bad, verify=False)  # verify=False 不校驗
+        print("OK")
+
+        banner("Bad row length removes the partial file")
+        for version in (1, 2):
+            for layout in ("aos", "soa"):
+                out = os.path.join(tmp, f"partial_v{version}_{layout}.gdfa")
+                short = rows[:10] + [rows[10][:-1]] + rows[11:]
+                try:
+                    write_container(out, pub, iter(short), layout=layout, version=version)
+                    raise AssertionError("short row should be rejected")
+                except ValueError as e:
+                    assert "row 10 length" in str(e)
+                assert not os.path.exists(out)
+                for bad_rows in (rows[:-1], rows + rows[:1]):
+                    try:
+                        write_container(out, pub, iter(bad_rows), layout=layout, version=version)
+                        raise AssertionError("wrong row count should be rejected")
+                    except ValueError as e:
+                        assert "rows total length" in str(e)
+                    assert not os.path.exists(out)
+        for layout, name in (("aos", "rows.bin"), ("soa", "rows_soa.bin")):
+            out = os.path.join(tmp, f"partial_jb_{layout}")
+            try:
+                write_jsonbin(out, pub, iter(rows[:5] + [rows[5] + b"x"] + rows[6:]), layout=layout)
+                raise AssertionError("long row should be rejected")
+            except ValueError as e:
+                assert "row 5 length" in str(e)
+            assert not os.path.exists(os.path.join(out, name))
+            assert not os.path.exists(os.path.join(out, "header.json"))
+        print("OK")
+
+        banner("SoA container: column-major rows, same cells as AoS")
+        soa_blob = rows_to_soa(blob, pub)
+        cb, n = pub.cell_bytes, pub.num_states
+        assert soa_blob[(2 * n + 7) * cb:(2 * n + 8) * cb] == rows[7][2 * cb:3 * cb]  # cell(7, 2)
+        for version in (1, 2):
+            sp = os.path.join(tmp, f"soa_v{version}.gdfa")
+            # 回傳值（給 manifest）永遠是行主序 rows 的 sha256；檔尾 digest 則對實際寫入的 soa 內容
+            assert write_container(sp, pub, iter(rows), layout="soa", version=version) == rows_hex
+            raw_s = open(sp, "rb").read()
+            assert raw_s[-32 - len(soa_blob):-32] == soa_blob
+            assert raw_s[-32:] == hashlib.sha256(soa_blob).digest()
+            img_s = load_from_container(sp, verify=True)
+            _assert_header(img_s.h, pub)
+            assert img_s.layout == "soa"
+            _assert_cells(img_s, pub, rows)
+            for r in range(n):
+                for c in range(pub.outmax):
+                    assert bytes(img_s.get_cell_cipher(r, c)) == bytes(img.get_cell_cipher(r, c))
+        print("OK")
+
+        banner("jsonbin: rows.bin vs rows_soa.bin")
+        jb_aos = os.path.join(tmp, "jb_aos")
+        jb_soa = os.path.join(tmp, "jb_soa")
+        assert write_jsonbin(jb_aos, pub, iter(rows)) == rows_hex
+        assert write_jsonbin(jb_soa, pub, iter(rows), layout="soa", gzip_header=True) == rows_hex
+        assert sorted(os.listdir(jb_aos)) == ["header.json", "rows.bin"]
+        assert sorted(os.listdir(jb_soa)) == ["header.json.gz", "rows_soa.bin"]
+        assert open(os.path.join(jb_soa, "rows_soa.bin"), "rb").read() == soa_blob
+        hdr = json.load(open(os.path.join(jb_aos, "header.json")))
+        assert "layout" not in hdr and hdr["rows_sha256"] == rows_hex
+        j_aos = load_from_jsonbin(jb_aos, verify=True)
+        j_soa = load_gdfa(jb_soa, verify=True)
+        assert j_aos.layout == "aos" and j_soa.layout == "soa"
+        _assert_header(j_soa.h, pub)
+        _assert_cells(j_aos, pub, rows)
+        _assert_cells(j_soa, pub, rows)
+        # header 的 rows_sha256 對 rows_soa.bin 本身：改一個 byte 就校驗失敗
+        # （先刪掉載入時寫下的 .sha256 sidecar：同一 mtime tick 內改檔會被當成沒變）
+        os.remove(os.path.join(jb_soa, "rows_soa.bin.sha256"))
+        with open(os.path.join(jb_soa, "rows_soa.bin"), "r+b") as f:
+            f.write(bytes([soa_blob[0] ^ 1]))
+        try:
+            load_from_jsonbin(jb_soa, verify=True)
+            raise AssertionError("tampered rows_soa.bin should not load")
+        except ValueError as e:
+            assert "rows_soa.bin sha256" in str(e)
+        print("OK")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print("\nAll GDFA packager tests passed ✔")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# test/test_hs_db.py
+from __future__ import annotations
+import os
+import re
+import shutil
+import tempfile
+from typing import List
+
+import src.server.io._hs_db as hs_db
+from src.common.abp_canonicalize import canonicalize_for_abp
+from src.server.io._hs_db import RuleMatcher
+from src.server.io.easylist_loader import RuleSpec, parse_easylist
+
+def banner(s: str): print("\n======== " + s + " ========")
+
+EASYLIST = """[Adblock Plus 2.0]
+! Title: RuleMatcher test list
+||ads.example.com^
+@@||ads.example.com/whitelist.js
+||tracker.com^$third-party
+|https://cdn.example.org/ad
+.swf|
+&ad_type=
+||example.net^$script,domain=news.com|a.google.com
+||example.net/pixel$image
+-advert-$match-case
+/^https?:\\/\\/[a-z]+\\.ads\\d+\\./
+||doubleclick.net^
+@@||doubleclick.net/allowed^$domain=good.com
+example.com##.ad-banner
+"""
+
+REQUESTS = [
+    ("https://ads.example.com/x.js", "https://example.com/", "script"),
+    ("https://ads.example.com/whitelist.js", "https://example.com/", "script"),
+    ("https://sub.tracker.com/p", "https://example.com/", "image"),
+    ("https://tracker.com/p", "https://tracker.com/", "image"),
+    ("https://cdn.example.org/ad/1.png", "https://example.com/", "image"),
+    ("https://media.example.com/movie.swf", "https://example.com/", "object"),
+    ("https://example.com/q?x=1&ad_type=2", "https://example.com/", "xhr"),
+    ("https://example.net/lib.js", "https://a.google.com/", "script"),
+    ("https://example.net/lib.js", "https://google.com/", "script"),
+    ("https://example.net/pixel.gif", "https://example.com/", "image"),
+    ("https://example.com/-advert-/x", "https://example.com/", "image"),
+    ("https://example.com/-ADVERT-/x", "https://example.com/", "image"),
+    ("https://doubleclick.net/allowed/x", "https://good.com/", "script"),
+    ("https://doubleclick.net/allowed/x", "https://bad.com/", "script"),
+    ("https://clean.example.org/index.html", "https://clean.example.org/", "subdocument"),
+]
+
+def _old_smoke_loop(specs, payload: str) -> List[str]:
+    """tools/smoke_abp.py 改用 RuleMatcher 之前的寫法：逐條 re.compile（失敗略過），再逐條 search。"""
+    labels = []
+    for s in specs:
+        flags = (re.IGNORECASE if s.ignore_case else 0) | (re.DOTALL if s.dotall else 0)
+        try:
+            rx = re.compile(s.pattern, flags)
+        except re.error:
+            continue
+        if rx.search(payload):
+            labels.append(s.label)
+    return labels
+
+def main():
+    saved_hs = hs_db.hyperscan
+    hs_db.hyperscan = None  # 固定走 re 後端（裝了 hyperscan 的環境也一樣）
+    tmp = tempfile.mkdtemp(prefix="zids_hs_")
+    try:
+        path = os.path.join(tmp, "easylist.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(EASYLIST)
+        specs = parse_easylist(path)
+
+        banner("re backend == old smoke_abp loop (hits in rule-file order)")
+        m = RuleMatcher(specs)
+        assert m.backend == "re" and not m.skipped and len(m.rules) == len(specs)
+        any_hits = 0
+        for req, doc, typ in REQUESTS:
+            payload = canonicalize_for_abp(req_url=req, doc_url=doc, req_type=typ)
+            ids = m.match_ids(payload)
+            assert ids == sorted(set(ids))
+            got = [m.rules[i].label for i in ids]
+            assert got == _old_smoke_loop(specs, payload), (req, doc, typ, got)
+            any_hits += bool(got)
+        assert any_hits >= len(REQUESTS) // 2, "fixture should exercise matches"
+        print(f"OK ({any_hits}/{len(REQUESTS)} requests hit)")
+
+        banner("Patterns re cannot compile are skipped, not fatal")
+        broken = [
+            RuleSpec(pattern="(unclosed", ignore_case=True, label="broken:1"),
+            RuleSpec(pattern="(?<=a+)b", ignore_case=False, label="broken:2"),  # 變長 lookbehind
+        ]
+        mixed = broken[:1] + list(specs[:6]) + broken[1:] + list(specs[6:])
+        m2 = RuleMatcher(mixed)
+        assert [s.label for s, _ in m2.skipped] == ["broken:1", "broken:2"]
+        assert all(isinstance(e, re.error) for _, e in m2.skipped)
+        assert [s.label for s in m2.rules] == [s.label for s in specs]
+        for req, doc, typ in REQUESTS:
+            payload = canonicalize_for_abp(req_url=req, doc_url=doc, req_type=typ)
+            # match_ids 索引的是 rules（已排除 skipped），結果與沒有壞規則時相同
+            assert [m2.rules[i].label for i in m2.match_ids(payload)] == _old_smoke_loop(mixed, payload)
+            assert m2.match_ids(payload) == m.match_ids(payload)
+        assert RuleMatcher(broken).rules == [] and RuleMatcher(broken).match_ids("anything") == []
+        print("OK")
+    finally:
+        hs_db.hyperscan = saved_hs
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print("\nAll RuleMatcher tests passed ✔")
+
+if __name__ == "__main__":
+    main()
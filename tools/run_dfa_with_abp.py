@@ -9,7 +9,7 @@ if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
 from src.common.abp_canonicalize import canonicalize_for_abp
-from src.client.online.abp_decide import load_id_to_action, decide_from_rule_ids
+from src.client.online.abp_decide import load_action_sets, decide_from_rule_ids
 from src.server.io.rule_loader import load_rules, LoadRulesConfig
 
 # -------- regex 路徑 --------
@@ -108,7 +108,7 @@ def main():
     args = ap.parse_args()
 
     # 也用 utf-8-sig 讀，避免 idmap 帶 BOM
-    id_to_action = load_id_to_action(json.loads(Path(args.idmap).read_text(encoding="utf-8-sig")))
+    id_to_action = load_action_sets(json.loads(Path(args.idmap).read_text(encoding="utf-8-sig")))
 
     req, doc, typ = (args.one.split("|") + ["other"])[:3]
     payload = canonicalize_for_abp(req.strip(), doc.strip(), typ.strip())
@@ -3,53 +3,36 @@ from __future__ import annotations
 
 import argparse
 import json
-import re
-from dataclasses import dataclass
 from typing import List, Tuple
 
 from src.server.io.easylist_loader import parse_easylist, is_abp_file
+from src.server.io._hs_db import RuleMatcher
 from src.common.abp_canonicalize import canonicalize_for_abp
 
-@dataclass
-class CompiledRule:
-    rx: re.Pattern
-    action: str   # "ALLOW" or "BLOCK"
-    label: str
-
-def load_rules_easylist(path: str, ignore_case_default: bool = True) -> List[CompiledRule]:
+def load_rules_easylist(path: str, ignore_case_default: bool = True) -> RuleMatcher:
     if not is_abp_file(path):
         raise SystemExit(f"{path} doesn't look like an Adblock/EasyList file")
     specs = parse_easylist(path, default_case_insensitive=ignore_case_default)
+    rules = RuleMatcher(specs)
+    # 不讓一條垃圾規則拖垮整體
+    for s, e in rules.skipped:
+        print(f"[skip] regex compile failed: {s.label}: {e}\npattern={s.pattern}", flush=True)
+    return rules
 
-    compiled: List[CompiledRule] = []
-    for s in specs:
-        flags = 0
-        if s.ignore_case:
-            flags |= re.IGNORECASE
-        if s.dotall:
-            flags |= re.DOTALL
-        try:
-            rx = re.compile(s.pattern, flags)
-        except re.error as e:
-            # 不讓一條垃圾規則拖垮整體
-            print(f"[skip] regex compile failed: {s.label}: {e}\npattern={s.pattern}", flush=True)
-            continue
-        compiled.append(CompiledRule(rx=rx, action=s.action, label=s.label or "unnamed"))
-    return compiled
-
-def decide_allow_block(payload: str, rules: List[CompiledRule]) -> Tuple[str, List[str]]:
+def decide_allow_block(payload: str, rules: RuleMatcher) -> Tuple[str, List[str]]:
     """
     ABP 優先序：若任何 ALLOW 命中 → ALLOW；否則若任何 BLOCK 命中 → BLOCK；否則 NOMATCH
     備註：這裡用 OR 語義（有命中即成立），與 ABP 的行為一致（不中立序）。
+    所有規則一次掃描（hyperscan 可用時），命中順序仍按規則檔順序。
     """
     hits_allow: List[str] = []
     hits_block: List[str] = []
-    for r in rules:
-        if r.rx.search(payload):
-            if r.action == "ALLOW":
-                hits_allow.append(r.label)
-            else:
-                hits_block.append(r.label)
+    for i in rules.match_ids(payload):
+        r = rules.rules[i]
+        if r.action == "ALLOW":
+            hits_allow.append(r.label or "unnamed")
+        else:
+            hits_block.append(r.label or "unnamed")
     if hits_allow:
         return "ALLOW", hits_allow
     if hits_block:
@@ -65,7 +48,7 @@ def main():
     args = ap.parse_args()
 
     rules = load_rules_easylist(args.easylist)
-    print(f"[loaded] {len(rules)} compiled rules", flush=True)
+    print(f"[loaded] {len(rules.rules)} compiled rules ({rules.backend})", flush=True)
 
     tests: List[Tuple[str, str, str | None]] = []
     if args.one: